@@ -1,5 +1,3 @@
-import subprocess
-import shlex
 import tkinter as tk
 from tkinter import ttk, messagebox
 import os
@@ -10,6 +8,7 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import requests
 import json
 import traceback
+from PrologWorkerPool import PrologWorkerPool
 
 # ---------------------------
 # CONFIGURATION
@@ -20,27 +19,36 @@ PROLOG_FILE = r"C:\Users\chama\OneDrive\Documents\VS Codes\AI_Group\roads.pl"
 # Local swipl executable (if not on PATH set full path)
 SWIPL_CMD = "swipl"  # or r"C:\Program Files\swipl\bin\swipl.exe"
 
+# Worker pool: number of long-lived swipl processes and per-query timeout (seconds)
+PROLOG_POOL_SIZE = 2
+PROLOG_QUERY_TIMEOUT = 30
+
 # SWISH (online) API endpoint - public instance
 SWISH_PENGINE_URL = "https://swish.swi-prolog.org/pengine/create"
 
 # ---------------------------
 # Helper functions for Prolog (Local and Online)
 # ---------------------------
+_POOL = None
+
+def get_prolog_pool():
+    """
+    Return the shared swipl worker pool, (re)creating it if SWIPL_CMD or
+    PROLOG_FILE changed since it was started.
+    """
+    global _POOL
+    if _POOL is None or _POOL.swipl_cmd != SWIPL_CMD or _POOL.prolog_file != PROLOG_FILE:
+        if _POOL is not None:
+            _POOL.close()
+        _POOL = PrologWorkerPool(SWIPL_CMD, PROLOG_FILE, size=PROLOG_POOL_SIZE,
+                                 query_timeout=PROLOG_QUERY_TIMEOUT)
+    return _POOL
+
 def call_prolog_local(goal: str):
     """
-    Call local swipl with the specified goal. Returns stdout string.
+    Run goal on a pooled local swipl worker (KB already consulted). Returns stdout string.
     """
-    cmd = [SWIPL_CMD, "-q", "-s", PROLOG_FILE, "-g", goal, "-t", "halt"]
-    try:
-        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-    except FileNotFoundError:
-        raise RuntimeError("swipl not found. Set SWIPL_CMD to your swipl executable path or install SWI-Prolog.")
-    except subprocess.TimeoutExpired:
-        raise RuntimeError("Local Prolog timed out.")
-    if proc.stderr:
-        # show debug to console — not always fatal
-        print("Prolog stderr:", proc.stderr)
-    return proc.stdout.strip()
+    return get_prolog_pool().query(goal)
 
 def call_prolog_online(goal: str):
     """
@@ -217,6 +225,9 @@ def append_road_to_file(src_atom, dst_atom, distance_val, rtype_atom, time_val,
     fact = f"road({src_atom}, {dst_atom}, {distance_val}, {rtype_atom}, {time_val}, {status_atom}).\n"
     with open(PROLOG_FILE, "a", encoding="utf-8") as f:
         f.write(fact)
+    # pooled workers still hold the old KB
+    if _POOL is not None:
+        _POOL.reload()
 
 # ---------------------------
 # GUI
@@ -260,7 +271,9 @@ class PathFinderApp:
         self.criteria_cb = ttk.Combobox(controls, state="readonly", width=40,
                                         values=["Shortest Distance", "Fastest Time",
                                                 "Avoid Unpaved Roads", "Avoid Broken Cistern Roads",
-                                                "Avoid Deep Potholes", "Loose Constraints (BFS)"])
+                                                "Avoid Deep Potholes", "Loose Constraints (BFS)",
+                                                "A* Distance", "A* Time",
+                                                "Bidirectional Distance", "Bidirectional Time"])
         self.criteria_cb.current(0)
         self.criteria_cb.grid(row=2, column=1, padx=5, pady=6, sticky="w")
 
@@ -395,7 +408,11 @@ class PathFinderApp:
             "Avoid Unpaved Roads": "avoid_unpaved",
             "Avoid Broken Cistern Roads": "avoid_broken",
             "Avoid Deep Potholes": "avoid_deep_potholes",
-            "Loose Constraints (BFS)": "loose_constraints"
+            "Loose Constraints (BFS)": "loose_constraints",
+            "A* Distance": "astar_distance",
+            "A* Time": "astar_time",
+            "Bidirectional Distance": "bidir_distance",
+            "Bidirectional Time": "bidir_time"
         }
         crit_atom = mapping.get(criteria_raw, "shortest_distance")
         start_atom = to_atom(start_raw)
@@ -475,4 +492,6 @@ if __name__ == "__main__":
         messagebox.showerror("Missing libraries", "Install required packages: pip install networkx matplotlib requests")
     root = tk.Tk()
     app = PathFinderApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    if _POOL is not None:
+        _POOL.close()
\ No newline at end of file
@@ -4,7 +4,11 @@
 
 :- dynamic road/6.   % road(Source, Dest, DistanceKm, Type, TimeMin, Status)
                      % Type   = paved | unpaved | broken_cisterns | deep_potholes
-                     % Status  = open | closed
+                     % Status  = open | closed | scheduled (see closure_window/3)
+
+:- use_module(library(heaps)).
+:- use_module(library(assoc)).
+:- use_module(library(http/json)).
 
 % ============================================================
 % Rural Roads Network for Clarendon
@@ -45,6 +49,58 @@ road(osbourne_store, longsville_park, 7, unpaved, 20, closed).
 road(kensington, four_paths, 11, broken_cisterns, 28, closed).
 
 
+% ============================================================
+% Node Coordinates (optional)
+% coord(Node, Lat, Lon) - approximate positions used only by the A*
+% heuristic. If any road end has no coord, A* runs with h = 0.
+
+:- dynamic coord/3.
+
+coord(may_pen, 17.9448, -77.2049).
+coord(denbigh, 17.9117, -77.2033).
+coord(osbourne_store, 17.9345, -77.2397).
+coord(race_course, 17.9647, -77.1982).
+coord(four_paths, 17.9440, -77.2658).
+coord(new_longsville, 18.0011, -77.3012).
+coord(longsville_park, 17.9841, -77.2714).
+coord(hayes, 17.8987, -77.3168).
+coord(rock, 17.8550, -77.2919).
+coord(milk_river, 17.8639, -77.3344).
+coord(sandy_bay, 17.9383, -77.3403).
+coord(chapelton, 18.0794, -77.2725).
+coord(summerfield, 18.0801, -77.2377).
+coord(kensington, 18.0304, -77.2353).
+coord(freetown, 17.8943, -77.2665).
+coord(lionel_town, 17.9084, -77.2350).
+
+
+% ============================================================
+% Time Profiles and Closure Windows
+% Clock times are minutes after midnight (07:30 = 450) and wrap daily.
+% time_profile(Name, Steps) is stored once and shared by name: Steps is
+% a list of From-Factor pairs starting at 0 with Factor > 0, and from
+% From until the next step a road takes Factor times its TimeMin. road_profile/3 gives one
+% direction of a road a profile; other roads keep their TimeMin all day.
+% closure_window(Source, Dest, Windows) lists From-To clock windows the
+% road is shut (From > To runs past midnight). road/6's Status is open,
+% closed or scheduled. Queries without a departure time use open roads
+% only; route_at/7 also uses scheduled roads, and applies the windows of
+% open and scheduled roads alike. A closed road stays closed.
+
+:- dynamic time_profile/2, road_profile/3, closure_window/3.
+
+% May Pen -> Hayes: evening peak out of town (into_may_pen is for a
+% hayes -> may_pen road, should one be added)
+time_profile(into_may_pen,   [0-1.0, 390-1.5, 420-2.2, 540-1.5, 570-1.0, 1020-1.3, 1110-1.0]).
+time_profile(out_of_may_pen, [0-1.0, 420-1.3, 510-1.0, 960-1.5, 1020-2.2, 1140-1.5, 1170-1.0]).
+
+road_profile(may_pen, hayes, out_of_may_pen).
+
+% the unpaved Longsville Park road is unlit and floods: once it reopens
+% (status scheduled) it is open by day only; while closed these do nothing
+closure_window(osbourne_store, longsville_park, [1080-360]).
+
+
 % ============================================================
 % Allowed Edges 
 
@@ -61,102 +117,617 @@ edge(Crit, From, To, Dist, Time, Type) :-
 
 % ============================================================
 % Breadth First Search - BFS
+% The FIFO queue is a pair of lists q(Front, ReversedBack), so push and pop
+% are amortised O(1). Visited marks nodes when they are queued, so each
+% node is expanded once and the search is linear in edges. bfs/7 also
+% returns the number of expanded states.
 
 bfs(Crit, Start, Goal, Path, Dist, Time) :-
-    bfs_queue(Crit, [[Start]], Goal, RevPath),
+    bfs(Crit, Start, Goal, Path, Dist, Time, _).
+
+bfs(Crit, Start, Goal, Path, Dist, Time, Expanded) :-
+    list_to_assoc([Start-true], Visited),
+    bfs_queue(Crit, q([[Start]], []), Visited, Goal, RevPath, 0, Expanded),
     reverse(RevPath, Path),
     path_cost(Crit, Path, Dist, Time).
 
-bfs_queue(_, [[Goal | Rest] | _], Goal, [Goal | Rest]).
-bfs_queue(Crit, [[Current | Rest] | Q], Goal, P2) :-
-    findall([Next, Current | Rest],
-            ( edge(Crit, Current, Next, _, _, _),
-              \+ member(Next, [Current | Rest]) ),
-            Children),
-    append(Q, Children, Q2),
-    bfs_queue(Crit, Q2, Goal, P2).
+bfs_queue(Crit, Q0, Visited0, Goal, Path, N0, N) :-
+    queue_pop(Q0, [Current | Rest], Q1),
+    (   Current == Goal
+    ->  Path = [Current | Rest], N = N0
+    ;   N1 is N0 + 1,
+        findall(Next, edge(Crit, Current, Next, _, _, _), Nexts),
+        bfs_children(Nexts, [Current | Rest], Visited0, Visited, Q1, Q2),
+        bfs_queue(Crit, Q2, Visited, Goal, Path, N1, N)
+    ).
+
+bfs_children([], _, V, V, Q, Q).
+bfs_children([Next | Ns], Path, V0, V, Q0, Q) :-
+    (   get_assoc(Next, V0, _)
+    ->  V1 = V0, Q1 = Q0
+    ;   put_assoc(Next, V0, true, V1),
+        queue_push(Q0, [Next | Path], Q1)
+    ),
+    bfs_children(Ns, Path, V1, V, Q1, Q).
+
+queue_push(q(F, B), X, q(F, [X | B])).
+
+queue_pop(q(F0, B), X, Q) :-
+    (   F0 = [X | F]
+    ->  Q = q(F, B)
+    ;   B \== [],
+        reverse(B, [X | F]),
+        Q = q(F, [])
+    ).
 
 
 % ============================================================
 % Dijkstra
+% The frontier is a heap keyed on distance or time (Mode). Best maps each
+% node to its cheapest known cost and Closed holds settled nodes, so every
+% node is expanded at most once. dijkstra/8 also returns the number of
+% expanded states.
 
 dijkstra(Mode, Crit, Start, Goal, Path, Dist, Time) :-
-    dijkstra_queue(Mode, Crit, [state(0, 0, [Start])], Goal, RevPath, Dist, Time),
+    dijkstra(Mode, Crit, Start, Goal, Path, Dist, Time, _).
+
+dijkstra(Mode, Crit, Start, Goal, Path, Dist, Time, Expanded) :-
+    empty_heap(H0),
+    add_to_heap(H0, 0, state(0, 0, [Start]), H),
+    empty_assoc(Closed),
+    list_to_assoc([Start-0], Best),
+    dijkstra_queue(Mode, Crit, H, Closed, Best, Goal, RevPath, Dist, Time,
+                   0, Expanded),
     reverse(RevPath, Path).
 
-dijkstra_queue(_, _, [state(D, T, [Goal | R]) | _], Goal, [Goal | R], D, T).
-
-dijkstra_queue(Mode, Crit, [state(D0, T0, [Curr | R]) | Others],
-               Goal, Path, Dist, Time) :-
-    findall(state(D1, T1, [Next, Curr | R]),
-            ( edge(Crit, Curr, Next, StepD, StepT, _),
-              \+ member(Next, [Curr | R]),
-              D1 is D0 + StepD,
-              T1 is T0 + StepT ),
-            Children),
-    insert_children(Mode, Children, Others, NewQ),
-    dijkstra_queue(Mode, Crit, NewQ, Goal, Path, Dist, Time).
+dijkstra_queue(Mode, Crit, H0, Closed0, Best0, Goal, Path, Dist, Time, N0, N) :-
+    get_from_heap(H0, _, state(D0, T0, [Curr | R]), H1),
+    (   Curr == Goal
+    ->  Path = [Curr | R], Dist = D0, Time = T0, N = N0
+    ;   get_assoc(Curr, Closed0, _)
+    ->  dijkstra_queue(Mode, Crit, H1, Closed0, Best0, Goal, Path, Dist, Time, N0, N)
+    ;   put_assoc(Curr, Closed0, true, Closed),
+        N1 is N0 + 1,
+        findall(c(C, C, state(D1, T1, [Next, Curr | R])),
+                ( edge(Crit, Curr, Next, StepD, StepT, _),
+                  \+ get_assoc(Next, Closed, _),
+                  D1 is D0 + StepD,
+                  T1 is T0 + StepT,
+                  cost(Mode, D1, T1, C) ),
+                Children),
+        push_children(Children, H1, Best0, H2, Best),
+        dijkstra_queue(Mode, Crit, H2, Closed, Best, Goal, Path, Dist, Time, N1, N)
+    ).
+
+% c(Cost, Priority, State): push a child only if its Cost beats the best
+% known cost of its node; the heap is ordered by Priority
+push_children([], H, B, H, B).
+push_children([c(C, P, S) | Rest], H0, B0, H, B) :-
+    S = state(_, _, [Next | _]),
+    (   get_assoc(Next, B0, Old), Old =< C
+    ->  H1 = H0, B1 = B0
+    ;   add_to_heap(H0, P, S, H1),
+        put_assoc(Next, B0, C, B1)
+    ),
+    push_children(Rest, H1, B1, H, B).
 
-insert_children(_, [], Q, Q).
-insert_children(M, [S|R], Q, Out) :-
-    insert_state(M, S, Q, Q1),
-    insert_children(M, R, Q1, Out).
+cost(time, _, T, C) :- !, C = T.
+cost(_,    D, _, D).
 
-insert_state(_, S, [], [S]).
-insert_state(M, S, [Q|Rest], [S, Q | Rest]) :-
-    better(M, S, Q), !.
-insert_state(M, S, [Q|Rest], [Q|Rest2]) :-
-    insert_state(M, S, Rest, Rest2).
 
-better(distance, state(D1,_,_), state(D2,_,_)) :- D1 < D2.
-better(time,     state(_,T1,_), state(_,T2,_)) :- T1 < T2.
-better(_,        state(D1,_,_), state(D2,_,_)) :- D1 < D2.
+% ============================================================
+% Bidirectional Dijkstra
+% Two dijkstra/8 frontiers: forward from Start over road/6, backward from
+% Goal over the same roads walked in reverse (edge/6 called with To bound),
+% both filtered by allowed/3, so a one-way road is only ever used in its
+% own direction. Each side keeps a heap, Closed and Best, where Best maps
+% a node to l(Cost, Dist, Time, RevPath). Relaxing a road into a node the
+% other side has reached gives a candidate route; Mu keeps the cheapest.
+% The side with the cheaper heap top is expanded next, and the search
+% stops once the two tops together cost at least Mu (or a side runs dry):
+% any cheaper route would have to pass a node neither side has settled.
+% bidijkstra/8 also returns the states expanded on both sides.
+
+bidijkstra(Mode, Crit, Start, Goal, Path, Dist, Time) :-
+    bidijkstra(Mode, Crit, Start, Goal, Path, Dist, Time, _).
+
+bidijkstra(Mode, Crit, Start, Goal, Path, Dist, Time, Expanded) :-
+    (   Start == Goal
+    ->  Path = [Start], Dist = 0, Time = 0, Expanded = 0
+    ;   bi_side(Start, Fwd),
+        bi_side(Goal, Bwd),
+        bi_queue(Mode, Crit, Fwd, Bwd, none, Mu, 0, Expanded),
+        Mu = mu(_, Dist, Time, RevHead, Tail),
+        reverse(RevHead, Head),
+        append(Head, Tail, Path)
+    ).
+
+bi_side(Node, side(H, Closed, Best)) :-
+    empty_heap(H0),
+    add_to_heap(H0, 0, state(0, 0, [Node]), H),
+    empty_assoc(Closed),
+    list_to_assoc([Node-l(0, 0, 0, [Node])], Best).
+
+% fails when the two sides never meet
+bi_queue(Mode, Crit, Fwd, Bwd, Mu0, Mu, N0, N) :-
+    Fwd = side(HF, _, _),
+    Bwd = side(HB, _, _),
+    (   min_of_heap(HF, KF, _),
+        min_of_heap(HB, KB, _),
+        \+ ( Mu0 = mu(C, _, _, _, _), KF + KB >= C )
+    ->  (   KF =< KB
+        ->  bi_expand(fwd, Mode, Crit, Fwd, Bwd, Fwd1, Mu0, Mu1, N0, N1),
+            bi_queue(Mode, Crit, Fwd1, Bwd, Mu1, Mu, N1, N)
+        ;   bi_expand(bwd, Mode, Crit, Bwd, Fwd, Bwd1, Mu0, Mu1, N0, N1),
+            bi_queue(Mode, Crit, Fwd, Bwd1, Mu1, Mu, N1, N)
+        )
+    ;   Mu0 \== none,
+        Mu = Mu0,
+        N = N0
+    ).
+
+bi_expand(Dir, Mode, Crit, side(H0, Closed0, Best0), side(_, _, Other),
+          Side, Mu0, Mu, N0, N) :-
+    get_from_heap(H0, _, state(D0, T0, [Curr | R]), H1),
+    (   get_assoc(Curr, Closed0, _)
+    ->  Side = side(H1, Closed0, Best0), Mu = Mu0, N = N0
+    ;   put_assoc(Curr, Closed0, true, Closed),
+        N is N0 + 1,
+        findall(c(C, state(D1, T1, [Next, Curr | R])),
+                ( bi_edge(Dir, Crit, Curr, Next, StepD, StepT),
+                  \+ get_assoc(Next, Closed, _),
+                  D1 is D0 + StepD,
+                  T1 is T0 + StepT,
+                  cost(Mode, D1, T1, C) ),
+                Children),
+        bi_meet(Children, Dir, Other, Mu0, Mu),
+        bi_push(Children, H1, Best0, H, Best),
+        Side = side(H, Closed, Best)
+    ).
+
+bi_edge(fwd, Crit, Curr, Next, D, T) :- edge(Crit, Curr, Next, D, T, _).
+bi_edge(bwd, Crit, Curr, Prev, D, T) :- edge(Crit, Prev, Curr, D, T, _).
+
+% mu(Cost, Dist, Time, RevHead, Tail): RevHead runs from the meeting node
+% back to Start, Tail from the node after it on to Goal
+bi_meet([], _, _, Mu, Mu).
+bi_meet([c(C, state(D, T, [Node | R])) | Rest], Dir, Other, Mu0, Mu) :-
+    (   get_assoc(Node, Other, l(C2, D2, T2, [_ | R2])),
+        C1 is C + C2,
+        \+ ( Mu0 = mu(Old, _, _, _, _), Old =< C1 )
+    ->  D1 is D + D2,
+        T1 is T + T2,
+        (   Dir == fwd
+        ->  Mu1 = mu(C1, D1, T1, [Node | R], R2)
+        ;   Mu1 = mu(C1, D1, T1, [Node | R2], R)
+        )
+    ;   Mu1 = Mu0
+    ),
+    bi_meet(Rest, Dir, Other, Mu1, Mu).
+
+bi_push([], H, B, H, B).
+bi_push([c(C, S) | Rest], H0, B0, H, B) :-
+    S = state(D, T, [Next | R]),
+    (   get_assoc(Next, B0, l(Old, _, _, _)), Old =< C
+    ->  H1 = H0, B1 = B0
+    ;   add_to_heap(H0, C, S, H1),
+        put_assoc(Next, B0, l(C, D, T, [Next | R]), B1)
+    ),
+    bi_push(Rest, H1, B1, H, B).
 
 
 % ============================================================
 % A* Search
+% Same frontier as dijkstra/8, ordered by F = G + H. The heuristic is
+% consistent (see heuristic_bounds/2), so the closed set stays valid.
 
 a_star(Mode, Crit, Start, Goal, Path, Dist, Time) :-
-    a_star_queue(Mode, Crit, Goal, [state(0, 0, 0, [Start])],
-                 Goal, Rev, Dist, Time),
+    a_star(Mode, Crit, Start, Goal, Path, Dist, Time, _).
+
+a_star(Mode, Crit, Start, Goal, Path, Dist, Time, Expanded) :-
+    heuristic(Mode, Start, Goal, H),
+    empty_heap(Q0),
+    add_to_heap(Q0, H, state(0, 0, [Start]), Q),
+    empty_assoc(Closed),
+    list_to_assoc([Start-0], Best),
+    a_star_queue(Mode, Crit, Goal, Q, Closed, Best, Rev, Dist, Time,
+                 0, Expanded),
     reverse(Rev, Path).
 
-a_star_queue(_, _, _, [state(_,D,T,[Goal|R])|_],
-             Goal, [Goal|R], D, T).
+a_star_queue(M, Crit, Goal, Q0, Closed0, Best0, Path, Dist, Time, N0, N) :-
+    get_from_heap(Q0, _, state(GD, GT, [Curr | R]), Q1),
+    (   Curr == Goal
+    ->  Path = [Curr | R], Dist = GD, Time = GT, N = N0
+    ;   get_assoc(Curr, Closed0, _)
+    ->  a_star_queue(M, Crit, Goal, Q1, Closed0, Best0, Path, Dist, Time, N0, N)
+    ;   put_assoc(Curr, Closed0, true, Closed),
+        N1 is N0 + 1,
+        findall(c(G1, F1, state(D1, T1, [Next, Curr | R])),
+                ( edge(Crit, Curr, Next, StepD, StepT, _),
+                  \+ get_assoc(Next, Closed, _),
+                  D1 is GD + StepD,
+                  T1 is GT + StepT,
+                  cost(M, D1, T1, G1),
+                  heuristic(M, Next, Goal, H),
+                  score(M, D1, T1, H, F1) ),
+                Children),
+        push_children(Children, Q1, Best0, Q2, Best),
+        a_star_queue(M, Crit, Goal, Q2, Closed, Best, Path, Dist, Time, N1, N)
+    ).
+
+score(M, D, T, H, F) :-
+    cost(M, D, T, G),
+    F is G + H.
 
-a_star_queue(M, Crit, Goal, [state(_,GD,GT,[Curr|R])|Others],
-             Goal, Path, Dist, Time) :-
 
-    findall(state(F1, D1, T1, [Next, Curr|R]),
-            ( edge(Crit, Curr, Next, StepD, StepT, _),
-              \+ member(Next, [Curr|R]),
-              D1 is GD + StepD,
-              T1 is GT + StepT,
-              heuristic(M, Next, Goal, H),
-              score(M, D1, T1, H, F1) ),
-            Children),
+% ============================================================
+% A* Heuristic
+% Distance mode: great-circle km to the goal. Time mode: that distance
+% divided by the fastest road speed (km/min). Both are scaled by the
+% smallest road-km / straight-line-km ratio in the KB, so H drops by no
+% more than the cost of any road and stays consistent. That only holds
+% when every road end has a coord: a node without one gets H = 0 next to
+% neighbours with H > 0, so then the scale is 0 and A* is plain Dijkstra.
+
+:- dynamic heuristic_bounds_cache/2.
+
+heuristic(Mode, Node, Goal, H) :-
+    coord(Node, Lat1, Lon1),
+    coord(Goal, Lat2, Lon2),
+    !,
+    great_circle_km(Lat1, Lon1, Lat2, Lon2, Km),
+    heuristic_bounds(Scale, MaxSpeed),
+    (   Mode \== time
+    ->  H is Km * Scale
+    ;   MaxSpeed == none
+    ->  H = 0
+    ;   H is Km * Scale / MaxSpeed
+    ).
+heuristic(_, _, _, 0).
+
+great_circle_km(Lat1, Lon1, Lat2, Lon2, Km) :-
+    P1 is Lat1 * pi / 180,
+    P2 is Lat2 * pi / 180,
+    DP is P2 - P1,
+    DL is (Lon2 - Lon1) * pi / 180,
+    A is sin(DP / 2) * sin(DP / 2)
+       + cos(P1) * cos(P2) * sin(DL / 2) * sin(DL / 2),
+    Km is 2 * 6371.0 * asin(min(1.0, sqrt(A))).
+
+% computed once per loaded KB; retract heuristic_bounds_cache/2 after
+% changing road/6 or coord/3
+heuristic_bounds(Scale, MaxSpeed) :-
+    heuristic_bounds_cache(Scale, MaxSpeed), !.
+heuristic_bounds(Scale, MaxSpeed) :-
+    (   road(A0, B0, _, _, _, _),
+        ( \+ coord(A0, _, _) ; \+ coord(B0, _, _) )
+    ->  Ratios = [0.0]
+    ;   findall(Ratio,
+            ( road(A, B, D, _, _, _),
+              coord(A, La1, Lo1),
+              coord(B, La2, Lo2),
+              great_circle_km(La1, Lo1, La2, Lo2, Km),
+              Km > 0,
+              Ratio is D / Km ),
+            Ratios)
+    ),
+    min_list([1.0 | Ratios], Scale),
+    (   road(_, _, D0, _, T0, _), T0 =< 0, D0 > 0
+    ->  MaxSpeed = none
+    ;   findall(S, ( road(_, _, D1, _, T1, _), T1 > 0, S is D1 / T1 ), Speeds),
+        max_list([0.0001 | Speeds], MaxSpeed)
+    ),
+    assertz(heuristic_bounds_cache(Scale, MaxSpeed)).
 
-    insert_children_astar(M, Children, Others, NewQ),
-    a_star_queue(M, Crit, Goal, NewQ, Goal, Path, Dist, Time).
 
-heuristic(_,_,_,0).  % placeholder heuristic
+% ============================================================
+% Pareto Routes
+% pareto(+Start, +Goal, -Routes): every route that no other route beats
+% on distance, time and rough-road km (unpaved, broken_cisterns and
+% deep_potholes roads) at once, as route(Path, Dist, Time, Rough) terms
+% in increasing distance. Label-setting search: labels leave the heap in
+% (Dist, Time, Rough) order, so a label that is not dominated when it is
+% popped never will be. Labels dominated at their node or by a route
+% already found are pruned before they are pushed.
+
+rough_type(unpaved).
+rough_type(broken_cisterns).
+rough_type(deep_potholes).
+
+rough_km(Type, D, D) :- rough_type(Type), !.
+rough_km(_, _, 0).
+
+pareto(Start, Goal, Routes) :-
+    singleton_heap(H, k(0, 0, 0), l(Start, [Start])),
+    empty_assoc(Perm),
+    pareto_queue(H, Goal, Perm, [], Found),
+    reverse(Found, Routes).
+
+pareto_queue(H0, Goal, Perm0, Found0, Found) :-
+    get_from_heap(H0, k(D, T, X), l(Curr, RevPath), H1),
+    !,
+    node_labels(Curr, Perm0, Labels),
+    (   dominated(D-T-X, Labels)
+    ->  pareto_queue(H1, Goal, Perm0, Found0, Found)
+    ;   put_assoc(Curr, Perm0, [D-T-X | Labels], Perm),
+        (   Curr == Goal
+        ->  reverse(RevPath, Path),
+            pareto_queue(H1, Goal, Perm, [route(Path, D, T, X) | Found0], Found)
+        ;   findall(D1-T1-X1, member(route(_, D1, T1, X1), Found0), GoalLabels),
+            findall(k(D1, T1, X1)-l(Next, [Next | RevPath]),
+                    ( edge([], Curr, Next, StepD, StepT, Type),
+                      \+ memberchk(Next, RevPath),
+                      D1 is D + StepD,
+                      T1 is T + StepT,
+                      rough_km(Type, StepD, StepX),
+                      X1 is X + StepX,
+                      node_labels(Next, Perm, NextLabels),
+                      \+ dominated(D1-T1-X1, NextLabels),
+                      \+ dominated(D1-T1-X1, GoalLabels) ),
+                    Children),
+            push_labels(Children, H1, H2),
+            pareto_queue(H2, Goal, Perm, Found0, Found)
+        )
+    ).
+pareto_queue(_, _, _, Found, Found).
+
+node_labels(Node, Perm, Labels) :-
+    (   get_assoc(Node, Perm, Labels0)
+    ->  Labels = Labels0
+    ;   Labels = []
+    ).
+
+% D-T-X is no better than some label in the list on every criterion
+dominated(D-T-X, Labels) :-
+    member(D0-T0-X0, Labels),
+    D0 =< D, T0 =< T, X0 =< X,
+    !.
+
+push_labels([], H, H).
+push_labels([K-L | Rest], H0, H) :-
+    add_to_heap(H0, K, L, H1),
+    push_labels(Rest, H1, H).
+
+% run_pareto(+Start, +Goal, +Format), Format = text | json.
+% text prints P|Path|Dist|Time|Rough per route; json prints
+% {"routes":[{"path":[...],"distance":D,"time":T,"rough":R}, ...]}
+run_pareto(Start, Goal, text) :-
+    pareto(Start, Goal, Routes),
+    forall(member(route(Path, D, T, X), Routes),
+           format('P|~w|~2f|~2f|~2f~n', [Path, D, T, X])).
+run_pareto(Start, Goal, json) :-
+    pareto(Start, Goal, Routes),
+    findall(json([path=Path, distance=D, time=T, rough=X]),
+            member(route(Path, D, T, X), Routes),
+            Objs),
+    json_write(current_output, json([routes=Objs]), [width(0)]).
 
-score(distance,D,_,H,F) :- F is D + H.
-score(time,    _,T,H,F) :- F is T + H.
-score(_,       D,_,H,F) :- F is D + H.
 
-insert_children_astar(_,[],Q,Q).
-insert_children_astar(M,[S|R],Q2,Out) :-
-    insert_state_astar(M,S,Q2,Q3),
-    insert_children_astar(M,R,Q3,Out).
+% ============================================================
+% Reachability (one-to-many)
+% reach(+Mode, +CritAtom, +Start, +Limit, -Tree): the shortest-path tree
+% from Start over the roads CritAtom allows, costed by Mode (distance or
+% time), as n(Node, Prev, Dist, Time) terms in settle order (Prev = none
+% for Start). Limit is a cost bound (km or minutes) or none; children over
+% the bound are never pushed and the search stops once the cheapest
+% frontier entry exceeds it.
+
+reach(Mode, CritAtom, Start, Limit, Tree) :-
+    criteria_list(CritAtom, Crit),
+    empty_heap(H0),
+    add_to_heap(H0, 0, state(0, 0, [Start]), H),
+    empty_assoc(Closed),
+    list_to_assoc([Start-0], Best),
+    reach_queue(Mode, Crit, Limit, H, Closed, Best, Tree).
+
+reach_queue(Mode, Crit, Limit, H0, Closed0, Best0, Tree) :-
+    (   get_from_heap(H0, C0, state(D0, T0, [Curr | R]), H1),
+        within_limit(C0, Limit)
+    ->  (   get_assoc(Curr, Closed0, _)
+        ->  reach_queue(Mode, Crit, Limit, H1, Closed0, Best0, Tree)
+        ;   put_assoc(Curr, Closed0, true, Closed),
+            ( R = [Prev | _] -> true ; Prev = none ),
+            Tree = [n(Curr, Prev, D0, T0) | Rest],
+            findall(c(C, C, state(D1, T1, [Next, Curr])),
+                    ( edge(Crit, Curr, Next, StepD, StepT, _),
+                      \+ get_assoc(Next, Closed, _),
+                      D1 is D0 + StepD,
+                      T1 is T0 + StepT,
+                      cost(Mode, D1, T1, C),
+                      within_limit(C, Limit) ),
+                    Children),
+            push_children(Children, H1, Best0, H2, Best),
+            reach_queue(Mode, Crit, Limit, H2, Closed, Best, Rest)
+        )
+    ;   Tree = []
+    ).
+
+within_limit(_, none) :- !.
+within_limit(C, Limit) :- C =< Limit.
+
+% run_reach(+Mode, +CritAtom, +Start, +Limit, +Format), Format = text | json.
+% text prints N|Node|Prev|Dist|Time per node; json prints
+% {"tree":[{"node":N,"prev":P,"distance":D,"time":T}, ...]} (prev null at Start)
+run_reach(Mode, CritAtom, Start, Limit, text) :-
+    reach(Mode, CritAtom, Start, Limit, Tree),
+    forall(member(n(N, P, D, T), Tree),
+           format('N|~w|~w|~2f|~2f~n', [N, P, D, T])).
+run_reach(Mode, CritAtom, Start, Limit, json) :-
+    reach(Mode, CritAtom, Start, Limit, Tree),
+    findall(json([node=N, prev=P1, distance=D, time=T]),
+            ( member(n(N, P, D, T), Tree),
+              ( P == none -> P1 = @(null) ; P1 = P ) ),
+            Objs),
+    json_write(current_output, json([tree=Objs]), [width(0)]).
 
-insert_state_astar(_,S,[],[S]).
-insert_state_astar(M,S,[Q|Rest],[S,Q|Rest]) :-
-    better_astar(M,S,Q), !.
-insert_state_astar(M,S,[Q|Rest],[Q|Rest2]) :-
-    insert_state_astar(M,S,Rest,Rest2).
 
-better_astar(_, state(F1,_,_,_), state(F2,_,_,_)) :- F1 < F2.
+% ============================================================
+% Departure-Time Search
+% route_at(+CritAtom, +Depart, +Start, +Goal, -Path, -Dist, -Time): the
+% earliest arrival at Goal leaving Start at clock minute Depart, over the
+% roads CritAtom allows. Dijkstra keyed on the arrival clock, costing each
+% road when it is reached, so nothing is rebuilt per departure time.
+% Profiled roads are driven step by step (leaving later never arrives
+% earlier), and a road met inside a closure window is entered when the
+% window ends, so Time (arrival - Depart) includes any wait.
+
+route_at(CritAtom, Depart, Start, Goal, Path, Dist, Time) :-
+    route_at(CritAtom, Depart, Start, Goal, Path, Dist, Time, _).
+
+route_at(CritAtom, Depart, Start, Goal, Path, Dist, Time, Expanded) :-
+    criteria_list(CritAtom, Crit),
+    empty_heap(H0),
+    add_to_heap(H0, Depart, state(0, Depart, [Start]), H),
+    empty_assoc(Closed),
+    list_to_assoc([Start-Depart], Best),
+    td_queue(Crit, H, Closed, Best, Goal, RevPath, Dist, Arrive, 0, Expanded),
+    reverse(RevPath, Path),
+    Time is Arrive - Depart.
+
+td_queue(Crit, H0, Closed0, Best0, Goal, Path, Dist, Arrive, N0, N) :-
+    get_from_heap(H0, _, state(D0, C0, [Curr | R]), H1),
+    (   Curr == Goal
+    ->  Path = [Curr | R], Dist = D0, Arrive = C0, N = N0
+    ;   get_assoc(Curr, Closed0, _)
+    ->  td_queue(Crit, H1, Closed0, Best0, Goal, Path, Dist, Arrive, N0, N)
+    ;   put_assoc(Curr, Closed0, true, Closed),
+        N1 is N0 + 1,
+        findall(c(C1, C1, state(D1, C1, [Next, Curr | R])),
+                ( td_edge(Crit, Curr, C0, Next, StepD, C1),
+                  \+ get_assoc(Next, Closed, _),
+                  D1 is D0 + StepD ),
+                Children),
+        push_children(Children, H1, Best0, H2, Best),
+        td_queue(Crit, H2, Closed, Best, Goal, Path, Dist, Arrive, N1, N)
+    ).
+
+% td_edge(+Crit, +From, +Clock, -To, -Dist, -Arrive)
+td_edge(Crit, From, Clock, To, Dist, Arrive) :-
+    road(From, To, Dist, Type, Time, Status),
+    td_status(Status, Open),
+    allowed(Type, Open, Crit),
+    (   closure_window(From, To, Windows)
+    ->  Deadline is Clock + 1440,
+        enter_at(Windows, Clock, Deadline, Enter)
+    ;   Enter = Clock
+    ),
+    drive_time(From, To, Time, Enter, Arrive).
+
+% a scheduled road is open to route_at/7 outside its closure windows
+td_status(scheduled, open) :- !.
+td_status(Status, Status).
+
+% enter_at(+Windows, +Clock, +Deadline, -Enter): Clock, or the end of the
+% window it falls in (repeatedly); fails if the road stays shut all day
+enter_at(Windows, Clock, Deadline, Enter) :-
+    Clock =< Deadline,
+    (   member(W, Windows),
+        window_end(W, Clock, End)
+    ->  enter_at(Windows, End, Deadline, Enter)
+    ;   Enter = Clock
+    ).
+
+window_end(From-To, Clock, End) :-
+    clock_split(Clock, Day, Min),
+    (   From =< To
+    ->  From =< Min, Min < To,
+        End is Day + To
+    ;   Min >= From
+    ->  End is Day + 1440 + To
+    ;   Min < To,
+        End is Day + To
+    ).
+
+clock_split(Clock, Day, Min) :-
+    Day is floor(Clock / 1440) * 1440,
+    Min is Clock - Day.
+
+% drive_time(+From, +To, +TimeMin, +Enter, -Arrive)
+drive_time(From, To, Time, Enter, Arrive) :-
+    (   road_profile(From, To, Name),
+        time_profile(Name, Steps)
+    ->  drive(Steps, Time, Enter, Arrive)
+    ;   Arrive is Enter + Time
+    ).
+
+% drive(+Steps, +Work, +Clock, -Arrive): Work minutes of free-flow driving
+% spent across the profile steps from Clock on
+drive(Steps, Work, Clock, Arrive) :-
+    clock_split(Clock, Day, Min),
+    profile_step(Steps, Min, Factor, Next),
+    Span is (Day + Next - Clock) / Factor,
+    (   Work =< Span
+    ->  Arrive is Clock + Work * Factor
+    ;   Rest is Work - Span,
+        Clock1 is Day + Next,
+        drive(Steps, Rest, Clock1, Arrive)
+    ).
+
+% the Factor in force at minute Min and the minute its step ends; a
+% profile that does not start at 0 or has a Factor =< 0 is an error
+profile_step(Steps, Min, Factor, Next) :-
+    (   Steps = [S0-_ | _], S0 =:= 0,
+        forall(member(_-F, Steps), F > 0)
+    ->  step_at(Steps, Min, Factor, Next)
+    ;   domain_error(time_profile, Steps)
+    ).
+
+step_at([_-F | Rest], Min, Factor, Next) :-
+    (   Rest = [S-_ | _], S =< Min
+    ->  step_at(Rest, Min, Factor, Next)
+    ;   Rest = [S-_ | _]
+    ->  Factor = F, Next = S
+    ;   Factor = F, Next = 1440
+    ).
+
+% run_query_at(+CritAtom, +Depart, +Start, +Goal, +Format), Format = text | json.
+% Prints what run_query/4 prints for the same format.
+run_query_at(CritAtom, Depart, Start, Goal, text) :-
+    route_at(CritAtom, Depart, Start, Goal, Path, D, T),
+    format('~w|~2f|~2f', [Path, D, T]).
+run_query_at(CritAtom, Depart, Start, Goal, json) :-
+    (   route_at(CritAtom, Depart, Start, Goal, Path, D, T, N)
+    ->  json_write(current_output, json([path=Path, distance=D, time=T, expanded=N]), [width(0)])
+    ;   json_write(current_output, json([path= @(null)]), [width(0)])
+    ).
+
+% export_schedules(json) prints {"profiles":{Name:[[From,Factor], ...]},
+% "roads":[[Source,Dest,Name], ...], "closures":[[Source,Dest,[[From,To], ...]], ...]}
+export_schedules(json) :-
+    schedule_rows(Profiles, Roads, Closures),
+    findall(Name=Steps, member([Name, Steps], Profiles), Pairs),
+    json_write(current_output, json([profiles=json(Pairs), roads=Roads, closures=Closures]), [width(0)]).
+
+schedule_rows(Profiles, Roads, Closures) :-
+    findall([Name, Rows],
+            ( time_profile(Name, Steps),
+              findall([S, F], member(S-F, Steps), Rows) ),
+            Profiles),
+    findall([A, B, Name], road_profile(A, B, Name), Roads),
+    findall([A, B, Rows],
+            ( closure_window(A, B, Windows),
+              findall([F, T], member(F-T, Windows), Rows) ),
+            Closures).
+
+
+% ============================================================
+% Expansion Benchmark
+% compare_expansions(+Mode, +Start, +Goal) prints one line per search:
+% Algo|Expanded|Dist|Time
+
+compare_expansions(Mode, Start, Goal) :-
+    forall(member(Algo, [dijkstra, a_star, bidijkstra]),
+           (   expanded_run(Algo, Mode, Start, Goal, N, D, T)
+           ->  format("~w|~w|~2f|~2f~n", [Algo, N, D, T])
+           ;   format("~w|none~n", [Algo])
+           )).
+
+expanded_run(dijkstra, Mode, Start, Goal, N, D, T) :-
+    dijkstra(Mode, [], Start, Goal, _, D, T, N).
+expanded_run(a_star, Mode, Start, Goal, N, D, T) :-
+    a_star(Mode, [], Start, Goal, _, D, T, N).
+expanded_run(bidijkstra, Mode, Start, Goal, N, D, T) :-
+    bidijkstra(Mode, [], Start, Goal, _, D, T, N).
 
 
 % ============================================================
@@ -178,6 +749,10 @@ criteria_list(avoid_unpaved,      [avoid_unpaved]).
 criteria_list(avoid_broken,       [avoid_broken]).
 criteria_list(avoid_deep_potholes,[avoid_deep_potholes]).
 criteria_list(loose_constraints,  []).
+criteria_list(astar_distance,     []).
+criteria_list(astar_time,         []).
+criteria_list(bidir_distance,     []).
+criteria_list(bidir_time,         []).
 
 mode_for(shortest_distance,   distance, dijkstra).
 mode_for(fastest_time,       time,     dijkstra).
@@ -185,19 +760,68 @@ mode_for(avoid_unpaved,      distance, dijkstra).
 mode_for(avoid_broken,       distance, dijkstra).
 mode_for(avoid_deep_potholes,distance, dijkstra).
 mode_for(loose_constraints,  distance, bfs).
+mode_for(astar_distance,     distance, astar).
+mode_for(astar_time,         time,     astar).
+mode_for(bidir_distance,     distance, bidijkstra).
+mode_for(bidir_time,         time,     bidijkstra).
+
+
+% ============================================================
+% Live Updates
+% set_road/6 replaces every Source -> Dest fact with a single new one,
+% remove_road/2 drops them. Both reset the A* heuristic bounds.
+
+set_road(A, B, D, Type, Time, Status) :-
+    retractall(road(A, B, _, _, _, _)),
+    assertz(road(A, B, D, Type, Time, Status)),
+    retractall(heuristic_bounds_cache(_, _)).
 
+remove_road(A, B) :-
+    retractall(road(A, B, _, _, _, _)),
+    retractall(heuristic_bounds_cache(_, _)).
 
 % ============================================================
 % Main Interface
 
-run_query(CritAtom, Start, Goal) :-
+% route(+CritAtom, +Start, +Goal, -Path, -Dist, -Time)
+route(CritAtom, Start, Goal, Path, D, T) :-
+    route(CritAtom, Start, Goal, Path, D, T, _).
+
+% route/7 also gives the number of states the search expanded
+route(CritAtom, Start, Goal, Path, D, T, Expanded) :-
     criteria_list(CritAtom, CritList),
     mode_for(CritAtom, Mode, Algo),
     ( Algo = bfs ->
-        bfs(CritList, Start, Goal, Path, D, T)
+        bfs(CritList, Start, Goal, Path, D, T, Expanded)
     ; Algo = dijkstra ->
-        dijkstra(Mode, CritList, Start, Goal, Path, D, T)
+        dijkstra(Mode, CritList, Start, Goal, Path, D, T, Expanded)
     ; Algo = astar ->
-        a_star(Mode, CritList, Start, Goal, Path, D, T)
-    ),
-    format('~w|~2f|~2f', [Path, D, T]).
\ No newline at end of file
+        a_star(Mode, CritList, Start, Goal, Path, D, T, Expanded)
+    ; Algo = bidijkstra ->
+        bidijkstra(Mode, CritList, Start, Goal, Path, D, T, Expanded)
+    ).
+
+run_query(CritAtom, Start, Goal) :-
+    route(CritAtom, Start, Goal, Path, D, T),
+    format('~w|~2f|~2f', [Path, D, T]).
+
+% run_query(+CritAtom, +Start, +Goal, +Format), Format = text | json.
+% json prints {"path":[...],"distance":D,"time":T,"expanded":N}, or
+% {"path":null} when there is no route; N is the states the search expanded.
+run_query(CritAtom, Start, Goal, text) :-
+    run_query(CritAtom, Start, Goal).
+run_query(CritAtom, Start, Goal, json) :-
+    (   route(CritAtom, Start, Goal, Path, D, T, N)
+    ->  json_write(current_output, json([path=Path, distance=D, time=T, expanded=N]), [width(0)])
+    ;   json_write(current_output, json([path= @(null)]), [width(0)])
+    ).
+
+% run_queries(+Queries): Queries is a list of q(Crit, Start, Goal).
+% Prints one line per query, in order:
+%   R|Crit|Start|Goal|Path|Dist|Time    or    R|Crit|Start|Goal|none
+run_queries(Queries) :-
+    forall(member(q(C, S, G), Queries),
+           (   route(C, S, G, Path, D, T)
+           ->  format('R|~w|~w|~w|~w|~2f|~2f~n', [C, S, G, Path, D, T])
+           ;   format('R|~w|~w|~w|none~n', [C, S, G])
+           )).
\ No newline at end of file
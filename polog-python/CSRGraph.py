@@ -0,0 +1,292 @@
+"""
+Compressed sparse row (CSR) road graph for the routing core.
+
+Nodes are integer ids into `nodes`. Outgoing roads of node i are the slice
+indptr[i]:indptr[i + 1] of the edge arrays:
+    indices   int32    destination node id
+    distance  float64
+    time      float64
+    rtype     uint8    index into `types`
+    status    uint8    index into `statuses`
+allowed/3 then becomes a vectorised mask: the road's status is open and its
+type is not one the criteria avoid. Converts to and from the nx.DiGraph used
+for drawing.
+"""
+import heapq
+from collections import deque
+
+import numpy as np
+
+from GraphSnapshot import GraphSnapshot
+from RoutingEngine import AVOIDS, CRITERIA_LIST, MODE_FOR
+
+# same limit as the snapshot's u1 rtype / status columns
+MAX_CODES = 255
+
+
+class CSRGraph:
+    def __init__(self, nodes, types, statuses, indptr, indices, distance, time, rtype, status):
+        self.nodes = nodes
+        self.types = types
+        self.statuses = statuses
+        self.node_id = {n: i for i, n in enumerate(nodes)}
+        self.indptr = indptr
+        self.indices = indices
+        self.distance = distance
+        self.time = time
+        self.rtype = rtype
+        self.status = status
+        self._masks = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def n_edges(self):
+        return len(self.indices)
+
+    @property
+    def nbytes(self):
+        """
+        Bytes held by the edge and offset arrays (node names excluded).
+        """
+        return sum(a.nbytes for a in (self.indptr, self.indices, self.distance, self.time, self.rtype, self.status))
+
+    # ---------------------------
+    # Conversion
+    # ---------------------------
+    @classmethod
+    def from_snapshot(cls, snap):
+        """
+        Build from a GraphSnapshot's columns without touching networkx. When
+        the snapshot's edges are already grouped by src, the memory-mapped
+        columns are used in place (no copy), so every process that opens the
+        same file shares those pages.
+        """
+        n = len(snap.nodes)
+        src = np.asarray(snap.src)
+        order = np.argsort(src, kind="stable")
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        if len(src) < 2 or bool(np.all(src[1:] >= src[:-1])):
+            dst = np.asarray(snap.dst)
+            return cls(list(snap.nodes), list(snap.types), list(snap.statuses), indptr,
+                       dst.view(np.int32) if dst.dtype.itemsize == 4 else dst.astype(np.int32),
+                       np.asarray(snap.distance, dtype=np.float64),
+                       np.asarray(snap.time, dtype=np.float64),
+                       np.asarray(snap.rtype, dtype=np.uint8),
+                       np.asarray(snap.status, dtype=np.uint8))
+        return cls(list(snap.nodes), list(snap.types), list(snap.statuses), indptr,
+                   np.asarray(snap.dst, dtype=np.int32)[order],
+                   np.asarray(snap.distance, dtype=np.float64)[order],
+                   np.asarray(snap.time, dtype=np.float64)[order],
+                   np.asarray(snap.rtype, dtype=np.uint8)[order],
+                   np.asarray(snap.status, dtype=np.uint8)[order])
+
+    @classmethod
+    def from_networkx(cls, G):
+        return cls.from_snapshot(GraphSnapshot.from_networkx(G))
+
+    def to_networkx(self):
+        """
+        nx.DiGraph with the usual distance / rtype / time / status attributes.
+        """
+        import networkx as nx
+        nodes = self.nodes
+        types = self.types
+        statuses = self.statuses
+        G = nx.DiGraph()
+        G.add_nodes_from(nodes)
+        src = np.repeat(np.arange(len(nodes)), np.diff(self.indptr))
+        G.add_edges_from(
+            (nodes[s], nodes[d], {"distance": dist, "rtype": types[t], "time": tm, "status": statuses[st]})
+            for s, d, dist, tm, t, st in zip(src.tolist(), self.indices.tolist(), self.distance.tolist(),
+                                             self.time.tolist(), self.rtype.tolist(), self.status.tolist()))
+        return G
+
+    def set_edge(self, src, dst, distance, rtype, time, status):
+        """
+        Patch an existing road in place. Returns False if the road or its
+        type is new, in which case the CSR arrays have to be rebuilt.
+        """
+        u = self.node_id.get(src)
+        v = self.node_id.get(dst)
+        if u is None or v is None or rtype not in self.types:
+            return False
+        if status not in self.statuses and len(self.statuses) >= MAX_CODES:
+            return False
+        lo, hi = int(self.indptr[u]), int(self.indptr[u + 1])
+        hits = np.flatnonzero(self.indices[lo:hi] == v)
+        if not len(hits):
+            return False
+        e = lo + int(hits[0])
+        # columns mapped read-only from a snapshot are copied on first write
+        if not self.distance.flags.writeable:
+            self.distance = self.distance.copy()
+            self.time = self.time.copy()
+        if not self.rtype.flags.writeable:
+            self.rtype = self.rtype.copy()
+            self.status = self.status.copy()
+        if status not in self.statuses:
+            self.statuses.append(status)
+        self.distance[e] = distance
+        self.time[e] = time
+        self.rtype[e] = self.types.index(rtype)
+        self.status[e] = self.statuses.index(status)
+        self._masks.clear()
+        return True
+
+    # ---------------------------
+    # allowed/3 as a mask
+    # ---------------------------
+    def type_allowed(self, crit):
+        """
+        Boolean array over `types`, False for the types the criteria flags
+        crit avoid.
+        """
+        avoided = {AVOIDS.get(flag) for flag in crit}
+        return np.array([t not in avoided for t in self.types], dtype=bool)
+
+    def allowed_mask(self, crit):
+        """
+        Boolean array over all edges, True where allowed/3 would succeed.
+        Cached per criteria flag set.
+        """
+        key = tuple(sorted(crit))
+        if key not in self._masks:
+            is_open = np.array([s == "open" for s in self.statuses], dtype=bool)
+            self._masks[key] = is_open[self.status] & self.type_allowed(crit)[self.rtype]
+        return self._masks[key]
+
+    def neighbours(self, i, ok):
+        """
+        (node id, edge index) pairs leaving node i whose mask entry is True.
+        """
+        lo, hi = int(self.indptr[i]), int(self.indptr[i + 1])
+        sel = np.flatnonzero(ok[lo:hi]) + lo
+        return zip(self.indices[sel].tolist(), sel.tolist())
+
+
+# ---------------------------
+# Searches on the CSR arrays
+# ---------------------------
+def _dijkstra(C, weight, ok, s, g):
+    best = {s: 0.0}
+    pred = {s: -1}
+    done = set()
+    heap = [(0.0, 0, s)]
+    order = 1
+    while heap:
+        cost, _, u = heapq.heappop(heap)
+        if u in done:
+            continue
+        if u == g:
+            return pred
+        done.add(u)
+        for v, e in C.neighbours(u, ok):
+            if v in done:
+                continue
+            c = cost + weight[e]
+            if v in best and best[v] <= c:
+                continue
+            best[v] = c
+            pred[v] = u
+            heapq.heappush(heap, (c, order, v))
+            order += 1
+    return None
+
+def _bfs(C, ok, s, g):
+    pred = {s: -1}
+    q = deque([s])
+    while q:
+        u = q.popleft()
+        if u == g:
+            return pred
+        for v, _ in C.neighbours(u, ok):
+            if v not in pred:
+                pred[v] = u
+                q.append(v)
+    return None
+
+def reach_csr(C, criteria_atom, start_atom, mode="time", limit=None):
+    """
+    Shortest-path tree from start_atom over the roads criteria_atom allows,
+    costed by mode ("distance" or "time"), like reach/5: a list of
+    (node, prev, dist, time) in settle order, prev None at the start. With a
+    limit, nodes costing more are left out and the search stops as soon as
+    the frontier passes it.
+    """
+    if criteria_atom not in CRITERIA_LIST:
+        return []
+    s = C.node_id.get(start_atom)
+    if s is None:
+        return []
+    ok = C.allowed_mask(CRITERIA_LIST[criteria_atom])
+    weight = C.time if mode == "time" else C.distance
+    limit = float("inf") if limit is None else limit
+    best = {s: 0.0}
+    label = {s: (-1, 0.0, 0.0)}
+    done = set()
+    tree = []
+    heap = [(0.0, 0, s)]
+    order = 1
+    while heap:
+        cost, _, u = heapq.heappop(heap)
+        if cost > limit:
+            break
+        if u in done:
+            continue
+        done.add(u)
+        prev, d0, t0 = label[u]
+        tree.append((C.nodes[u], C.nodes[prev] if prev >= 0 else None, d0, t0))
+        for v, e in C.neighbours(u, ok):
+            if v in done:
+                continue
+            c = cost + weight[e]
+            if c > limit or (v in best and best[v] <= c):
+                continue
+            best[v] = c
+            label[v] = (u, d0 + float(C.distance[e]), t0 + float(C.time[e]))
+            heapq.heappush(heap, (c, order, v))
+            order += 1
+    return tree
+
+def _edge(C, u, v, ok):
+    """
+    Index of the allowed edge u -> v.
+    """
+    lo, hi = int(C.indptr[u]), int(C.indptr[u + 1])
+    for e in range(lo, hi):
+        if C.indices[e] == v and ok[e]:
+            return e
+    raise KeyError((u, v))
+
+def find_route_csr(C, criteria_atom, start_atom, goal_atom):
+    """
+    Same contract as find_route_native: (path, dist, time) or None.
+    """
+    if criteria_atom not in CRITERIA_LIST:
+        return None
+    s = C.node_id.get(start_atom)
+    g = C.node_id.get(goal_atom)
+    if s is None or g is None:
+        return None
+    crit = CRITERIA_LIST[criteria_atom]
+    mode, algo = MODE_FOR[criteria_atom]
+    ok = C.allowed_mask(crit)
+    if algo == "bfs":
+        pred = _bfs(C, ok, s, g)
+    else:
+        pred = _dijkstra(C, C.time if mode == "time" else C.distance, ok, s, g)
+    if pred is None:
+        return None
+    ids = [g]
+    while pred[ids[-1]] != -1:
+        ids.append(pred[ids[-1]])
+    ids.reverse()
+    dist = ttime = 0.0
+    for u, v in zip(ids, ids[1:]):
+        e = _edge(C, u, v, ok)
+        dist += float(C.distance[e])
+        ttime += float(C.time[e])
+    return [C.nodes[i] for i in ids], dist, ttime
@@ -0,0 +1,632 @@
+"""
+Contraction hierarchies for point-to-point routes.
+
+One hierarchy per criteria profile (RouteIndex.profile_of: edge filter from
+criteria_list/2 plus distance, time or hops). Nodes are contracted in order
+of importance; contracting x adds a shortcut u -> w via x for every
+u -> x -> w that no witness path avoiding x matches. A query is then two
+small Dijkstras that only climb the order (forward from the start over
+upward roads, backward from the goal over downward ones), and shortcuts are
+unpacked back into roads.
+
+Saved per profile as <profile>.npz. When roads change, update() keeps the
+node order and redoes only the contractions a change can reach: those of a
+changed road's lower end point and, for a road that got dearer or closed,
+those that skipped a shortcut because of a witness path through it (every
+contraction notes those roads). A redone contraction whose shortcuts came
+out different passes the change on the same way. A cheaper or newly opened
+road cannot break a witness found earlier; at worst a shortcut becomes
+unnecessary.
+
+    python ContractionHierarchy.py      # (re)build every profile for the configured KB
+"""
+import heapq
+import json
+import os
+import threading
+
+import numpy as np
+
+from RouteIndex import profile_of
+from RoutingEngine import CRITERIA_LIST, MODE_FOR
+
+INF = float("inf")
+FORMAT = 1
+# witness searches give up after settling this many nodes (a missed witness
+# only costs an extra shortcut, never a wrong route)
+WITNESS_SETTLE_LIMIT = 64
+
+
+def profile_edges(C, criteria_atom):
+    """
+    {(u, v): weight} over C's node ids for the roads criteria_atom allows,
+    the cheapest of any parallel roads.
+    """
+    mode, algo = MODE_FOR[criteria_atom]
+    ok = C.allowed_mask(CRITERIA_LIST[criteria_atom])
+    if algo == "bfs":
+        weight = np.ones(C.n_edges)
+    else:
+        weight = C.time if mode == "time" else C.distance
+    src = np.repeat(np.arange(len(C), dtype=np.int64), np.diff(C.indptr))
+    keep = np.flatnonzero(ok)
+    edges = {}
+    for u, v, w in zip(src[keep].tolist(), C.indices[keep].tolist(), weight[keep].tolist()):
+        if w < edges.get((u, v), INF):
+            edges[(u, v)] = w
+    return edges
+
+# ---------------------------
+# Contraction
+# ---------------------------
+class _Contractor:
+    """
+    The remaining graph while nodes are contracted: out/inc adjacency dicts
+    {neighbour: weight} of the nodes not contracted yet.
+    """
+    def __init__(self, n, edges):
+        self.out = [{} for _ in range(n)]
+        self.inc = [{} for _ in range(n)]
+        self.done = [False] * n
+        for (u, v), w in edges.items():
+            self.add(u, v, w)
+
+    def add(self, u, v, w):
+        if self.done[u] or self.done[v]:
+            return False
+        if w < self.out[u].get(v, INF):
+            self.out[u][v] = w
+            self.inc[v][u] = w
+            return True
+        return False
+
+    def _witness(self, u, skip, limit, targets):
+        """
+        (costs, predecessors) from u avoiding skip, searched until every
+        target is settled, the costs pass limit, or WITNESS_SETTLE_LIMIT nodes.
+        """
+        dist = {u: 0.0}
+        pred = {}
+        heap = [(0.0, u)]
+        left = set(targets)
+        n = 0
+        while heap and left and n < WITNESS_SETTLE_LIMIT:
+            d, x = heapq.heappop(heap)
+            if d > dist[x]:
+                continue
+            if d > limit:
+                break
+            n += 1
+            left.discard(x)
+            for y, w in self.out[x].items():
+                if y == skip:
+                    continue
+                dy = d + w
+                if dy < dist.get(y, INF):
+                    dist[y] = dy
+                    pred[y] = x
+                    heapq.heappush(heap, (dy, y))
+        return dist, pred
+
+    def shortcuts(self, x, used=None):
+        """
+        (u, w, weight) shortcuts needed to contract x. used (a list) is
+        extended with the roads of every witness path that made one
+        unnecessary: only a dearer one of those can change the outcome.
+        """
+        needed = []
+        outs = self.out[x]
+        if not outs:
+            return needed
+        top = max(outs.values())
+        for u, wu in self.inc[x].items():
+            targets = [(w, wu + ww) for w, ww in outs.items() if w != u]
+            if not targets:
+                continue
+            dist, pred = self._witness(u, x, wu + top, [w for w, _ in targets])
+            for w, via in targets:
+                if dist.get(w, INF) > via:
+                    needed.append((u, w, via))
+                elif used is not None:
+                    while w != u:
+                        used.append((pred[w], w))
+                        w = pred[w]
+        return needed
+
+    def contract(self, x, used=None):
+        added = []
+        for u, w, c in self.shortcuts(x, used):
+            if self.add(u, w, c):
+                added.append((u, w, c))
+        self.drop(x)
+        return added
+
+    def drop(self, x):
+        """
+        Remove x and its roads without adding shortcuts.
+        """
+        for v in self.out[x]:
+            del self.inc[v][x]
+        for u in self.inc[x]:
+            del self.out[u][x]
+        self.out[x] = {}
+        self.inc[x] = {}
+        self.done[x] = True
+
+
+def _contract(n, edges):
+    """
+    Contract all n nodes, cheapest first by edge difference (shortcuts
+    added minus roads removed, plus neighbours already contracted).
+    Returns (order, shortcuts, depends): shortcuts are (u, w, weight, mid)
+    and depends[(u, v)] is the set of ranks that relied on a witness
+    through u -> v.
+    """
+    g = _Contractor(n, edges)
+    shortcuts = []
+    depends = {}
+    deleted = [0] * n
+
+    def priority(x):
+        return len(g.shortcuts(x)) - len(g.out[x]) - len(g.inc[x]) + deleted[x]
+
+    # lazy updates: a node's priority is re-checked when it reaches the top
+    heap = [(priority(x), x) for x in range(n)]
+    heapq.heapify(heap)
+    order = []
+    while heap:
+        _, x = heapq.heappop(heap)
+        if g.done[x]:
+            continue
+        p = priority(x)
+        if heap and p > heap[0][0]:
+            heapq.heappush(heap, (p, x))
+            continue
+        neighbours = set(g.out[x]) | set(g.inc[x])
+        used = []
+        for u, w, c in g.contract(x, used):
+            shortcuts.append((u, w, c, x))
+        for road in used:
+            depends.setdefault(road, set()).add(len(order))
+        order.append(x)
+        for y in neighbours:
+            deleted[y] += 1
+    return order, shortcuts, depends
+
+
+class _Recontractor:
+    """
+    Re-runs single contractions of a finished hierarchy. The graph as it was
+    when the node of rank r was contracted is every road and shortcut whose
+    ends rank above r and whose mid (if any) ranks below r.
+    """
+    def __init__(self, n, rank, edges, by_mid):
+        self.rank = rank
+        self.out = [[] for _ in range(n)]
+        self.inc = [[] for _ in range(n)]
+        for (u, w), c in edges.items():
+            self.out[u].append((w, c, -1))
+            self.inc[w].append((u, c, -1))
+        for x, roads in by_mid.items():
+            self.link(x, roads)
+
+    def link(self, x, roads):
+        for (u, w), c in roads.items():
+            self.out[u].append((w, c, x))
+            self.inc[w].append((u, c, x))
+
+    def unlink(self, x, roads):
+        for u, w in roads:
+            self.out[u] = [e for e in self.out[u] if e[2] != x]
+            self.inc[w] = [e for e in self.inc[w] if e[2] != x]
+
+    def _live(self, adj, r):
+        rank = self.rank
+        best = {}
+        for y, c, mid in adj:
+            if rank[y] > r and (mid < 0 or rank[mid] < r) and c < best.get(y, INF):
+                best[y] = c
+        return best
+
+    def _witness(self, u, r, limit, targets):
+        dist = {u: 0.0}
+        pred = {}
+        heap = [(0.0, u)]
+        left = set(targets)
+        n = 0
+        while heap and left and n < WITNESS_SETTLE_LIMIT:
+            d, x = heapq.heappop(heap)
+            if d > dist[x]:
+                continue
+            if d > limit:
+                break
+            n += 1
+            left.discard(x)
+            for y, w in self._live(self.out[x], r).items():
+                dy = d + w
+                if dy < dist.get(y, INF):
+                    dist[y] = dy
+                    pred[y] = x
+                    heapq.heappush(heap, (dy, y))
+        return dist, pred
+
+    def shortcuts(self, x, r, used):
+        """
+        {(u, w): weight} needed to contract x at rank r; like
+        _Contractor.shortcuts, used collects the roads of the witnesses.
+        """
+        needed = {}
+        outs = self._live(self.out[x], r)
+        if not outs:
+            return needed
+        top = max(outs.values())
+        for u, wu in self._live(self.inc[x], r).items():
+            targets = [(w, wu + ww) for w, ww in outs.items() if w != u]
+            if not targets:
+                continue
+            dist, pred = self._witness(u, r, wu + top, [w for w, _ in targets])
+            for w, via in targets:
+                if dist.get(w, INF) > via:
+                    needed[(u, w)] = via
+                else:
+                    while w != u:
+                        used.append((pred[w], w))
+                        w = pred[w]
+        return needed
+
+# ---------------------------
+# Hierarchy
+# ---------------------------
+class ContractionHierarchy:
+    def __init__(self, profile, criteria_atom, nodes, order, edges, shortcuts, depends, kb_hash=""):
+        self.profile = profile
+        self.criteria_atom = criteria_atom
+        self.nodes = list(nodes)
+        self.node_id = {name: i for i, name in enumerate(self.nodes)}
+        self.order = list(order)
+        self.edges = edges
+        self.shortcuts = shortcuts
+        self.depends = depends
+        self.kb_hash = kb_hash
+        self._index()
+
+    @classmethod
+    def build(cls, C, criteria_atom, kb_hash=""):
+        edges = profile_edges(C, criteria_atom)
+        order, shortcuts, depends = _contract(len(C), edges)
+        return cls(profile_of(criteria_atom), criteria_atom, C.nodes,
+                   order, edges, shortcuts, depends, kb_hash)
+
+    def copy(self):
+        """
+        An independent hierarchy to update() while this one keeps answering
+        routes.
+        """
+        depends = {pair: set(ranks) for pair, ranks in self.depends.items()}
+        return type(self)(self.profile, self.criteria_atom, self.nodes, self.order,
+                          dict(self.edges), list(self.shortcuts), depends, self.kb_hash)
+
+    def _index(self):
+        """
+        Upward adjacency for the forward search, downward (reversed) for the
+        backward one, and (u, w) -> (weight, mid) for unpacking.
+        """
+        n = len(self.nodes)
+        rank = [0] * n
+        for r, x in enumerate(self.order):
+            rank[x] = r
+        self.rank = rank
+        best = {}
+        for (u, w), c in self.edges.items():
+            best[(u, w)] = (c, -1)
+        for u, w, c, mid in self.shortcuts:
+            if c < best.get((u, w), (INF,))[0]:
+                best[(u, w)] = (c, mid)
+        self._best = best
+        self._up = [[] for _ in range(n)]
+        self._down = [[] for _ in range(n)]
+        for (u, w), (c, _) in best.items():
+            if rank[u] < rank[w]:
+                self._up[u].append((w, c))
+            else:
+                self._down[w].append((u, c))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def n_shortcuts(self):
+        return len(self.shortcuts)
+
+    # ---------------------------
+    # Updates
+    # ---------------------------
+    def update(self, C, kb_hash=""):
+        """
+        Bring the hierarchy in line with C (roads opened, closed or
+        re-weighted; new places are ranked last), keeping the node order.
+        Only contractions whose roads or witnesses changed are redone, and
+        a redone contraction whose shortcuts changed queues the ones that
+        see those shortcuts. Returns how many nodes were re-contracted.
+        """
+        n_old = len(self.nodes)
+        for name in C.nodes:
+            if name not in self.node_id:
+                self.node_id[name] = len(self.nodes)
+                self.nodes.append(name)
+        n = len(self.nodes)
+        remap = [self.node_id[name] for name in C.nodes]
+        edges = {(remap[u], remap[v]): w for (u, v), w in profile_edges(C, self.criteria_atom).items()}
+        self.kb_hash = kb_hash
+
+        order = self.order + list(range(n_old, n))
+        rank = [0] * n
+        for r, x in enumerate(order):
+            rank[x] = r
+        by_mid = {}
+        for u, w, c, mid in self.shortcuts:
+            by_mid.setdefault(mid, {})[(u, w)] = c
+        depends = self.depends
+        pending = []
+        queued = set()
+
+        def push(r):
+            if r < n and r not in queued:
+                queued.add(r)
+                heapq.heappush(pending, r)
+
+        def changed(pair, old, new, after=-1):
+            """
+            The cheapest u -> w at some stage went from old to new.
+            """
+            push(min(rank[pair[0]], rank[pair[1]]))
+            if new > old:
+                for r in depends.get(pair, ()):
+                    if r > after:
+                        push(r)
+
+        for pair in edges.keys() | self.edges.keys():
+            old, new = self.edges.get(pair, INF), edges.get(pair, INF)
+            if old != new:
+                changed(pair, old, new)
+        for r in range(n_old, n):
+            push(r)
+
+        g = _Recontractor(n, rank, edges, by_mid)
+        redone = 0
+        while pending:
+            r = heapq.heappop(pending)
+            x = order[r]
+            redone += 1
+            used = []
+            new = g.shortcuts(x, r, used)
+            old = by_mid.get(x, {})
+            for road in used:
+                depends.setdefault(road, set()).add(r)
+            if new == old:
+                continue
+            for pair in old.keys() | new.keys():
+                if old.get(pair, INF) != new.get(pair, INF):
+                    changed(pair, old.get(pair, INF), new.get(pair, INF), r)
+            g.unlink(x, old)
+            g.link(x, new)
+            by_mid[x] = new
+
+        self.order = order
+        self.edges = edges
+        self.shortcuts = [(u, w, c, mid) for mid, roads in by_mid.items() for (u, w), c in roads.items()]
+        self._index()
+        return redone
+
+    # ---------------------------
+    # Queries
+    # ---------------------------
+    def _search(self, s, t):
+        """
+        (cost, meeting node, forward preds, backward preds) or None.
+        """
+        dist = ({s: 0.0}, {t: 0.0})
+        pred = ({s: -1}, {t: -1})
+        heaps = ([(0.0, s)], [(0.0, t)])
+        adj = (self._up, self._down)
+        best, meet = INF, -1
+        side = 0
+        while heaps[0] or heaps[1]:
+            # a side stops once nothing on it can beat the best meeting
+            if not heaps[side] or heaps[side][0][0] >= best:
+                if not heaps[1 - side] or heaps[1 - side][0][0] >= best:
+                    break
+                side = 1 - side
+                continue
+            d, x = heapq.heappop(heaps[side])
+            mine, other = dist[side], dist[1 - side]
+            if d > mine[x]:
+                side = 1 - side
+                continue
+            if x in other and d + other[x] < best:
+                best, meet = d + other[x], x
+            # stall-on-demand: a higher node already reached reaches x cheaper
+            if any(y in mine and mine[y] + c < d for y, c in adj[1 - side][x]):
+                side = 1 - side
+                continue
+            for y, c in adj[side][x]:
+                dy = d + c
+                if dy < mine.get(y, INF):
+                    mine[y] = dy
+                    pred[side][y] = x
+                    heapq.heappush(heaps[side], (dy, y))
+            side = 1 - side
+        if meet < 0:
+            return None
+        return best, meet, pred[0], pred[1]
+
+    def _unpack(self, u, w, out):
+        stack = [(u, w)]
+        while stack:
+            a, b = stack.pop()
+            mid = self._best[(a, b)][1]
+            if mid < 0:
+                out.append(b)
+            else:
+                stack.append((mid, b))
+                stack.append((a, mid))
+
+    def route_ids(self, s, t):
+        """
+        Node ids (this hierarchy's numbering) of the best s -> t route, or None.
+        """
+        if s == t:
+            return [s]
+        found = self._search(s, t)
+        if found is None:
+            return None
+        _, meet, fwd, bwd = found
+        up = [meet]
+        while fwd[up[-1]] != -1:
+            up.append(fwd[up[-1]])
+        up.reverse()
+        down = [meet]
+        while bwd[down[-1]] != -1:
+            down.append(bwd[down[-1]])
+        path = [up[0]]
+        for a, b in zip(up, up[1:]):
+            self._unpack(a, b, path)
+        for a, b in zip(down, down[1:]):
+            self._unpack(a, b, path)
+        return path
+
+    def route(self, C, start_atom, goal_atom):
+        """
+        Same contract as find_route_csr: (path, dist, time) or None. C must
+        be the graph the hierarchy was built or last updated from.
+        """
+        s = self.node_id.get(start_atom)
+        t = self.node_id.get(goal_atom)
+        if s is None or t is None or start_atom not in C.node_id or goal_atom not in C.node_id:
+            return None
+        ids = self.route_ids(s, t)
+        if ids is None:
+            return None
+        path = [self.nodes[i] for i in ids]
+        mode, algo = MODE_FOR[self.criteria_atom]
+        weight = None if algo == "bfs" else (C.time if mode == "time" else C.distance)
+        ok = C.allowed_mask(CRITERIA_LIST[self.criteria_atom])
+        dist = ttime = 0.0
+        for a, b in zip(path, path[1:]):
+            u, v = C.node_id[a], C.node_id[b]
+            lo, hi = int(C.indptr[u]), int(C.indptr[u + 1])
+            candidates = [lo + i for i, y in enumerate(C.indices[lo:hi].tolist()) if y == v and ok[lo + i]]
+            e = candidates[0] if weight is None else min(candidates, key=lambda e: weight[e])
+            dist += float(C.distance[e])
+            ttime += float(C.time[e])
+        return path, dist, ttime
+
+    # ---------------------------
+    # Files
+    # ---------------------------
+    def save(self, path):
+        """
+        Write atomically (temp file + rename).
+        """
+        meta = {"format": FORMAT, "profile": self.profile, "criteria": self.criteria_atom,
+                "kb_hash": self.kb_hash, "nodes": self.nodes}
+        edge_keys = list(self.edges)
+        sc = self.shortcuts
+        deps = [(u, v, r) for (u, v), ranks in self.depends.items() for r in ranks]
+        arrays = {
+            "meta": np.array(json.dumps(meta)),
+            "order": np.asarray(self.order, dtype=np.int32),
+            "dep_src": np.asarray([d[0] for d in deps], dtype=np.int32),
+            "dep_dst": np.asarray([d[1] for d in deps], dtype=np.int32),
+            "dep_rank": np.asarray([d[2] for d in deps], dtype=np.int32),
+            "edge_src": np.asarray([u for u, _ in edge_keys], dtype=np.int32),
+            "edge_dst": np.asarray([v for _, v in edge_keys], dtype=np.int32),
+            "edge_weight": np.asarray([self.edges[k] for k in edge_keys], dtype=np.float64),
+            "sc_src": np.asarray([s[0] for s in sc], dtype=np.int32),
+            "sc_dst": np.asarray([s[1] for s in sc], dtype=np.int32),
+            "sc_weight": np.asarray([s[2] for s in sc], dtype=np.float64),
+            "sc_mid": np.asarray([s[3] for s in sc], dtype=np.int32),
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        The hierarchy saved at path, or None if there is none (or it is in an
+        older format).
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as z:
+            meta = json.loads(str(z["meta"]))
+            if meta.get("format") != FORMAT:
+                return None
+            edges = dict(zip(zip(z["edge_src"].tolist(), z["edge_dst"].tolist()), z["edge_weight"].tolist()))
+            shortcuts = list(zip(z["sc_src"].tolist(), z["sc_dst"].tolist(),
+                                 z["sc_weight"].tolist(), z["sc_mid"].tolist()))
+            depends = {}
+            for u, v, r in zip(z["dep_src"].tolist(), z["dep_dst"].tolist(), z["dep_rank"].tolist()):
+                depends.setdefault((u, v), set()).add(r)
+            return cls(meta["profile"], meta["criteria"], meta["nodes"], z["order"].tolist(),
+                       edges, shortcuts, depends, meta["kb_hash"])
+
+
+class HierarchySet:
+    """
+    The hierarchies of every profile, built on first use and kept in step
+    with the KB: a stale one (other KB hash) is updated on a copy, keeping
+    its node order, and the copy replaces it, so routes already running on
+    the old one are not disturbed. directory=None keeps them in memory only.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._hierarchies = {}
+        self._lock = threading.Lock()
+
+    def _path(self, profile):
+        return os.path.join(self.directory, profile + ".npz")
+
+    def get(self, C, criteria_atom, kb_hash):
+        profile = profile_of(criteria_atom)
+        with self._lock:
+            ch = self._hierarchies.get(profile)
+            if ch is None and self.directory:
+                ch = ContractionHierarchy.load(self._path(profile))
+            if ch is not None and ch.kb_hash == kb_hash:
+                self._hierarchies[profile] = ch
+                return ch
+            if ch is None:
+                ch = ContractionHierarchy.build(C, criteria_atom, kb_hash)
+            else:
+                ch = ch.copy()
+                ch.update(C, kb_hash)
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+                ch.save(self._path(profile))
+            self._hierarchies[profile] = ch
+            return ch
+
+    def route(self, C, criteria_atom, start_atom, goal_atom, kb_hash):
+        if criteria_atom not in CRITERIA_LIST:
+            return None
+        return self.get(C, criteria_atom, kb_hash).route(C, start_atom, goal_atom)
+
+
+if __name__ == "__main__":
+    import time
+    import RoadNetworkPathfinder as app
+    from CSRGraph import CSRGraph
+    try:
+        kb_hash = app.current_kb_version()[1]
+        C = CSRGraph.from_networkx(app.load_graph())
+        hierarchies = HierarchySet(app.CH_DIR)
+        for crit in CRITERIA_LIST:
+            t0 = time.perf_counter()
+            ch = hierarchies.get(C, crit, kb_hash)
+            print(f"{crit:<22}{ch.profile:<28}{ch.n_shortcuts:>8} shortcuts{time.perf_counter() - t0:>9.2f} s")
+    finally:
+        if app._POOL is not None:
+            app._POOL.close()
@@ -0,0 +1,77 @@
+"""
+Map layout cache.
+
+spring_layout only depends on the graph's nodes and edges, so positions are
+computed once per topology version and reused for every redraw. They can be
+persisted as JSON next to the KB so the next launch skips the layout too.
+"""
+import hashlib
+import json
+import os
+
+import networkx as nx
+
+
+def topology_version(G):
+    """
+    Stable hash of the node and edge sets (edge attributes are ignored).
+    """
+    h = hashlib.sha1()
+    for n in sorted(G.nodes()):
+        h.update(f"N{n}\n".encode("utf-8"))
+    for u, v in sorted(G.edges()):
+        h.update(f"E{u},{v}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+class LayoutCache:
+    """
+    Positions per topology version, optionally stored in cache_file.
+    """
+    def __init__(self, cache_file=None, seed=42):
+        self.cache_file = cache_file
+        self.seed = seed
+        self.version = None
+        self.pos = {}
+        self._load()
+
+    def _load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.version = data["version"]
+            self.pos = {n: tuple(xy) for n, xy in data["pos"].items()}
+        except Exception as e:
+            print("Ignoring unreadable layout cache:", e)
+
+    def _save(self):
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file, "w", encoding="utf-8") as f:
+                json.dump({"version": self.version,
+                           "pos": {n: [float(x), float(y)] for n, (x, y) in self.pos.items()}}, f)
+        except OSError as e:
+            print("Could not write layout cache:", e)
+
+    def positions(self, G):
+        """
+        Node positions for G. Only recomputed when the topology changed; nodes
+        that were already placed keep their spot so the map does not jump.
+        """
+        version = topology_version(G)
+        if version == self.version:
+            return self.pos
+        known = [n for n in G.nodes() if n in self.pos]
+        if known and len(known) < len(G):
+            pos = nx.spring_layout(G, pos={n: self.pos[n] for n in known}, fixed=known, seed=self.seed)
+        elif known:
+            pos = {n: self.pos[n] for n in G.nodes()}
+        else:
+            pos = nx.spring_layout(G, seed=self.seed)
+        self.pos = {n: (float(x), float(y)) for n, (x, y) in pos.items()}
+        self.version = version
+        self._save()
+        return self.pos
@@ -0,0 +1,145 @@
+"""
+Binary snapshot of the road graph, stored next to the .pl KB.
+
+Layout:  b"RNGS" | u32 header length | JSON header | padding | columns
+The header holds the KB hash, the interned node names and the type/status
+code tables, the edge count and the byte offset of each column:
+    src u32, dst u32     node ids
+    distance f64, time f64
+    rtype u8, status u8  codes into the header's types / statuses tables
+Columns are memory-mapped on load, so opening a snapshot costs almost nothing
+and needs no Prolog. Snapshots written from a graph keep edges grouped by
+src, which lets CSRGraph use the mapped columns as they are.
+"""
+import json
+import os
+import struct
+
+import networkx as nx
+import numpy as np
+
+MAGIC = b"RNGS"
+FORMAT_VERSION = 1
+
+COLUMNS = [("src", "<u4"), ("dst", "<u4"), ("distance", "<f8"),
+           ("time", "<f8"), ("rtype", "u1"), ("status", "u1")]
+
+
+class GraphSnapshot:
+    def __init__(self, nodes, types, statuses, columns, kb_hash=""):
+        self.nodes = nodes
+        self.types = types
+        self.statuses = statuses
+        self.kb_hash = kb_hash
+        for name, _ in COLUMNS:
+            setattr(self, name, columns[name])
+
+    def __len__(self):
+        return len(self.src)
+
+    # ---------------------------
+    # networkx conversion
+    # ---------------------------
+    @classmethod
+    def from_networkx(cls, G, kb_hash=""):
+        nodes = sorted(G.nodes())
+        node_id = {n: i for i, n in enumerate(nodes)}
+        types = {}
+        statuses = {}
+        cols = {name: [] for name, _ in COLUMNS}
+        for u, v, data in G.edges(data=True):
+            cols["src"].append(node_id[u])
+            cols["dst"].append(node_id[v])
+            cols["distance"].append(data.get("distance", 0.0))
+            cols["time"].append(data.get("time", 0.0))
+            cols["rtype"].append(types.setdefault(data.get("rtype", "paved"), len(types)))
+            cols["status"].append(statuses.setdefault(data.get("status", "open"), len(statuses)))
+        if len(types) > 255 or len(statuses) > 255:
+            raise RuntimeError("Too many distinct road types/statuses for a u1 column.")
+        columns = {name: np.asarray(cols[name], dtype=dt) for name, dt in COLUMNS}
+        order = np.argsort(columns["src"], kind="stable")
+        columns = {name: col[order] for name, col in columns.items()}
+        return cls(nodes, list(types), list(statuses), columns, kb_hash)
+
+    def to_networkx(self):
+        nodes = self.nodes
+        types = self.types
+        statuses = self.statuses
+        G = nx.DiGraph()
+        G.add_nodes_from(nodes)
+        G.add_edges_from(
+            (nodes[s], nodes[d], {"distance": dist, "rtype": types[t], "time": tm, "status": statuses[st]})
+            for s, d, dist, tm, t, st in zip(self.src.tolist(), self.dst.tolist(), self.distance.tolist(),
+                                             self.time.tolist(), self.rtype.tolist(), self.status.tolist()))
+        return G
+
+    # ---------------------------
+    # file format
+    # ---------------------------
+    def save(self, path):
+        """
+        Write the snapshot atomically (temp file + rename).
+        """
+        n = len(self)
+        header = {"format": FORMAT_VERSION, "kb_hash": self.kb_hash, "nodes": self.nodes,
+                  "types": self.types, "statuses": self.statuses, "edges": n, "columns": {}}
+        # column offsets depend on the header length, so grow until they agree
+        sizes = [(name, np.dtype(dt).itemsize * n) for name, dt in COLUMNS]
+        start = 0
+        while True:
+            offset = start
+            for name, size in sizes:
+                header["columns"][name] = offset
+                offset = _align(offset + size)
+            blob = json.dumps(header, separators=(",", ":")).encode("utf-8")
+            if 8 + len(blob) <= start:
+                break
+            start = _align(8 + len(blob) + 16)
+        blob += b" " * (start - 8 - len(blob))
+
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<I", len(blob)))
+            f.write(blob)
+            for name, dt in COLUMNS:
+                f.seek(header["columns"][name])
+                f.write(np.ascontiguousarray(getattr(self, name), dtype=dt).tobytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, kb_hash=None):
+        """
+        Memory-map a snapshot. Returns None if the file is missing, unreadable,
+        or was written for a different kb_hash.
+        """
+        try:
+            with open(path, "rb") as f:
+                if f.read(4) != MAGIC:
+                    return None
+                (hlen,) = struct.unpack("<I", f.read(4))
+                header = json.loads(f.read(hlen).decode("utf-8"))
+        except (OSError, ValueError, struct.error):
+            return None
+        if header.get("format") != FORMAT_VERSION:
+            return None
+        if kb_hash is not None and header.get("kb_hash") != kb_hash:
+            return None
+        n = header["edges"]
+        columns = {}
+        for name, dt in COLUMNS:
+            if n:
+                columns[name] = np.memmap(path, dtype=dt, mode="r", offset=header["columns"][name], shape=(n,))
+            else:
+                columns[name] = np.zeros(0, dtype=dt)
+        return cls(header["nodes"], header["types"], header["statuses"], columns, header["kb_hash"])
+
+
+def _align(offset, to=8):
+    return (offset + to - 1) // to * to
+
+
+def write_snapshot(G, path, kb_hash):
+    snap = GraphSnapshot.from_networkx(G, kb_hash)
+    snap.save(path)
+    return snap
@@ -0,0 +1,230 @@
+"""
+K shortest loopless routes (Yen's algorithm) on a CSRGraph.
+
+One reverse Dijkstra from the goal gives every node its exact remaining
+cost in the unrestricted graph. Spur searches only remove roads and nodes,
+so that cost is an admissible, consistent A* heuristic for all of them, and
+a spur search stops as soon as it pops a node whose tree path to the goal
+avoids the removed nodes: that tree path is already the cheapest way on.
+Whether a tree path avoids them is an ancestor test on the tree's Euler
+tour (a Fenwick tree over the removed nodes' subtrees), not a walk.
+"""
+import heapq
+import itertools
+
+import numpy as np
+
+from RoutingEngine import CRITERIA_LIST, MODE_FOR
+
+INF = float("inf")
+
+
+class _Adjacency:
+    """
+    Forward and reverse adjacency lists for one criterion, as plain Python
+    lists (faster than NumPy indexing inside the search loops).
+    """
+    def __init__(self, C, criteria_atom):
+        mode, algo = MODE_FOR[criteria_atom]
+        ok = C.allowed_mask(CRITERIA_LIST[criteria_atom])
+        if algo == "bfs":
+            weight = np.ones(C.n_edges)
+        else:
+            weight = C.time if mode == "time" else C.distance
+        src = np.repeat(np.arange(len(C), dtype=np.int64), np.diff(C.indptr))
+        keep = np.flatnonzero(ok)
+        src, dst, w = src[keep], C.indices[keep], weight[keep]
+        n = len(C)
+        self.out = [[] for _ in range(n)]
+        self.inc = [[] for _ in range(n)]
+        for u, v, c, e in zip(src.tolist(), dst.tolist(), w.tolist(), keep.tolist()):
+            self.out[u].append((v, c, e))
+            self.inc[v].append((u, c))
+
+    def reverse_tree(self, goal):
+        """
+        (cost to goal, next hop towards goal) for every node.
+        """
+        n = len(self.out)
+        h = [INF] * n
+        nxt = [-1] * n
+        h[goal] = 0.0
+        heap = [(0.0, goal)]
+        while heap:
+            c, v = heapq.heappop(heap)
+            if c > h[v]:
+                continue
+            for u, w in self.inc[v]:
+                cu = c + w
+                if cu < h[u]:
+                    h[u] = cu
+                    nxt[u] = v
+                    heapq.heappush(heap, (cu, u))
+        return h, nxt
+
+
+def _tree_path(u, goal, nxt):
+    path = [u]
+    while u != goal:
+        u = nxt[u]
+        path.append(u)
+    return path
+
+
+class _TreeIndex:
+    """
+    Euler tour of the reverse shortest-path tree (rooted at the goal) and a
+    Fenwick tree of blocked subtrees: a node's tree path to the goal runs
+    through a blocked node exactly when the node lies in its subtree.
+    """
+    def __init__(self, nxt, goal):
+        n = len(nxt)
+        children = [[] for _ in range(n)]
+        for u, v in enumerate(nxt):
+            if v >= 0:
+                children[v].append(u)
+        self.tin = tin = [-1] * n
+        self.tout = tout = [-1] * n
+        preorder = []
+        stack = [goal]
+        while stack:
+            u = stack.pop()
+            tin[u] = len(preorder)
+            preorder.append(u)
+            stack.extend(children[u])
+        size = [1] * n
+        for u in reversed(preorder):
+            if nxt[u] >= 0:
+                size[nxt[u]] += size[u]
+        for u in preorder:
+            tout[u] = tin[u] + size[u] - 1
+        self.clear()
+
+    def clear(self):
+        self.fenwick = [0] * (len(self.tin) + 2)
+
+    def _add(self, i, delta):
+        i += 1
+        f = self.fenwick
+        while i < len(f):
+            f[i] += delta
+            i += i & -i
+
+    def block(self, u):
+        self._add(self.tin[u], 1)
+        self._add(self.tout[u] + 1, -1)
+
+    def blocked(self, u):
+        """
+        True if u's tree path to the goal runs through a blocked node.
+        """
+        i = self.tin[u] + 1
+        f = self.fenwick
+        total = 0
+        while i > 0:
+            total += f[i]
+            i -= i & -i
+        return total > 0
+
+    def above(self, x, u):
+        """
+        True if x lies on u's tree path to the goal.
+        """
+        return self.tin[x] <= self.tin[u] <= self.tout[x]
+
+
+def _spur(adj, spur, goal, h, nxt, tree, banned_nodes, banned_next):
+    """
+    Cheapest spur -> goal path avoiding banned_nodes and the roads
+    spur -> banned_next; tree must have spur and banned_nodes blocked.
+    Returns (cost, path) or None.
+    """
+    g = {spur: 0.0}
+    parent = {spur: None}
+    done = set()
+    order = itertools.count()
+    # ties broken towards larger g, i.e. deeper along an exact heuristic
+    heap = [(h[spur], 0.0, next(order), spur)]
+    while heap:
+        f, neg_g, _, u = heapq.heappop(heap)
+        if u in done:
+            continue
+        done.add(u)
+        if u != spur and not tree.blocked(u):
+            head = []
+            x = parent[u]
+            while x is not None:
+                head.append(x)
+                x = parent[x]
+            # the tree path must not loop back into the search path either
+            if not any(tree.above(x, u) for x in head):
+                head.reverse()
+                return f, head + _tree_path(u, goal, nxt)
+        for v, w, _ in adj.out[u]:
+            if v in banned_nodes or v in done or h[v] == INF:
+                continue
+            if u == spur and v in banned_next:
+                continue
+            gv = -neg_g + w
+            if gv < g.get(v, INF):
+                g[v] = gv
+                parent[v] = u
+                heapq.heappush(heap, (gv + h[v], -gv, next(order), v))
+    return None
+
+def k_shortest_routes(C, criteria_atom, start_atom, goal_atom, k=5):
+    """
+    Up to k loopless routes in increasing cost for the criterion, as
+    (path, dist, time) tuples; the first equals the single best route.
+    """
+    if criteria_atom not in CRITERIA_LIST:
+        return []
+    s = C.node_id.get(start_atom)
+    t = C.node_id.get(goal_atom)
+    if s is None or t is None or k < 1:
+        return []
+    adj = _Adjacency(C, criteria_atom)
+    h, nxt = adj.reverse_tree(t)
+    if h[s] == INF:
+        return []
+
+    tree = _TreeIndex(nxt, t)
+    first = _tree_path(s, t, nxt)
+    found = [(h[s], first)]
+    seen = {tuple(first)}
+    candidates = []
+    order = itertools.count()
+    while len(found) < k:
+        cost, prev = found[-1]
+        # prefix costs along prev
+        weight = {(u, v): w for u in prev for v, w, _ in adj.out[u]}
+        root_cost = [0.0]
+        for u, v in zip(prev, prev[1:]):
+            root_cost.append(root_cost[-1] + weight[(u, v)])
+        tree.clear()
+        for i in range(len(prev) - 1):
+            root = prev[:i + 1]
+            banned_next = {p[i + 1] for _, p in found if len(p) > i + 1 and p[:i + 1] == root}
+            tree.block(prev[i])
+            spur = _spur(adj, prev[i], t, h, nxt, tree, set(root[:-1]), banned_next)
+            if spur is None:
+                continue
+            path = root[:-1] + spur[1]
+            key = tuple(path)
+            if key not in seen:
+                seen.add(key)
+                heapq.heappush(candidates, (root_cost[i] + spur[0], next(order), path))
+        if not candidates:
+            break
+        c, _, path = heapq.heappop(candidates)
+        found.append((c, path))
+
+    routes = []
+    for _, path in found:
+        dist = ttime = 0.0
+        for u, v in zip(path, path[1:]):
+            e = min((e for x, _, e in adj.out[u] if x == v), key=lambda e: C.distance[e])
+            dist += float(C.distance[e])
+            ttime += float(C.time[e])
+        routes.append(([C.nodes[i] for i in path], dist, ttime))
+    return routes
@@ -0,0 +1,187 @@
+"""
+Session-reusing client for the SWISH / Pengines HTTP API.
+
+One requests.Session (keep-alive, so one TLS handshake) and one pengine
+with the KB loaded are shared by every online query:
+
+    POST <server>/pengine/create   {"src_text": KB, "ask": Goal, "destroy": false}
+    GET  <server>/pengine/send     ?id=ID&event=ask((Goal),[])   later goals
+                                   ?id=ID&event=next | stop | destroy
+
+The KB is only uploaded again when the source version changes or the
+server has dropped the pengine. A pengine left idle for idle_timeout
+seconds is destroyed.
+"""
+import threading
+import time
+
+import requests
+
+
+class PengineError(RuntimeError):
+    pass
+
+
+class PengineClient:
+    """
+    source() must return (version, program text); the pengine is recreated
+    whenever version changes.
+    """
+    def __init__(self, server_url, source, idle_timeout=120, request_timeout=30, session=None):
+        self.server_url = server_url.rstrip("/")
+        self.source = source
+        self.idle_timeout = idle_timeout
+        self.request_timeout = request_timeout
+        self.session = session or requests.Session()
+        self.pengine_id = None
+        self.version = None
+        self.more = False
+        self.last_used = 0.0
+        self.creates = 0
+        self.requests = 0
+        self._lock = threading.RLock()
+        self._timer = None
+
+    # ---------------------------
+    # HTTP
+    # ---------------------------
+    def _request(self, method, path, **kwargs):
+        self.requests += 1
+        try:
+            resp = self.session.request(method, self.server_url + path,
+                                        timeout=self.request_timeout, **kwargs)
+        except requests.RequestException as e:
+            raise PengineError("Online Prolog request failed: " + str(e))
+        if resp.status_code not in (200, 201):
+            raise PengineError(f"SWISH responded with status {resp.status_code}: {resp.text[:200]}")
+        try:
+            return resp.json()
+        except ValueError:
+            raise PengineError("Failed to parse SWISH JSON response: " + resp.text[:1000])
+
+    def _send(self, event):
+        return self._request("GET", "/pengine/send",
+                             params={"id": self.pengine_id, "event": event, "format": "json"})
+
+    @staticmethod
+    def _gone(reply):
+        """
+        True when the server no longer knows our pengine.
+        """
+        if reply.get("event") in ("died", "destroy"):
+            return True
+        return reply.get("event") == "error" and "existence_error" in str(reply.get("data")) \
+            and "pengine" in str(reply.get("data"))
+
+    # ---------------------------
+    # Pengine life cycle
+    # ---------------------------
+    def create(self, ask=None):
+        """
+        Create a pengine with the current source loaded, optionally asking a
+        first goal in the same round-trip. Returns that goal's answer event.
+        """
+        with self._lock:
+            self.destroy()
+            version, text = self.source()
+            payload = {"src_text": text, "format": "json", "destroy": False}
+            if ask is not None:
+                payload["ask"] = ask
+            reply = self._request("POST", "/pengine/create", json=payload)
+            if reply.get("event") != "create" or "id" not in reply:
+                raise PengineError(f"SWISH {reply.get('event') or 'reply'}: {str(reply.get('data', reply))[:300]}")
+            self.pengine_id = reply["id"]
+            self.version = version
+            self.creates += 1
+            answer = reply.get("answer")
+            self._track(answer)
+            return answer
+
+    def ask(self, goal):
+        """
+        Ask goal on the live pengine (creating or refreshing it as needed).
+        Returns the first answer event: success (data, more), failure or error.
+        """
+        with self._lock:
+            version, _ = self.source()
+            if self.pengine_id is None or version != self.version:
+                return self.create(ask=goal)
+            if self.more:
+                self.stop()
+            reply = self._send(f"ask(({goal}),[])")
+            if self._gone(reply):
+                self.pengine_id = None
+                return self.create(ask=goal)
+            self._track(reply)
+            return reply
+
+    def next(self):
+        with self._lock:
+            if self.pengine_id is None or not self.more:
+                return {"event": "failure"}
+            reply = self._send("next")
+            self._track(reply)
+            return reply
+
+    def stop(self):
+        with self._lock:
+            if self.pengine_id is not None and self.more:
+                self._send("stop")
+            self.more = False
+
+    def destroy(self):
+        with self._lock:
+            if self.pengine_id is None:
+                return
+            try:
+                self._send("destroy")
+            except PengineError:
+                pass
+            self.pengine_id = None
+            self.more = False
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self.destroy()
+            self.session.close()
+
+    def _track(self, reply):
+        """
+        Remember whether more solutions are pending and restart the idle timer.
+        """
+        self.more = bool(reply and reply.get("more"))
+        self.last_used = time.monotonic()
+        if self.idle_timeout:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.idle_timeout, self._reap_idle)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _reap_idle(self):
+        with self._lock:
+            if time.monotonic() - self.last_used >= self.idle_timeout:
+                self.destroy()
+
+    # ---------------------------
+    # Convenience
+    # ---------------------------
+    def query(self, goal, all_solutions=False):
+        """
+        Answers as a list of binding dicts (empty if the goal failed).
+        """
+        with self._lock:
+            reply = self.ask(goal)
+            answers = []
+            while True:
+                event = (reply or {}).get("event")
+                if event == "failure":
+                    return answers
+                if event != "success":
+                    raise PengineError(f"SWISH {event or 'reply'}: {str((reply or {}).get('data', reply))[:300]}")
+                answers.extend(reply.get("data") or [])
+                if not (all_solutions and reply.get("more")):
+                    return answers
+                reply = self.next()
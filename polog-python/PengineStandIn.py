@@ -0,0 +1,242 @@
+"""
+Local stand-in for the SWISH pengine HTTP API, for exercising PengineClient
+without network access or SWI-Prolog.
+
+It speaks the same create / send (ask, next, stop, destroy) protocol with
+format=json, over HTTP/1.1 keep-alive. Uploaded programs are read for their
+road/6 facts (and :- set_road/6, :- remove_road/2 directives), and the goals
+the app sends online are answered with the native routing engine:
+    route(Crit, Start, Goal, Path, Dist, Time)
+    findall([A,B,D,Ty,T,S], road(A,B,D,Ty,T,S), Rows)
+    findall([P,D,T,X], (pareto(Start,Goal,Rs), member(route(P,D,T,X),Rs)), Routes)
+    findall([N,P,D,T], (reach(Mode,Crit,Start,Limit,Tree), member(n(N,P,D,T),Tree)), Rows)
+    route_at(Crit, Depart, Start, Goal, Path, Dist, Time)
+    true
+
+    python PengineStandIn.py             # self-check against RoadNetworkKB.pl
+    python PengineStandIn.py --serve 3050
+"""
+import argparse
+import json
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import networkx as nx
+
+from CSRGraph import CSRGraph, reach_csr
+from RoutingEngine import find_route_native, pareto_routes
+from TimeDependent import Schedule, route_at
+
+FACT_RE = re.compile(r"^(?::-\s*)?(road|set_road)\(\s*(\w+)\s*,\s*(\w+)\s*,\s*([\d.]+)\s*,\s*(\w+)\s*,"
+                     r"\s*([\d.]+)\s*,\s*(\w+)\s*\)\s*\.", re.M)
+REMOVE_RE = re.compile(r"^:-\s*remove_road\(\s*(\w+)\s*,\s*(\w+)\s*\)\s*\.", re.M)
+ROUTE_GOAL_RE = re.compile(r"^route\((\w+),(\w+),(\w+),Path,Dist,Time\)$")
+PARETO_GOAL_RE = re.compile(r"^findall\(\[P,D,T,X\],\(pareto\((\w+),(\w+),Rs\),member\(route\(P,D,T,X\),Rs\)\),Routes\)$")
+REACH_GOAL_RE = re.compile(r"^findall\(\[N,P,D,T\],\(reach\((\w+),(\w+),(\w+),(none|[\d.]+),Tree\),"
+                           r"member\(n\(N,P,D,T\),Tree\)\),Rows\)$")
+ROUTE_AT_GOAL_RE = re.compile(r"^route_at\((\w+),([\d.]+),(\w+),(\w+),Path,Dist,Time\)$")
+ASK_RE = re.compile(r"^ask\(\((.*)\),\s*\[.*\]\)$", re.S)
+
+
+def program_graph(src_text):
+    """
+    nx.DiGraph of the road/6 facts in src_text, with set_road/remove_road
+    directives applied in file order.
+    """
+    G = nx.DiGraph()
+    events = [(m.start(), "set", m.groups()[1:]) for m in FACT_RE.finditer(src_text)]
+    events += [(m.start(), "remove", m.groups()) for m in REMOVE_RE.finditer(src_text)]
+    for _, op, args in sorted(events):
+        if op == "remove":
+            if G.has_edge(*args):
+                G.remove_edge(*args)
+            continue
+        a, b, d, t, tm, st = args
+        G.add_edge(a, b, distance=float(d), rtype=t, time=float(tm), status=st)
+    return G
+
+def _number(x):
+    return int(x) if float(x).is_integer() else x
+
+def solve(G, goal, schedule=None):
+    """
+    List of binding dicts for goal, or raise ValueError if unsupported.
+    """
+    goal = re.sub(r"\s+", "", goal.strip().rstrip("."))
+    if goal == "true":
+        return [{}]
+    if goal == "findall([A,B,D,Ty,T,S],road(A,B,D,Ty,T,S),Rows)":
+        rows = [[a, b, _number(d["distance"]), d["rtype"], _number(d["time"]), d["status"]]
+                for a, b, d in G.edges(data=True)]
+        return [{"Rows": rows}]
+    m = ROUTE_GOAL_RE.match(goal)
+    if m:
+        res = find_route_native(G, *m.groups())
+        if res is None:
+            return []
+        path, dist, ttime = res
+        return [{"Path": path, "Dist": _number(dist), "Time": _number(ttime)}]
+    m = PARETO_GOAL_RE.match(goal)
+    if m:
+        routes = [[p, _number(d), _number(t), _number(x)] for p, d, t, x in pareto_routes(G, *m.groups())]
+        return [{"Routes": routes}]
+    m = REACH_GOAL_RE.match(goal)
+    if m:
+        mode, crit, start, limit = m.groups()
+        tree = reach_csr(CSRGraph.from_networkx(G), crit, start, mode, None if limit == "none" else float(limit))
+        return [{"Rows": [[n, p or "none", _number(d), _number(t)] for n, p, d, t in tree]}]
+    m = ROUTE_AT_GOAL_RE.match(goal)
+    if m:
+        crit, depart, start, goal_atom = m.groups()
+        res = route_at(G, schedule or Schedule(), crit, start, goal_atom, float(depart))
+        if res is None:
+            return []
+        path, dist, ttime = res
+        return [{"Path": path, "Dist": _number(dist), "Time": _number(ttime)}]
+    raise ValueError(f"stand-in cannot solve {goal}")
+
+
+class PengineStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0)):
+        super().__init__(address, _Handler)
+        self.pengines = {}
+        self.lock = threading.Lock()
+        self.stats = {"connections": 0, "creates": 0, "sends": 0, "uploaded_bytes": 0}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def _answer(self, pid, goal):
+        state = self.pengines[pid]
+        try:
+            state["pending"] = solve(state["graph"], goal, state["schedule"])
+        except ValueError as e:
+            state["pending"] = []
+            return {"event": "error", "id": pid, "data": str(e)}
+        return self._next(pid)
+
+    def _next(self, pid):
+        state = self.pengines[pid]
+        if not state["pending"]:
+            return {"event": "failure", "id": pid}
+        first = state["pending"].pop(0)
+        return {"event": "success", "id": pid, "data": [first], "more": bool(state["pending"])}
+
+    def create(self, body):
+        src = body.get("src_text", "")
+        pid = uuid.uuid4().hex
+        with self.lock:
+            self.stats["creates"] += 1
+            self.stats["uploaded_bytes"] += len(src.encode("utf-8"))
+            self.pengines[pid] = {"graph": program_graph(src), "schedule": Schedule.from_source(src), "pending": []}
+            reply = {"event": "create", "id": pid, "slave_limit": 3}
+            if body.get("ask"):
+                reply["answer"] = self._answer(pid, body["ask"])
+        return reply
+
+    def send(self, pid, event):
+        with self.lock:
+            self.stats["sends"] += 1
+            if pid not in self.pengines:
+                return {"event": "error", "id": pid, "data": f"existence_error(pengine,{pid})"}
+            if event == "destroy":
+                del self.pengines[pid]
+                return {"event": "destroy", "id": pid}
+            if event == "next":
+                return self._next(pid)
+            if event == "stop":
+                self.pengines[pid]["pending"] = []
+                return {"event": "stop", "id": pid}
+            m = ASK_RE.match(event)
+            if m:
+                return self._answer(pid, m.group(1))
+            return {"event": "error", "id": pid, "data": f"unknown event {event}"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out as separate writes; without this every reply
+    # waits out the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.stats["connections"] += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, obj, status=200):
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length).decode("utf-8")
+        url = urlparse(self.path)
+        if url.path == "/pengine/create":
+            self._reply(self.server.create(json.loads(raw or "{}")), 201)
+        elif url.path == "/pengine/send":
+            q = parse_qs(url.query)
+            self._reply(self.server.send(q.get("id", [""])[0], q.get("event", [raw])[0]))
+        else:
+            self._reply({"event": "error", "data": "not found"}, 404)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/pengine/send":
+            self._reply({"event": "error", "data": "not found"}, 404)
+            return
+        q = parse_qs(url.query)
+        self._reply(self.server.send(q.get("id", [""])[0], q.get("event", [""])[0]))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--serve", type=int, metavar="PORT", help="run until interrupted on this port")
+    args = ap.parse_args()
+    if args.serve:
+        server = PengineStandIn(("127.0.0.1", args.serve))
+        print("Pengine stand-in on", server.url)
+        server.serve_forever()
+    else:
+        import os
+        import RoadNetworkPathfinder as app
+        from RoadJournal import RoadJournal
+        if not os.path.exists(app.PROLOG_FILE):
+            # fall back to the KB shipped next to this script
+            app.PROLOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "RoadNetworkKB.pl")
+            app.JOURNAL = RoadJournal(app.PROLOG_FILE, os.path.splitext(app.PROLOG_FILE)[0] + ".journal")
+        server = PengineStandIn().start()
+        app.SWISH_SERVER_URL = server.url
+        try:
+            pairs = [("may_pen", "chapelton"), ("sandy_bay", "kensington"), ("rock", "milk_river")]
+            for crit in ("shortest_distance", "fastest_time", "avoid_unpaved"):
+                for start, goal in pairs:
+                    print(crit, start, goal, app.find_route_prolog(crit, start, goal, use_online=True))
+            print("reach chapelton 20 min", app.find_reach_prolog("time", "fastest_time", "chapelton", 20, use_online=True))
+            for depart in (450, 720):
+                print("hayes may_pen leaving", depart,
+                      app.find_route_at_prolog("fastest_time", "hayes", "may_pen", depart, use_online=True))
+            G = app.load_graph_from_prolog(use_online=True)
+            print(f"map: {G.number_of_nodes()} nodes, {G.number_of_edges()} roads")
+            print("stand-in:", server.stats)
+        finally:
+            app.close_pengine_client()
+            server.shutdown()
@@ -0,0 +1,333 @@
+"""
+Persistent pool of swipl workers.
+
+Each worker consults the KB once and then sits in serve_queries/0, reading
+one goal per line on stdin. The goal's printed output comes back on stdout,
+followed by a marker line:  __END__ ok | __END__ fail | __END__ error(...)
+A starting worker prints __START__ before it consults the KB and
+serve_queries/0 prints __READY__ after, which times start-up and consult.
+"""
+import contextlib
+import logging
+import queue
+import subprocess
+import threading
+import time
+
+END_MARKER = "__END__"
+START_MARKER = "__START__"
+READY_MARKER = "__READY__"
+
+log = logging.getLogger(__name__)
+
+# owner of the pool queries the current thread runs (see query_owner)
+_owner = threading.local()
+
+
+def quoted_atom(text):
+    return "'" + text.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+@contextlib.contextmanager
+def query_owner(owner):
+    """
+    Tag the pool queries this thread runs inside the block with owner, so
+    PrologWorkerPool.cancel(owner) can stop them.
+    """
+    _owner.key = owner
+    try:
+        yield
+    finally:
+        _owner.key = None
+
+
+class PrologWorker:
+    """
+    One long-lived swipl process with the KB already loaded.
+    """
+    def __init__(self, swipl_cmd, prolog_file, on_ready=None):
+        self.swipl_cmd = swipl_cmd
+        self.prolog_file = prolog_file
+        self.on_ready = on_ready
+        self.proc = None
+        self.ready = False
+        self.marks = {}
+        self.lines = None
+        self.generation = -1
+        self.applied = 0
+        self.cancelled = False
+        self.last_used = 0.0
+        self.queries = 0
+
+    def start(self, generation=0):
+        cmd = [self.swipl_cmd, "-q",
+               "-g", f"format('{START_MARKER}~n'), flush_output",
+               "-g", f"consult({quoted_atom(self.prolog_file)})",
+               "-g", "serve_queries", "-t", "halt"]
+        self.ready = False
+        self.marks = {"spawn": time.perf_counter()}
+        try:
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE, text=True, encoding="utf-8",
+                                         bufsize=1)
+        except FileNotFoundError:
+            raise RuntimeError("swipl not found. Set SWIPL_CMD to your swipl executable path or install SWI-Prolog.")
+        # reader threads, so a hung query can be timed out on every platform
+        self.lines = queue.Queue()
+        threading.Thread(target=self._pump, args=(self.proc.stdout, self.lines, self.marks), daemon=True).start()
+        threading.Thread(target=self._drain_stderr, args=(self.proc.stderr,), daemon=True).start()
+        self.generation = generation
+        self.applied = 0
+        self.cancelled = False
+        self.last_used = time.monotonic()
+        self.queries = 0
+
+    @staticmethod
+    def _pump(stream, lines, marks):
+        for line in stream:
+            if line.startswith((START_MARKER, READY_MARKER)):
+                marks[line.strip()] = time.perf_counter()
+            lines.put(line)
+        lines.put(None)
+
+    def wait_ready(self, timeout: float):
+        """
+        Block until serve_queries/0 reports in, then pass (start-up s,
+        consult s) to on_ready.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise queue.Empty
+                line = self.lines.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError
+            if line is None:
+                raise RuntimeError("Prolog worker exited unexpectedly.")
+            if line.startswith(READY_MARKER):
+                break
+            if not line.startswith(START_MARKER):
+                # consult warnings printed to stdout
+                log.warning("Prolog consult: %s", line.rstrip())
+        self.ready = True
+        spawn = self.marks["spawn"]
+        started = self.marks.get(START_MARKER, spawn)
+        if self.on_ready is not None:
+            self.on_ready(started - spawn, self.marks[READY_MARKER] - started)
+
+    @staticmethod
+    def _drain_stderr(stream):
+        for line in stream:
+            # show debug to console — not always fatal
+            log.warning("Prolog stderr: %s", line.rstrip())
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def stop(self):
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=2)
+        except Exception:
+            self.proc.kill()
+        self.proc = None
+
+    def restart(self, generation=0):
+        self.stop()
+        self.start(generation)
+
+    def ask(self, goal: str, timeout: float):
+        """
+        Send one goal and collect its output. Returns (status, stdout string).
+        """
+        if not self.ready:
+            self.wait_ready(timeout)
+        goal = goal.strip()
+        if not goal.endswith("."):
+            goal += "."
+        try:
+            self.proc.stdin.write(goal + "\n")
+            self.proc.stdin.flush()
+        except (OSError, ValueError):
+            raise RuntimeError("Prolog worker exited unexpectedly.")
+
+        deadline = time.monotonic() + timeout
+        out = []
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise queue.Empty
+                line = self.lines.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError
+            if line is None:
+                raise RuntimeError("Prolog worker exited unexpectedly.")
+            if line.startswith(END_MARKER):
+                status = line[len(END_MARKER):].strip()
+                break
+            out.append(line)
+        self.last_used = time.monotonic()
+        self.queries += 1
+        return status, "".join(out).strip()
+
+
+class PrologWorkerPool:
+    """
+    Fixed-size pool of PrologWorker processes.
+
+    Workers are started lazily, pinged with `true` when they have been idle
+    longer than health_check_interval, and restarted when they die, time out
+    or were started before the last reload(). Goals passed to update() are
+    replayed on every worker, in order, before its next query. on_ready, if
+    given, is called with (start-up s, consult s) each time a worker starts.
+    A query run under query_owner(owner) can be stopped with cancel(owner).
+    """
+    def __init__(self, swipl_cmd, prolog_file, size=2, query_timeout=30,
+                 health_check_interval=60, on_ready=None):
+        self.swipl_cmd = swipl_cmd
+        self.prolog_file = prolog_file
+        self.size = max(1, int(size))
+        self.query_timeout = query_timeout
+        self.health_check_interval = health_check_interval
+        self.generation = 0
+        self.updates = []
+        self._updates_lock = threading.Lock()
+        # owner -> worker running its query (see query_owner)
+        self._running = {}
+        self._running_lock = threading.Lock()
+        self.workers = [PrologWorker(swipl_cmd, prolog_file, on_ready) for _ in range(self.size)]
+        self._idle = queue.Queue()
+        for w in self.workers:
+            self._idle.put(w)
+
+    def _checkout(self, timeout):
+        try:
+            w = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError("All Prolog workers are busy.")
+        try:
+            if not w.alive() or w.generation != self.generation:
+                w.restart(self.generation)
+            elif time.monotonic() - w.last_used > self.health_check_interval:
+                self._health_check(w)
+            if not w.ready:
+                w.wait_ready(timeout)
+            self._catch_up(w, timeout)
+        except TimeoutError:
+            w.restart(self.generation)
+            self._idle.put(w)
+            raise RuntimeError("Local Prolog timed out.")
+        except Exception:
+            self._idle.put(w)
+            raise
+        return w
+
+    def _catch_up(self, w, timeout):
+        with self._updates_lock:
+            pending = self.updates[w.applied:]
+        for goal in pending:
+            status, _ = w.ask(goal, timeout)
+            if status != "ok":
+                # the worker's KB would no longer match the updates; start
+                # it over rather than answer from it
+                log.warning("Prolog update %s -> %s", goal, status)
+                w.restart(self.generation)
+                raise RuntimeError(f"Prolog update {goal} failed: {status}")
+            w.applied += 1
+
+    def _health_check(self, w):
+        try:
+            status, _ = w.ask("true", timeout=5)
+            if status == "ok":
+                return
+        except (TimeoutError, RuntimeError):
+            pass
+        w.restart(self.generation)
+
+    def query(self, goal: str, timeout=None, raise_errors=False):
+        """
+        Run goal on a free worker. Returns the goal's stdout string
+        (empty if the goal failed or raised). With raise_errors a goal
+        that raised is a RuntimeError instead.
+        """
+        timeout = self.query_timeout if timeout is None else timeout
+        w = self._checkout(timeout)
+        owner = getattr(_owner, "key", None)
+        if owner is not None:
+            with self._running_lock:
+                self._running[owner] = w
+        try:
+            status, out = w.ask(goal, timeout)
+        except TimeoutError:
+            w.restart(self.generation)
+            raise RuntimeError("Local Prolog timed out.")
+        except RuntimeError:
+            cancelled = w.cancelled
+            w.restart(self.generation)
+            if cancelled:
+                raise RuntimeError("Prolog query cancelled.")
+            raise
+        finally:
+            if owner is not None:
+                with self._running_lock:
+                    self._running.pop(owner, None)
+            self._idle.put(w)
+        if status != "ok":
+            log.warning("Prolog query %s -> %s", goal, status)
+            if raise_errors and status.startswith("error"):
+                raise RuntimeError(f"Prolog error: {status}")
+        return out
+
+    def cancel(self, owner):
+        """
+        Stop the query running for owner: its worker is killed, the query
+        raises, and the worker is restarted. Returns False if owner has no
+        query running.
+        """
+        with self._running_lock:
+            w = self._running.pop(owner, None)
+            if w is None or w.proc is None:
+                return False
+            w.cancelled = True
+            w.proc.kill()
+        return True
+
+    def health_check(self):
+        """
+        Ping every idle worker now; dead or stuck ones are restarted.
+        """
+        for _ in range(self.size):
+            try:
+                w = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if w.alive():
+                    self._health_check(w)
+            finally:
+                self._idle.put(w)
+
+    def update(self, goal: str):
+        """
+        Queue a KB-changing goal (e.g. an assert/retract) for every worker.
+        Workers apply it lazily, so this never blocks on a busy worker.
+        """
+        with self._updates_lock:
+            self.updates.append(goal)
+
+    def reload(self):
+        """
+        Mark all workers stale; each re-consults the KB on its next checkout.
+        Pending updates are dropped, so the KB file must already include them.
+        """
+        with self._updates_lock:
+            self.updates = []
+            self.generation += 1
+
+    def close(self):
+        for w in self.workers:
+            w.stop()
@@ -0,0 +1,213 @@
+"""
+Tracing spans and Prometheus metrics for route queries.
+
+A Trace collects the timed stages of one user action (swipl start-up, KB
+consult, search, output parsing, redraw). Spans opened on a thread land in
+the trace active on that thread, so a query run on the executor and the
+redraw that follows on the Tk thread can share one trace. Every span is
+also observed in a latency histogram, and counters (expanded search
+states, finished traces) accumulate in the same Metrics registry, which
+renders the Prometheus text format to a file or over HTTP (GET /metrics).
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# histogram bucket bounds in seconds
+SPAN_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# span attributes that become histogram labels; the rest only annotate the trace
+SPAN_LABELS = ("backend",)
+
+
+class Trace:
+    """
+    The spans of one action, as (name, seconds, depth, attrs) in the order
+    they finished, plus free-form attrs (e.g. expanded states).
+    """
+    def __init__(self, name):
+        self.name = name
+        self.spans = []
+        self.attrs = {}
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    def lines(self):
+        """
+        Text for the results pane: one line per span, indented by nesting.
+        """
+        out = []
+        for name, seconds, depth, attrs in self.spans:
+            label = "  " * depth + name
+            if attrs.get("backend"):
+                label += f" ({attrs['backend']})"
+            out.append(f"{label:<26}{seconds * 1000:>9.1f} ms")
+        if self.seconds is not None:
+            out.append(f"{'total':<26}{self.seconds * 1000:>9.1f} ms")
+        for key, value in self.attrs.items():
+            out.append(f"{key}: {value}")
+        return out
+
+
+class Metrics:
+    """
+    Thread-safe counters and histograms, exported as Prometheus text.
+    """
+    def __init__(self, prefix="roadnet"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.help = {}
+        self.counters = {}
+        self.histograms = {}
+
+    def _name(self, name, kind, help_text):
+        full = f"{self.prefix}_{name}"
+        self.help.setdefault(full, (kind, help_text))
+        return full
+
+    def inc(self, name, value=1, help_text="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            full = self._name(name, "counter", help_text)
+            series = self.counters.setdefault(full, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, seconds, help_text="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            full = self._name(name, "histogram", help_text)
+            series = self.histograms.setdefault(full, {})
+            h = series.get(key)
+            if h is None:
+                h = series[key] = {"buckets": [0] * len(SPAN_BUCKETS), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(SPAN_BUCKETS):
+                if seconds <= bound:
+                    h["buckets"][i] += 1
+            h["sum"] += seconds
+            h["count"] += 1
+
+    def to_prometheus(self):
+        out = []
+        with self.lock:
+            for full, series in sorted(self.counters.items()):
+                out += _help_lines(full, self.help[full])
+                for key, value in sorted(series.items()):
+                    out.append(f"{full}{_labels(key)} {value}")
+            for full, series in sorted(self.histograms.items()):
+                out += _help_lines(full, self.help[full])
+                for key, h in sorted(series.items()):
+                    for bound, count in zip(SPAN_BUCKETS, h["buckets"]):
+                        out.append(f"{full}_bucket{_labels(key + (('le', repr(bound)),))} {count}")
+                    out.append(f"{full}_bucket{_labels(key + (('le', '+Inf'),))} {h['count']}")
+                    out.append(f"{full}_sum{_labels(key)} {h['sum']:.6f}")
+                    out.append(f"{full}_count{_labels(key)} {h['count']}")
+        return "\n".join(out) + "\n"
+
+    def write(self, path):
+        """
+        Write the text export atomically, e.g. for node_exporter's textfile
+        collector.
+        """
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, path)
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        Serve GET /metrics on a daemon thread. Returns the server.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                data = metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def _help_lines(full, kind_help):
+    kind, help_text = kind_help
+    lines = [f"# HELP {full} {help_text}"] if help_text else []
+    return lines + [f"# TYPE {full} {kind}"]
+
+def _labels(key):
+    if not key:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in key)
+    return "{" + body + "}"
+
+
+class Tracer:
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self._local = threading.local()
+
+    def current(self):
+        return getattr(self._local, "trace", None)
+
+    @contextmanager
+    def activate(self, trace):
+        """
+        Make trace the one spans on this thread are recorded into.
+        """
+        saved = self.current(), getattr(self._local, "depth", 0)
+        self._local.trace, self._local.depth = trace, 0
+        try:
+            yield trace
+        finally:
+            self._local.trace, self._local.depth = saved
+
+    @contextmanager
+    def span(self, name, **attrs):
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            self._finish(name, time.perf_counter() - t0, depth, attrs)
+
+    def record(self, name, seconds, **attrs):
+        """
+        A span measured elsewhere (e.g. swipl start-up, timed by the pool).
+        """
+        self._finish(name, seconds, getattr(self._local, "depth", 0), attrs)
+
+    def _finish(self, name, seconds, depth, attrs):
+        trace = self.current()
+        if trace is not None:
+            trace.spans.append((name, seconds, depth, attrs))
+        labels = {k: attrs[k] for k in SPAN_LABELS if k in attrs}
+        self.metrics.observe("span_seconds", seconds, "Time spent per query stage.", span=name, **labels)
+
+    def annotate(self, **attrs):
+        trace = self.current()
+        if trace is not None:
+            trace.attrs.update(attrs)
+
+    def count_expanded(self, algo, states):
+        self.metrics.inc("expanded_states_total", states, "Search states expanded by Prolog.", algo=algo)
+        self.metrics.inc("searches_total", 1, "Prolog searches that reported expansions.", algo=algo)
+        self.annotate(expanded=f"{states} states ({algo})")
@@ -0,0 +1,306 @@
+"""
+Bulk road import from CSV or GeoJSON.
+
+Rows are streamed (csv.reader / an incremental decoder over the GeoJSON
+"features" array), normalised with to_atom, validated, and appended to a
+KB as road/6 facts in batches. Names must come out of to_atom as plain
+Prolog atoms (starting with a letter); "1st Street" or "42" is rejected.
+
+CSV: header with source, destination, distance and optionally type, time,
+status, oneway. GeoJSON: LineString / MultiLineString features whose
+properties carry the same names (from/to are accepted too); distance
+defaults to the geometry length and endpoints become coord/3 facts.
+
+Roads are two-way unless oneway is set, and are written as mirrored facts
+like RoadNetworkKB.pl. A pair already in the KB, or seen earlier in the
+input in either direction, is skipped as a duplicate.
+
+    python RoadImporter.py roads.csv --kb RoadNetworkKB.pl
+    python RoadImporter.py roads.geojson --kb RoadNetworkKB.pl
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import time
+
+from RoadJournal import ATOM_RE, ROAD_RE, road_fact
+
+STATUSES = ("open", "closed", "scheduled")
+# minutes per km when a row has no time, by road type (default for the rest)
+MIN_PER_KM = {"paved": 1.5}
+DEFAULT_MIN_PER_KM = 2.5
+
+ALIASES = {
+    "source": ("source", "src", "from"),
+    "destination": ("destination", "dst", "dest", "to"),
+    "distance": ("distance", "distance_km", "km"),
+    "type": ("type", "rtype", "surface"),
+    "time": ("time", "time_min", "minutes"),
+    "status": ("status",),
+    "oneway": ("oneway", "one_way"),
+}
+
+COORD_RE = re.compile(r"^coord\(\s*(\w+)\s*,")
+
+
+class InvalidRoad(ValueError):
+    pass
+
+
+def _field(row, name):
+    for key in ALIASES[name]:
+        value = row.get(key)
+        if value is not None and value != "":
+            return value
+    return None
+
+def _number(value, name):
+    try:
+        x = float(value)
+    except (TypeError, ValueError):
+        raise InvalidRoad(f"{name} is not a number: {value!r}")
+    if not math.isfinite(x) or x < 0:
+        raise InvalidRoad(f"{name} must be a finite, non-negative number: {value!r}")
+    return int(x) if x.is_integer() else round(x, 3)
+
+def _atom(value, to_atom, name):
+    atom = to_atom(str(value))
+    if not ATOM_RE.match(atom):
+        raise InvalidRoad(f"{name} {value!r} does not give a Prolog atom (got {atom}); "
+                          f"names must start with a letter")
+    return atom
+
+def _truthy(value):
+    return str(value).strip().lower() in ("1", "yes", "true", "y")
+
+def normalise(row, to_atom, length_km=None):
+    """
+    One input record -> (src, dst, dist, type, time, status, oneway).
+    Raises InvalidRoad with the reason when the record is unusable.
+    """
+    src = _field(row, "source")
+    dst = _field(row, "destination")
+    if src is None or dst is None:
+        raise InvalidRoad("missing source or destination")
+    src, dst = _atom(src, to_atom, "source"), _atom(dst, to_atom, "destination")
+    if src == dst:
+        raise InvalidRoad(f"road from {src} to itself")
+
+    dist = _field(row, "distance")
+    if dist is None and length_km is not None:
+        dist = length_km
+    dist = _number(dist, "distance")
+    if dist <= 0:
+        raise InvalidRoad("distance must be positive")
+
+    rtype = _atom(_field(row, "type") or "paved", to_atom, "type")
+    ttime = _field(row, "time")
+    if ttime is None:
+        ttime = dist * MIN_PER_KM.get(rtype, DEFAULT_MIN_PER_KM)
+    ttime = _number(ttime, "time")
+
+    status = _atom(_field(row, "status") or "open", to_atom, "status")
+    if status not in STATUSES:
+        raise InvalidRoad(f"status must be one of {', '.join(STATUSES)}, got {status}")
+    return src, dst, dist, rtype, ttime, status, _truthy(_field(row, "oneway") or "")
+
+# ---------------------------
+# Readers (one record at a time)
+# ---------------------------
+def iter_csv(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            yield {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}, None, None
+
+def _line_km(coords):
+    km = 0.0
+    for (lon1, lat1, *_), (lon2, lat2, *_) in zip(coords, coords[1:]):
+        p1, p2 = math.radians(lat1), math.radians(lat2)
+        a = (math.sin((p2 - p1) / 2) ** 2
+             + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+        km += 2 * 6371.0 * math.asin(min(1.0, math.sqrt(a)))
+    return km
+
+def iter_geojson_features(f, chunk_size=1 << 16):
+    """
+    Yield the objects of a FeatureCollection's "features" array one at a
+    time, holding only the current feature and one read chunk in memory.
+    """
+    dec = json.JSONDecoder()
+    buf = ""
+    eof = False
+
+    def more():
+        nonlocal buf, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf += chunk
+
+    m = None
+    while m is None:
+        m = re.search(r'"features"\s*:\s*\[', buf)
+        if m is None:
+            if eof:
+                raise ValueError("No \"features\" array in GeoJSON input.")
+            buf = buf[-64:]
+            more()
+    pos = m.end()
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("GeoJSON input ended inside the features array.")
+            buf, pos = buf[pos:], 0
+            more()
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            obj, end = dec.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            buf, pos = buf[pos:], 0
+            more()
+            continue
+        yield obj
+        pos = end
+
+def iter_geojson(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for feat in iter_geojson_features(f):
+            props = {str(k).lower(): v for k, v in (feat.get("properties") or {}).items()}
+            geom = feat.get("geometry") or {}
+            coords = geom.get("coordinates") or []
+            if geom.get("type") == "MultiLineString":
+                coords = [pt for part in coords for pt in part]
+            elif geom.get("type") != "LineString":
+                coords = []
+            if len(coords) < 2:
+                yield props, None, None
+                continue
+            ends = ((coords[0][1], coords[0][0]), (coords[-1][1], coords[-1][0]))
+            yield props, _line_km(coords), ends
+
+def iter_records(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".geojson", ".json"):
+        return iter_geojson(path)
+    if ext in (".csv", ".txt"):
+        return iter_csv(path)
+    raise RuntimeError(f"Don't know how to import {ext or path} files (use .csv or .geojson).")
+
+# ---------------------------
+# Writers
+# ---------------------------
+class KBWriter:
+    """
+    Appends road/6 (and coord/3) facts to a KB file, batch_size roads at a
+    time, in the file's own line ending.
+    """
+    def __init__(self, kb_file):
+        self.kb_file = kb_file
+        self.newline = "\n"
+        self.roads = set()
+        self.coords = set()
+        if os.path.exists(kb_file):
+            with open(kb_file, "r", encoding="utf-8", newline="") as f:
+                for line in f:
+                    if line.endswith("\r\n"):
+                        self.newline = "\r\n"
+                    m = ROAD_RE.match(line)
+                    if m:
+                        self.roads.add((m.group(1), m.group(2)))
+                    m = COORD_RE.match(line)
+                    if m:
+                        self.coords.add(m.group(1))
+        self._first = True
+
+    def write(self, roads, coords):
+        lines = [road_fact(*r) + self.newline for r in roads]
+        lines += [f"coord({n}, {lat:.6f}, {lon:.6f})." + self.newline for n, (lat, lon) in coords]
+        if not lines:
+            return
+        if self._first:
+            lines.insert(0, self.newline + "% Imported roads" + self.newline)
+            self._first = False
+        with open(self.kb_file, "a", encoding="utf-8", newline="") as f:
+            f.writelines(lines)
+
+    def close(self):
+        pass
+
+# ---------------------------
+# Import
+# ---------------------------
+def import_roads(path, kb_file, batch_size=5000, to_atom=None, progress=None):
+    """
+    Stream path into kb_file as road/6 facts; the graph snapshot is rebuilt
+    from the KB on the next load_graph. progress(stats) is called after
+    every batch. Returns the stats dict, including roads_per_s.
+    """
+    if to_atom is None:
+        from RoadNetworkPathfinder import to_atom
+    writer = KBWriter(kb_file)
+
+    stats = {"records": 0, "roads": 0, "duplicates": 0, "invalid": 0, "errors": [], "seconds": 0.0}
+    t0 = time.perf_counter()
+    roads, coords = [], []
+
+    def flush():
+        writer.write(roads, coords)
+        roads.clear()
+        coords.clear()
+        stats["seconds"] = time.perf_counter() - t0
+        if progress:
+            progress(stats)
+
+    for row, length_km, ends in iter_records(path):
+        stats["records"] += 1
+        try:
+            src, dst, dist, rtype, ttime, status, oneway = normalise(row, to_atom, length_km)
+        except InvalidRoad as e:
+            stats["invalid"] += 1
+            if len(stats["errors"]) < 20:
+                stats["errors"].append(f"record {stats['records']}: {e}")
+            continue
+        pairs = [(src, dst)] if oneway else [(src, dst), (dst, src)]
+        if any(p in writer.roads for p in pairs):
+            stats["duplicates"] += 1
+            continue
+        for a, b in pairs:
+            writer.roads.add((a, b))
+            roads.append((a, b, dist, rtype, ttime, status))
+        stats["roads"] += len(pairs)
+        if ends:
+            for node, latlon in zip((src, dst), ends):
+                if node not in writer.coords:
+                    writer.coords.add(node)
+                    coords.append((node, latlon))
+        if len(roads) >= batch_size:
+            flush()
+    flush()
+    writer.close()
+    stats["seconds"] = time.perf_counter() - t0
+    stats["roads_per_s"] = stats["roads"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    return stats
+
+def format_stats(stats):
+    lines = [f"{stats['records']} records -> {stats['roads']} roads "
+             f"({stats['duplicates']} duplicates, {stats['invalid']} invalid) "
+             f"in {stats['seconds']:.2f} s, {stats['roads_per_s']:.0f} roads/s"]
+    lines += stats["errors"]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Import roads from CSV or GeoJSON.")
+    ap.add_argument("input")
+    ap.add_argument("--kb", required=True, help="append road/6 facts to this .pl file")
+    ap.add_argument("--batch", type=int, default=5000)
+    args = ap.parse_args()
+    print(format_stats(import_roads(args.input, kb_file=args.kb, batch_size=args.batch)))
@@ -0,0 +1,154 @@
+"""
+Append-only journal of live road changes.
+
+Each line is the Prolog goal that was sent to the running workers:
+    set_road(Src, Dst, Dist, Type, Time, Status).
+    remove_road(Src, Dst).
+so the journal can be replayed as-is. compact() folds it into the .pl KB
+(replacing or dropping the matching road/6 facts) and empties it. Names,
+types and statuses must be plain atoms (ATOM_RE); anything else is refused
+before it reaches the journal or a worker.
+"""
+import hashlib
+import os
+import re
+import threading
+
+from RouteCache import kb_version
+
+SET_RE = re.compile(r"^set_road\((\w+), (\w+), ([^,]+), (\w+), ([^,]+), (\w+)\)\.$")
+REMOVE_RE = re.compile(r"^remove_road\((\w+), (\w+)\)\.$")
+ROAD_RE = re.compile(r"^road\(\s*(\w+)\s*,\s*(\w+)\s*,")
+# what road/6 can take unquoted: a lowercase letter, then letters, digits, _
+ATOM_RE = re.compile(r"^[a-z][a-z0-9_]*$")
+
+
+def road_fact(src, dst, distance, rtype, time_val, status):
+    return f"road({src}, {dst}, {distance}, {rtype}, {time_val}, {status})."
+
+def check_atom(value, name):
+    """
+    value if it is a plain Prolog atom, else ValueError: "1st_street" is a
+    syntax error and "_depot" a variable.
+    """
+    if not isinstance(value, str) or not ATOM_RE.match(value):
+        raise ValueError(f"{name} {value!r} is not a Prolog atom; names must start with a letter")
+    return value
+
+
+class RoadJournal:
+    def __init__(self, kb_file, journal_file, compact_every=200):
+        self.kb_file = kb_file
+        self.journal_file = journal_file
+        self.compact_every = compact_every
+        self.lock = threading.RLock()
+        self._count = len(self.entries())
+
+    def __len__(self):
+        return self._count
+
+    def refresh(self):
+        """
+        Recount the journal from disk, picking up entries appended (or a
+        compaction done) by another process.
+        """
+        with self.lock:
+            self._count = len(self.entries())
+        return self._count
+
+    def entries(self):
+        if not os.path.exists(self.journal_file):
+            return []
+        with open(self.journal_file, "r", encoding="utf-8") as f:
+            return [ln.strip() for ln in f if ln.strip()]
+
+    def _append(self, goal):
+        with self.lock:
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                f.write(goal + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._count += 1
+        return goal
+
+    def set_road(self, src, dst, distance, rtype, time_val, status):
+        """
+        Record a road being added or changed. Returns the Prolog goal.
+        """
+        for value, name in ((src, "source"), (dst, "destination"), (rtype, "type"), (status, "status")):
+            check_atom(value, name)
+        return self._append(f"set_road({src}, {dst}, {distance}, {rtype}, {time_val}, {status}).")
+
+    def remove_road(self, src, dst):
+        check_atom(src, "source")
+        check_atom(dst, "destination")
+        return self._append(f"remove_road({src}, {dst}).")
+
+    def due(self):
+        return self.compact_every and self._count >= self.compact_every
+
+    def version(self):
+        """
+        kb_version of the KB with the journal folded in: identical to
+        kb_version(kb_file) while the journal is empty.
+        """
+        with self.lock:
+            kb = kb_version(self.kb_file)
+            if not self._count:
+                return kb
+            journal = kb_version(self.journal_file)
+            h = hashlib.sha1(f"{kb[1]}+{journal[1]}".encode("ascii")).hexdigest()
+            return (max(kb[0], journal[0]), h)
+
+    def compact(self):
+        """
+        Rewrite the KB with every journalled change applied (atomically) and
+        truncate the journal. Returns the number of entries folded in.
+        """
+        with self.lock:
+            entries = self.entries()
+            if not entries:
+                return 0
+            # (src, dst) -> replacement fact, or None when removed
+            final = {}
+            for goal in entries:
+                m = SET_RE.match(goal)
+                if m:
+                    final[(m.group(1), m.group(2))] = road_fact(*m.groups())
+                    continue
+                m = REMOVE_RE.match(goal)
+                if m:
+                    final[(m.group(1), m.group(2))] = None
+                else:
+                    raise RuntimeError("Unreadable journal entry: " + goal)
+
+            with open(self.kb_file, "r", encoding="utf-8", newline="") as f:
+                lines = f.readlines()
+            newline = "\r\n" if lines and lines[0].endswith("\r\n") else "\n"
+            out = []
+            written = set()
+            last_road = None
+            for line in lines:
+                m = ROAD_RE.match(line)
+                key = (m.group(1), m.group(2)) if m else None
+                if m:
+                    last_road = len(out)
+                if key not in final:
+                    out.append(line)
+                elif final[key] is not None and key not in written:
+                    out.append(final[key] + newline)
+                    written.add(key)
+            # new roads go right after the existing road/6 facts
+            added = [fact + newline for key, fact in final.items() if fact is not None and key not in written]
+            at = len(out) if last_road is None else last_road + 1
+            if at == len(out) and out and not out[-1].endswith("\n"):
+                out[-1] += newline
+            out[at:at] = added
+
+            tmp = self.kb_file + ".tmp"
+            with open(tmp, "w", encoding="utf-8", newline="") as f:
+                f.writelines(out)
+            os.replace(tmp, self.kb_file)
+            open(self.journal_file, "w").close()
+            self._count = 0
+            return len(entries)
@@ -0,0 +1,652 @@
+"""
+Benchmarks for the road network KB.
+
+    python RoadNetworkBench.py astar     # expanded states, dijkstra/8 vs a_star/8 vs bidijkstra/8
+    python RoadNetworkBench.py bidir     # native bidirectional vs one-way Dijkstra on one-way-heavy grids
+    python RoadNetworkBench.py bfs       # bfs/7 scaling on 1k / 10k / 100k node networks
+    python RoadNetworkBench.py parse     # text vs JSON decoding of a 100k-edge export
+    python RoadNetworkBench.py memory    # nx.DiGraph vs CSRGraph on a million-edge network
+    python RoadNetworkBench.py ch        # contraction hierarchy vs Dijkstra per profile
+    python RoadNetworkBench.py suite [--scale clarendon|parish|island|N] [--types ...] [--closed R]
+                                     [--backends ...] [--queries Q] [--swish-url URL] [--out results.json]
+                                         # every backend x criterion on a synthetic KB
+    python RoadNetworkBench.py compare old.json new.json   # suite runs side by side
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import networkx as nx
+
+import RoadNetworkPathfinder as app
+from ContractionHierarchy import ContractionHierarchy
+from CSRGraph import CSRGraph, find_route_csr
+from PengineStandIn import PengineStandIn
+from PrologWorkerPool import PrologWorkerPool
+from RoadJournal import RoadJournal
+from RouteIndex import profile_of
+from RoutingEngine import CRITERIA_LIST, MODE_FOR, _settle, bfs, bidirectional_dijkstra, find_route_native
+
+# long cross-parish trips on the shipped Clarendon KB
+CROSS_PARISH_PAIRS = [
+    ("sandy_bay", "chapelton"),
+    ("sandy_bay", "longsville_park"),
+    ("milk_river", "summerfield"),
+    ("rock", "kensington"),
+    ("lionel_town", "new_longsville"),
+]
+
+# ---------------------------
+# A* and bidirectional vs Dijkstra expansions
+# ---------------------------
+def bench_astar(pairs=CROSS_PARISH_PAIRS, modes=("distance", "time")):
+    """
+    Run compare_expansions/3 for every pair and mode. Returns rows of
+    (mode, start, goal, dijkstra_expanded, astar_expanded, bidijkstra_expanded).
+    """
+    rows = []
+    for mode in modes:
+        for start, goal in pairs:
+            out = app.call_prolog_local(f"compare_expansions({mode},{start},{goal})")
+            counts = {}
+            for line in out.splitlines():
+                parts = line.strip().split("|")
+                if len(parts) == 4:
+                    counts[parts[0]] = int(parts[1])
+            rows.append((mode, start, goal, counts.get("dijkstra"), counts.get("a_star"), counts.get("bidijkstra")))
+    return rows
+
+def print_astar(rows):
+    print(f"{'mode':<9}{'start':<14}{'goal':<17}{'dijkstra':>9}{'a_star':>8}{'bidijkstra':>11}")
+    for mode, start, goal, dj, ast, bi in rows:
+        print(f"{mode:<9}{start:<14}{goal:<17}{str(dj):>9}{str(ast):>8}{str(bi):>11}")
+
+# ---------------------------
+# Synthetic networks
+# ---------------------------
+ROAD_TYPES = ["paved", "unpaved", "broken_cisterns", "deep_potholes"]
+
+# road type weights and closed share of the shipped RoadNetworkKB.pl (46 roads)
+KB_TYPE_MIX = (0.65, 0.22, 0.09, 0.04)
+KB_CLOSED_RATIO = 0.09
+
+# named network sizes (nodes) for the suite
+SCALES = {"clarendon": 16, "parish": 2500, "island": 100000}
+
+def synthetic_roads(n_nodes, seed=42, type_weights=(0.7, 0.2, 0.05, 0.05), closed_ratio=0.02):
+    """
+    Grid-shaped network of about n_nodes nodes (n0, n1, ...) with two-way
+    roads to the right and lower neighbours, like the mirrored facts in
+    RoadNetworkKB.pl. Yields (src, dst, dist, type, time, status).
+    """
+    rnd = random.Random(seed)
+    side = max(2, int(round(n_nodes ** 0.5)))
+    for i in range(side * side):
+        r, c = divmod(i, side)
+        for j in ((i + 1) if c + 1 < side else None, (i + side) if r + 1 < side else None):
+            if j is None:
+                continue
+            dist = rnd.randint(2, 15)
+            rtype = rnd.choices(ROAD_TYPES, weights=type_weights)[0]
+            ttime = round(dist * (1.5 if rtype == "paved" else 2.5) + rnd.randint(0, 5))
+            status = "closed" if rnd.random() < closed_ratio else "open"
+            yield f"n{i}", f"n{j}", dist, rtype, ttime, status
+            yield f"n{j}", f"n{i}", dist, rtype, ttime, status
+
+def kb_rules(kb_file=None):
+    """
+    The KB source without its road/6 and coord/3 facts.
+    """
+    kb_file = kb_file or app.PROLOG_FILE
+    if not os.path.exists(kb_file):
+        # fall back to the KB shipped next to this script
+        kb_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "RoadNetworkKB.pl")
+    with open(kb_file, "r", encoding="utf-8") as f:
+        return "".join(ln for ln in f if not ln.startswith(("road(", "coord(")))
+
+def write_synthetic_kb(path, roads, kb_file=None):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(kb_rules(kb_file))
+        f.write("\n")
+        for a, b, d, t, tm, st in roads:
+            f.write(f"road({a}, {b}, {d}, {t}, {tm}, {st}).\n")
+
+def graph_from_roads(roads):
+    G = nx.DiGraph()
+    for a, b, d, t, tm, st in roads:
+        G.add_edge(a, b, distance=float(d), rtype=t, time=float(tm), status=st)
+    return G
+
+# ---------------------------
+# BFS scaling
+# ---------------------------
+def bench_bfs(sizes=(1000, 10000, 100000)):
+    """
+    Time loose_constraints BFS corner to corner on synthetic grids, in
+    Prolog (bfs/7 on one pooled worker, consult excluded) and natively.
+    Returns rows of (nodes, roads, expanded, prolog_s, native_s).
+    """
+    rows = []
+    for n in sizes:
+        roads = list(synthetic_roads(n, closed_ratio=0.0))
+        side = max(2, int(round(n ** 0.5)))
+        goal = f"n{side * side - 1}"
+        fd, path = tempfile.mkstemp(suffix=".pl")
+        os.close(fd)
+        try:
+            write_synthetic_kb(path, roads)
+            pool = PrologWorkerPool(app.SWIPL_CMD, path, size=1, query_timeout=600)
+            try:
+                pool.query("true")  # consult outside the timing
+                t0 = time.perf_counter()
+                out = pool.query(f"bfs([],n0,{goal},_,_,_,N), write(N)")
+                prolog_s = time.perf_counter() - t0
+            finally:
+                pool.close()
+        finally:
+            os.remove(path)
+        G = graph_from_roads(roads)
+        t0 = time.perf_counter()
+        bfs(G, [], "n0", goal)
+        native_s = time.perf_counter() - t0
+        rows.append((side * side, len(roads), out.strip(), prolog_s, native_s))
+    return rows
+
+def print_bfs(rows):
+    print(f"{'nodes':>8}{'roads':>9}{'expanded':>10}{'prolog_s':>10}{'native_s':>10}")
+    for nodes, roads, expanded, prolog_s, native_s in rows:
+        print(f"{nodes:>8}{roads:>9}{expanded:>10}{prolog_s:>10.3f}{native_s:>10.3f}")
+
+# ---------------------------
+# Output decoding
+# ---------------------------
+def bench_parse(n_edges=100000, repeat=3):
+    """
+    Decode the same synthetic export as export_edges/0 text lines and as an
+    export_edges(json) array. Returns {name: best seconds}.
+    """
+    roads = []
+    for road in synthetic_roads(n_edges // 3):
+        roads.append(road)
+        if len(roads) == n_edges:
+            break
+    text = "\n".join("E%s,%s,%s,%s,%s,%s" % r for r in roads)
+    js = json.dumps([list(r) for r in roads], separators=(",", ":"))
+
+    def best(fn):
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+        return min(times)
+
+    return {
+        "edges": len(roads),
+        "text_regex_only": best(lambda: [app.EDGE_RE.match(ln) for ln in text.splitlines()]),
+        "json_decode_only": best(lambda: json.loads(js)),
+        "text_to_graph": best(lambda: app.graph_from_edge_lines(text)),
+        "json_to_graph": best(lambda: app.graph_from_edge_rows(app.decode_prolog_json(js))),
+    }
+
+def print_parse(res):
+    print(f"{res['edges']} edges")
+    for k, v in res.items():
+        if k != "edges":
+            print(f"  {k:<18}{v * 1000:>10.1f} ms")
+
+# ---------------------------
+# Graph memory
+# ---------------------------
+def _retained(build):
+    """
+    (object, bytes still allocated after build() returns).
+    """
+    tracemalloc.start()
+    try:
+        obj = build()
+        return obj, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+def bench_memory(n_edges=1000000):
+    """
+    Retained memory of the same island-sized synthetic network held as an
+    nx.DiGraph and as a CSRGraph (built from that graph, node names included).
+    """
+    roads = list(synthetic_roads(n_edges // 4))
+    G, nx_bytes = _retained(lambda: graph_from_roads(roads))
+    C, csr_bytes = _retained(lambda: CSRGraph.from_networkx(G))
+    return {"nodes": len(C), "edges": C.n_edges, "networkx": nx_bytes,
+            "csr": csr_bytes, "csr_arrays": C.nbytes}
+
+def print_memory(res):
+    print(f"{res['nodes']} nodes, {res['edges']} edges")
+    for k in ("networkx", "csr", "csr_arrays"):
+        print(f"  {k:<11}{res[k] / 2**20:>9.1f} MiB{res[k] / res['edges']:>8.1f} B/edge")
+
+# ---------------------------
+# Contraction hierarchies
+# ---------------------------
+def bench_ch(n_nodes=10000, queries=200, closures=5, seed=7):
+    """
+    Per criteria profile on a synthetic grid: hierarchy build time and
+    shortcuts, mean query time against find_route_csr (answers checked to
+    agree), and mean time to update after closing one road.
+    """
+    G = graph_from_roads(synthetic_roads(n_nodes))
+    C = CSRGraph.from_networkx(G)
+    rnd = random.Random(seed)
+    nodes = list(G)
+    pairs = [tuple(rnd.sample(nodes, 2)) for _ in range(queries)]
+    rows = []
+    done = set()
+    for crit in CRITERIA_LIST:
+        profile = profile_of(crit)
+        if profile in done:
+            continue
+        done.add(profile)
+        t0 = time.perf_counter()
+        ch = ContractionHierarchy.build(C, crit)
+        build_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        expected = [find_route_csr(C, crit, a, b) for a, b in pairs]
+        dijkstra_s = (time.perf_counter() - t0) / queries
+        t0 = time.perf_counter()
+        got = [ch.route(C, a, b) for a, b in pairs]
+        ch_s = (time.perf_counter() - t0) / queries
+        # hops compares road counts, the rest the criterion's total
+        cost = (lambda r: len(r[0])) if profile == "hops" else \
+            (lambda r: r[2]) if MODE_FOR[crit][0] == "time" else (lambda r: r[1])
+        wrong = sum((x is None) != (y is None) or (x is not None and abs(cost(x) - cost(y)) > 1e-6)
+                    for x, y in zip(expected, got))
+
+        update_s = []
+        redone = []
+        for u, v, data in rnd.sample([e for e in G.edges(data=True) if e[2]["status"] == "open"], closures):
+            C.set_edge(u, v, data["distance"], data["rtype"], data["time"], "closed")
+            t0 = time.perf_counter()
+            redone.append(ch.update(C))
+            update_s.append(time.perf_counter() - t0)
+            C.set_edge(u, v, data["distance"], data["rtype"], data["time"], data["status"])
+            ch.update(C)
+        rows.append((profile, len(C), C.n_edges, build_s, ch.n_shortcuts, dijkstra_s, ch_s, wrong,
+                     sum(update_s) / closures, sum(redone) / closures))
+    return rows
+
+def print_ch(rows):
+    print(f"{'profile':<28}{'nodes':>7}{'build_s':>9}{'shortcuts':>10}{'dijkstra_ms':>12}"
+          f"{'ch_ms':>8}{'speedup':>8}{'wrong':>6}{'update_s':>9}{'redone':>8}")
+    for profile, n, m, build_s, sc, dj, ch, wrong, upd, redone in rows:
+        print(f"{profile:<28}{n:>7}{build_s:>9.2f}{sc:>10}{dj * 1000:>12.2f}"
+              f"{ch * 1000:>8.3f}{dj / ch:>8.1f}{wrong:>6}{upd:>9.3f}{redone:>8.1f}")
+
+# ---------------------------
+# Bidirectional vs one-way Dijkstra (native)
+# ---------------------------
+def _dijkstra_expanded(G, mode, start, goal):
+    """
+    States dijkstra/8 expands before it pops goal (-1 if never reached).
+    """
+    for n, (node, _) in enumerate(_settle(G, mode, [], start, {}, {})):
+        if node == goal:
+            return n
+    return -1
+
+def bench_bidir(sizes=(1000, 10000, 100000), queries=20, oneway=0.3, seed=11):
+    """
+    Synthetic grids with a share of one-way roads (one direction of a
+    two-way pair dropped at random). Per size and mode: mean states expanded
+    and mean query time for one-way and bidirectional Dijkstra over the same
+    random pairs, and answers whose cost differs.
+    """
+    rows = []
+    for n_nodes in sizes:
+        rnd = random.Random(seed)
+        G = graph_from_roads(r for r in synthetic_roads(n_nodes) if rnd.random() >= oneway / 2)
+        nodes = list(G)
+        pairs = [tuple(rnd.sample(nodes, 2)) for _ in range(queries)]
+        for mode in ("distance", "time"):
+            idx = 2 if mode == "time" else 1
+            t0 = time.perf_counter()
+            expected = [find_route_native(G, "shortest_distance" if mode == "distance" else "fastest_time", a, b)
+                        for a, b in pairs]
+            dijkstra_s = (time.perf_counter() - t0) / queries
+            t0 = time.perf_counter()
+            got = [bidirectional_dijkstra(G, mode, [], a, b) for a, b in pairs]
+            bidir_s = (time.perf_counter() - t0) / queries
+            wrong = sum((x is None) != (y is None) or (x is not None and abs(x[idx] - y[idx]) > 1e-6)
+                        for x, y in zip(expected, got))
+            dj_n = [_dijkstra_expanded(G, mode, a, b) for a, b in pairs]
+            bi_n = []
+            for a, b in pairs:
+                stats = {}
+                bidirectional_dijkstra(G, mode, [], a, b, stats)
+                bi_n.append(stats["expanded"])
+            rows.append((G.number_of_nodes(), mode, statistics.mean(dj_n), statistics.mean(bi_n),
+                         dijkstra_s, bidir_s, wrong))
+    return rows
+
+def print_bidir(rows):
+    print(f"{'nodes':>7} {'mode':<9}{'dijkstra_exp':>13}{'bidir_exp':>10}{'ratio':>7}"
+          f"{'dijkstra_ms':>12}{'bidir_ms':>9}{'wrong':>6}")
+    for n, mode, dj_n, bi_n, dj, bi, wrong in rows:
+        print(f"{n:>7} {mode:<9}{dj_n:>13.0f}{bi_n:>10.0f}{dj_n / max(bi_n, 1):>7.1f}"
+              f"{dj * 1000:>12.2f}{bi * 1000:>9.2f}{wrong:>6}")
+
+# ---------------------------
+# Benchmark suite
+# ---------------------------
+# standin speaks the pengine protocol to a local PengineStandIn, which answers with
+# the Python engines; online needs a real SWISH / pengine server (--swish-url)
+SUITE_BACKENDS = ("local", "standin", "online", "native", "csr", "ch", "draw")
+
+# draw_graph lays out every node; past this the map is not drawn at all
+DRAW_MAX_NODES = 2500
+
+def _timings(fn, args_list):
+    """
+    Call fn(*args) for each args. Returns (seconds per call, failed calls);
+    a None answer counts as a failure only if it raised.
+    """
+    times = []
+    failed = 0
+    for args in args_list:
+        t0 = time.perf_counter()
+        try:
+            fn(*args)
+        except RuntimeError:
+            failed += 1
+        times.append(time.perf_counter() - t0)
+    return times, failed
+
+def _result(backend, operation, times, failed=0, criteria=None, **extra):
+    row = {"backend": backend, "operation": operation, "criteria": criteria, "n": len(times),
+           "failed": failed, "mean_s": statistics.fmean(times) if times else None,
+           "p50_s": statistics.median(times) if times else None,
+           "min_s": min(times) if times else None, "max_s": max(times) if times else None}
+    row.update(extra)
+    return row
+
+def _skipped(backend, reason):
+    return {"backend": backend, "operation": None, "criteria": None, "skipped": reason}
+
+class _SyntheticKB:
+    """
+    Point the app's KB globals at a synthetic KB for the duration of a
+    with-block (route cache, journal and layout cache included).
+    """
+    NAMES = ("PROLOG_FILE", "JOURNAL", "LAYOUT_CACHE_FILE", "PROLOG_OUTPUT", "SWISH_SERVER_URL")
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.saved = {name: getattr(app, name) for name in self.NAMES}
+        base = os.path.splitext(self.path)[0]
+        app.PROLOG_FILE = self.path
+        app.JOURNAL = RoadJournal(self.path, base + ".journal")
+        app.LAYOUT_CACHE_FILE = None
+        app.ROUTE_CACHE.clear()
+        return self
+
+    def __exit__(self, *exc):
+        app.close_pengine_client()
+        if app._POOL is not None:
+            app._POOL.close()
+            app._POOL = None
+        for name, value in self.saved.items():
+            setattr(app, name, value)
+        app.ROUTE_CACHE.clear()
+
+def _uncached(find):
+    def call(*args):
+        app.ROUTE_CACHE.clear()
+        return find(*args)
+    return call
+
+def _bench_prolog(backend, pairs, criteria, repeat):
+    use_online = backend in ("standin", "online")
+    rows = []
+    if use_online:
+        t0 = time.perf_counter()
+        app.query_prolog_online("true")
+        rows.append(_result(backend, "upload_program", [time.perf_counter() - t0]))
+    else:
+        t0 = time.perf_counter()
+        app.call_prolog_local("true")
+        rows.append(_result(backend, "swipl_start_consult", [time.perf_counter() - t0]))
+        rows.append(_result(backend, "call_prolog_local", *_timings(app.call_prolog_local, [("true",)] * repeat)))
+    # the pengine protocol always answers in JSON
+    for output in ("json",) if use_online else ("json", "text"):
+        app.PROLOG_OUTPUT = output
+        rows.append(_result(backend, "load_graph_from_prolog", *_timings(
+            app.load_graph_from_prolog, [(use_online,)] * repeat), output=output))
+    app.PROLOG_OUTPUT = "json"
+    find = _uncached(app.find_route_prolog)
+    for crit in criteria:
+        rows.append(_result(backend, "find_route_prolog", *_timings(
+            find, [(crit, a, b, use_online) for a, b in pairs]), criteria=crit))
+    return rows
+
+def _bench_draw(G, pairs, repeat):
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        return [_skipped("draw", f"no display: {e}")]
+    try:
+        root.withdraw()
+        gui = app.PathFinderApp(root)
+        gui.executor.shutdown(wait=True)
+        C = CSRGraph.from_networkx(G)
+        paths = [r[0] for r in (find_route_csr(C, "shortest_distance", a, b) for a, b in pairs[:repeat]) if r]
+        t0 = time.perf_counter()
+        gui.draw_graph(G)
+        rows = [_result("draw", "draw_graph_first", [time.perf_counter() - t0])]
+        base = []
+        for _ in range(repeat):
+            gui._base_graph = None
+            t0 = time.perf_counter()
+            gui.draw_graph(G)
+            base.append(time.perf_counter() - t0)
+        rows.append(_result("draw", "draw_graph_base", base))
+        rows.append(_result("draw", "draw_graph_route", *_timings(lambda p: gui.draw_graph(G, p),
+                                                                  [(p,) for p in paths])))
+        return rows
+    finally:
+        root.destroy()
+
+def bench_suite(n_nodes=SCALES["clarendon"], type_weights=KB_TYPE_MIX, closed_ratio=KB_CLOSED_RATIO,
+                backends=SUITE_BACKENDS, queries=20, repeat=5, seed=42, swish_url=None):
+    """
+    Generate a synthetic road/6 KB and time each backend on it: local swipl
+    (startup and consult, call_prolog_local, load_graph_from_prolog as JSON
+    and text, find_route_prolog per criterion), the same over the pengine
+    protocol (standin: a local PengineStandIn, which answers with the
+    Python engines; online: the SWISH server at swish_url), the native
+    networkx and CSR engines, contraction hierarchies and draw_graph.
+    Returns {"meta": ..., "results": [row, ...]}; a backend that cannot
+    run here (no swipl, no SWISH URL, no display) gets a row with "skipped"
+    instead.
+    """
+    roads = list(synthetic_roads(n_nodes, seed=seed, type_weights=type_weights, closed_ratio=closed_ratio))
+    G = graph_from_roads(roads)
+    rnd = random.Random(seed)
+    nodes = sorted(G)
+    pairs = [tuple(rnd.sample(nodes, 2)) for _ in range(queries)]
+    criteria = list(CRITERIA_LIST)
+    meta = {"nodes": len(G), "roads": len(roads), "type_weights": dict(zip(ROAD_TYPES, type_weights)),
+            "closed_ratio": closed_ratio, "queries": queries, "repeat": repeat, "seed": seed,
+            "python": platform.python_version(), "platform": platform.platform(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    results = []
+
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "synthetic.pl")
+    write_synthetic_kb(path, roads)
+    stand_in = None
+    try:
+        with _SyntheticKB(path):
+            for backend in ("local", "standin", "online"):
+                if backend not in backends:
+                    continue
+                if backend == "standin":
+                    stand_in = PengineStandIn().start()
+                    app.SWISH_SERVER_URL = stand_in.url
+                elif backend == "online":
+                    if not swish_url:
+                        results.append(_skipped(backend, "no SWISH server URL given"))
+                        continue
+                    app.SWISH_SERVER_URL = swish_url
+                try:
+                    results += _bench_prolog(backend, pairs, criteria, repeat)
+                except (RuntimeError, OSError) as e:
+                    results.append(_skipped(backend, str(e)))
+            if "draw" in backends:
+                if len(G) > DRAW_MAX_NODES:
+                    results.append(_skipped("draw", f"more than {DRAW_MAX_NODES} nodes"))
+                else:
+                    results += _bench_draw(G, pairs, repeat)
+    finally:
+        if stand_in is not None:
+            stand_in.shutdown()
+        for name in os.listdir(tmp):
+            os.remove(os.path.join(tmp, name))
+        os.rmdir(tmp)
+
+    if "native" in backends:
+        for crit in criteria:
+            results.append(_result("native", "find_route_native", *_timings(
+                find_route_native, [(G, crit, a, b) for a, b in pairs]), criteria=crit))
+    if {"csr", "ch"} & set(backends):
+        t0 = time.perf_counter()
+        C = CSRGraph.from_networkx(G)
+        results.append(_result("csr", "from_networkx", [time.perf_counter() - t0]))
+    if "csr" in backends:
+        for crit in criteria:
+            results.append(_result("csr", "find_route_csr", *_timings(
+                find_route_csr, [(C, crit, a, b) for a, b in pairs]), criteria=crit))
+    if "ch" in backends:
+        built = {}
+        for crit in criteria:
+            profile = profile_of(crit)
+            if profile not in built:
+                t0 = time.perf_counter()
+                built[profile] = ContractionHierarchy.build(C, crit)
+                results.append(_result("ch", "build", [time.perf_counter() - t0], criteria=crit,
+                                       profile=profile, shortcuts=built[profile].n_shortcuts))
+            ch = built[profile]
+            results.append(_result("ch", "route", *_timings(ch.route, [(C, a, b) for a, b in pairs]),
+                                   criteria=crit))
+    return {"meta": meta, "results": results}
+
+def print_suite(res):
+    meta = res["meta"]
+    print(f"{meta['nodes']} nodes, {meta['roads']} roads, closed {meta['closed_ratio']:.0%}, "
+          f"{meta['queries']} queries per criterion")
+    print(f"{'backend':<8}{'operation':<24}{'criteria':<21}{'n':>5}{'mean_ms':>10}{'p50_ms':>10}{'max_ms':>10}")
+    for row in res["results"]:
+        if "skipped" in row:
+            print(f"{row['backend']:<8}skipped: {row['skipped']}")
+            continue
+        label = row["criteria"] or row.get("output") or ""
+        print(f"{row['backend']:<8}{row['operation']:<24}{label:<21}{row['n']:>5}"
+              f"{row['mean_s'] * 1000:>10.2f}{row['p50_s'] * 1000:>10.2f}{row['max_s'] * 1000:>10.2f}"
+              + (f"  ({row['failed']} failed)" if row["failed"] else ""))
+
+def _row_key(row):
+    return row["backend"], row["operation"], row["criteria"] or row.get("output")
+
+def compare_suites(old, new, threshold=1.2):
+    """
+    Rows of (key, old p50 s, new p50 s, ratio, regressed) for every timing
+    present in both suite results.
+    """
+    before = {_row_key(r): r for r in old["results"] if "skipped" not in r}
+    rows = []
+    for r in new["results"]:
+        key = _row_key(r)
+        if "skipped" in r or key not in before or not before[key]["p50_s"]:
+            continue
+        ratio = r["p50_s"] / before[key]["p50_s"]
+        rows.append((key, before[key]["p50_s"], r["p50_s"], ratio, ratio > threshold))
+    return rows
+
+def print_compare(rows):
+    print(f"{'backend':<8}{'operation':<24}{'criteria':<21}{'old_ms':>10}{'new_ms':>10}{'ratio':>7}")
+    for (backend, operation, label), old, new, ratio, regressed in rows:
+        print(f"{backend:<8}{operation:<24}{label or '':<21}{old * 1000:>10.2f}{new * 1000:>10.2f}"
+              f"{ratio:>7.2f}" + ("  REGRESSED" if regressed else ""))
+
+def _type_mix(text):
+    """
+    "paved=0.7,unpaved=0.3" -> weights in ROAD_TYPES order.
+    """
+    weights = dict.fromkeys(ROAD_TYPES, 0.0)
+    for part in text.split(","):
+        name, _, w = part.partition("=")
+        if name.strip() not in weights:
+            raise argparse.ArgumentTypeError(f"unknown road type {name.strip()!r}")
+        weights[name.strip()] = float(w)
+    return tuple(weights[t] for t in ROAD_TYPES)
+
+def _scale(text):
+    return SCALES[text] if text in SCALES else int(text)
+
+def run_suite(argv):
+    ap = argparse.ArgumentParser(prog="RoadNetworkBench.py suite")
+    ap.add_argument("--scale", type=_scale, default=SCALES["clarendon"],
+                    help=f"{', '.join(SCALES)} or a node count")
+    ap.add_argument("--types", type=_type_mix, default=KB_TYPE_MIX,
+                    help="road type weights, e.g. paved=0.7,unpaved=0.2,broken_cisterns=0.05,deep_potholes=0.05")
+    ap.add_argument("--closed", type=float, default=KB_CLOSED_RATIO, help="share of closed roads")
+    ap.add_argument("--backends", nargs="+", choices=SUITE_BACKENDS, default=list(SUITE_BACKENDS))
+    ap.add_argument("--queries", type=int, default=20, help="route queries per criterion")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--swish-url", help="SWISH / pengine server for the online backend")
+    ap.add_argument("--out", help="write the JSON results here")
+    args = ap.parse_args(argv)
+    res = bench_suite(args.scale, args.types, args.closed, args.backends, args.queries, args.repeat, args.seed,
+                      args.swish_url)
+    print_suite(res)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=2)
+        print("results written to", args.out)
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "astar"
+    try:
+        if cmd == "astar":
+            print_astar(bench_astar())
+        elif cmd == "bidir":
+            print_bidir(bench_bidir())
+        elif cmd == "bfs":
+            print_bfs(bench_bfs())
+        elif cmd == "parse":
+            print_parse(bench_parse())
+        elif cmd == "memory":
+            print_memory(bench_memory())
+        elif cmd == "ch":
+            print_ch(bench_ch())
+        elif cmd == "suite":
+            run_suite(sys.argv[2:])
+        elif cmd == "compare" and len(sys.argv) == 4:
+            with open(sys.argv[2], encoding="utf-8") as f_old, open(sys.argv[3], encoding="utf-8") as f_new:
+                print_compare(compare_suites(json.load(f_old), json.load(f_new)))
+        else:
+            print(__doc__)
+    finally:
+        if app._POOL is not None:
+            app._POOL.close()
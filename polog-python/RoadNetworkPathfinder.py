@@ -1,7 +1,5 @@
-import subprocess
-import shlex
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import os
 import re
 import networkx as nx
@@ -10,6 +8,22 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import requests
 import json
 import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from PrologWorkerPool import PrologWorkerPool, query_owner
+from PengineClient import PengineClient, PengineError
+from CSRGraph import CSRGraph, find_route_csr, reach_csr
+from ContractionHierarchy import HierarchySet
+from RoutingEngine import MODE_FOR, pareto_routes
+from KShortest import k_shortest_routes
+from RouteCache import RouteCache
+from GraphLayout import LayoutCache
+from RouteIndex import RouteIndex, build_index
+from GraphSnapshot import GraphSnapshot, write_snapshot
+from RoadJournal import RoadJournal
+from RoadImporter import import_roads, format_stats
+from QueryTracing import Metrics, Trace, Tracer
+from TimeDependent import Schedule, format_clock, parse_clock, route_at
 
 # ---------------------------
 # CONFIG
@@ -19,55 +33,165 @@ PROLOG_FILE = r"C:\Users\Kukkinoba\Documents\polog-python\RoadNetworkKB.pl"
 # Local swipl
 SWIPL_CMD = r"C:\Program Files\swipl\bin\swipl.exe"
 
+# Worker pool: number of long-lived swipl processes and per-query timeout (s)
+PROLOG_POOL_SIZE = 2
+PROLOG_QUERY_TIMEOUT = 30
 
-# SWISH API
-SWISH_PENGINE_URL = "https://swish.swi-prolog.org/pengine/create"
+# Route cache: max number of (criteria, start, goal) answers kept per KB version
+ROUTE_CACHE_SIZE = 512
+
+# GUI background queries: executor threads and how often (ms) the Tk loop polls them
+QUERY_WORKERS = 4
+QUERY_POLL_MS = 50
+
+# Map layout positions, reused until the road topology changes (None = memory only)
+LAYOUT_CACHE_FILE = os.path.splitext(PROLOG_FILE)[0] + ".layout.json"
+
+# All-pairs route index (one sub-folder per KB hash), built by "python RouteIndex.py"
+ROUTE_INDEX_DIR = os.path.splitext(PROLOG_FILE)[0] + ".index"
+
+# Binary road graph snapshot, rebuilt when the KB hash changes (None = always ask Prolog)
+GRAPH_SNAPSHOT_FILE = os.path.splitext(PROLOG_FILE)[0] + ".graph"
+
+# Live road changes: append-only journal, folded into PROLOG_FILE every N entries
+ROAD_JOURNAL_FILE = os.path.splitext(PROLOG_FILE)[0] + ".journal"
+JOURNAL_COMPACT_EVERY = 200
+
+
+# Native mode answers routes from contraction hierarchies (one file per criteria
+# profile in CH_DIR, updated in place when roads change; None = memory only)
+USE_CONTRACTION_HIERARCHY = True
+CH_DIR = os.path.splitext(PROLOG_FILE)[0] + ".ch"
+
+# SWISH API (one kept-alive pengine, destroyed after PENGINE_IDLE_TIMEOUT seconds idle)
+SWISH_SERVER_URL = "https://swish.swi-prolog.org"
+PENGINE_IDLE_TIMEOUT = 120
+
+# Alternative routes (Yen's k shortest) shown by default, and their map colours
+ALTERNATIVE_ROUTES = 5
+ALTERNATIVE_COLORS = ["royalblue", "darkorange", "purple", "brown", "teal", "magenta", "olive", "navy", "gold"]
+
+# How results come back from Prolog: "json" (run_query/4, export_edges/1)
+# or "text" (regex over run_query/3 and export_edges/0 output)
+PROLOG_OUTPUT = "json"
+
+# Query timings: Prometheus text file rewritten after each action (None to
+# disable), and a port to serve GET /metrics on (None for no endpoint)
+METRICS_FILE = os.path.splitext(PROLOG_FILE)[0] + ".metrics.prom"
+METRICS_PORT = None
 
 # ---------------------------
+# spans around swipl start-up, consult, search, parsing and redraw
+METRICS = Metrics()
+TRACER = Tracer(METRICS)
+
+# ---------------------------
+_POOL = None
+
+def _worker_started(startup_s, consult_s):
+    TRACER.record("swipl_start", startup_s)
+    TRACER.record("consult", consult_s)
+
+def get_prolog_pool():
+    """
+    Return the shared swipl worker pool, (re)creating it if SWIPL_CMD or
+    PROLOG_FILE changed since it was started. A new pool is seeded with the
+    uncompacted journal, which PROLOG_FILE does not include yet.
+    """
+    global _POOL
+    with JOURNAL.lock:
+        if _POOL is None or _POOL.swipl_cmd != SWIPL_CMD or _POOL.prolog_file != PROLOG_FILE:
+            if _POOL is not None:
+                _POOL.close()
+            _POOL = PrologWorkerPool(SWIPL_CMD, PROLOG_FILE, size=PROLOG_POOL_SIZE,
+                                     query_timeout=PROLOG_QUERY_TIMEOUT, on_ready=_worker_started)
+            for goal in JOURNAL.entries():
+                _POOL.update(goal)
+        return _POOL
+
+def reload_prolog_pool():
+    """
+    Make the workers re-consult PROLOG_FILE, then replay the uncompacted
+    journal on top of it.
+    """
+    with JOURNAL.lock:
+        if _POOL is not None:
+            _POOL.reload()
+            for goal in JOURNAL.entries():
+                _POOL.update(goal)
+
+def cancel_prolog(owner):
+    """
+    Stop the local Prolog query started under query_owner(owner), if it is
+    still running; its swipl worker is killed and restarted.
+    """
+    if _POOL is not None:
+        _POOL.cancel(owner)
+
 def call_prolog_local(goal: str):
     """
-    Call local swipl with the specified goal. Returns stdout string.
+    Run goal on a pooled local swipl worker (KB already consulted). Returns
+    stdout string, empty if the goal failed; a goal that raised is a RuntimeError.
     """
-    cmd = [SWIPL_CMD, "-q", "-s", PROLOG_FILE, "-g", goal, "-t", "halt"]
-    try:
-        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-    except FileNotFoundError:
-        raise RuntimeError("swipl not found. Set SWIPL_CMD to your swipl executable path or install SWI-Prolog.")
-    except subprocess.TimeoutExpired:
-        raise RuntimeError("Local Prolog timed out.")
-    if proc.stderr:
-        print("Prolog stderr:", proc.stderr)
-    return proc.stdout.strip()
+    return get_prolog_pool().query(goal, raise_errors=True)
 
-def call_prolog_online(goal: str):
+_PENGINE = None
+
+def _online_source():
     """
-    Use SWISH pengine API: upload the prolog file content and ask goal.
-    Returns the raw output string as emitted by run_query (if any).
-    Notes: This uses the public SWISH endpoint.
+    (version, program) uploaded to SWISH: the KB file plus any journalled
+    road changes as directives.
     """
     if not os.path.exists(PROLOG_FILE):
         raise RuntimeError(f"Local PROLOG_FILE not found at {PROLOG_FILE} — required to upload program for remote execution.")
-    prog = open(PROLOG_FILE, "r", encoding="utf8").read()
+    with JOURNAL.lock:
+        version = current_kb_version()
+        prog = open(PROLOG_FILE, "r", encoding="utf8").read()
+        updates = "".join(f"\n:- {goal}" for goal in JOURNAL.entries())
+    return version, prog + updates + "\n"
 
-    payload = {
-        "src": prog,
-        "ask": goal,
-        "format": "json"
-    }
+def get_pengine_client():
+    """
+    Return the shared pengine client, (re)creating it if SWISH_SERVER_URL changed.
+    """
+    global _PENGINE
+    if _PENGINE is None or _PENGINE.server_url != SWISH_SERVER_URL.rstrip("/"):
+        if _PENGINE is not None:
+            _PENGINE.close()
+        _PENGINE = PengineClient(SWISH_SERVER_URL, _online_source, idle_timeout=PENGINE_IDLE_TIMEOUT)
+    return _PENGINE
 
-    try:
-        resp = requests.post(SWISH_PENGINE_URL, json=payload, timeout=30)
-    except Exception as e:
-        raise RuntimeError("Online Prolog request failed: " + str(e))
+def close_pengine_client():
+    global _PENGINE
+    if _PENGINE is not None:
+        _PENGINE.close()
+        _PENGINE = None
 
-    if resp.status_code != 201 and resp.status_code != 200:
-        raise RuntimeError(f"SWISH responded with status {resp.status_code}: {resp.text[:200]}")
+def _pengine_ask(goal: str):
+    """
+    Ask goal on the shared SWISH pengine and return the decoded answer event.
+    """
+    return get_pengine_client().ask(goal)
 
-    try:
-        data = resp.json()
-    except Exception:
-        raise RuntimeError("Failed to parse SWISH JSON response: " + resp.text[:1000])
+def query_prolog_online(goal: str):
+    """
+    Ask goal on SWISH and return its answers as a list of binding dicts
+    (empty if the goal failed).
+    """
+    return get_pengine_client().query(goal)
 
+def call_prolog_online(goal: str):
+    """
+    Ask goal on the shared SWISH pengine (KB uploaded once per version).
+    Returns the raw output string as emitted by run_query (empty if the
+    goal failed). Notes: This uses the public SWISH endpoint.
+    """
+    data = _pengine_ask(goal)
+    event = (data or {}).get("event")
+    if event == "failure":
+        return ""
+    if event == "error":
+        raise PengineError(f"SWISH error: {str(data.get('data', data))[:300]}")
 
     def search_for_result(obj):
         if isinstance(obj, str):
@@ -112,8 +236,85 @@ def call_prolog(goal: str, use_online=False):
 # loading the grapgh from Prolog
 EDGE_RE = re.compile(r"^E([^,]+),([^,]+),([^,]+),([^,]+),([^,]+),([^,]+)$")
 
+def decode_prolog_json(text):
+    """
+    json.loads for Prolog output; empty or broken output is an error, not "no result".
+    json_write(..., [width(0)]) prints one line, so warnings printed before
+    it are skipped.
+    """
+    lines = (text or "").strip().splitlines()
+    for candidate in (text, lines[-1] if lines else None):
+        try:
+            return json.loads(candidate)
+        except (TypeError, ValueError):
+            pass
+    raise RuntimeError("Could not decode Prolog JSON output: " + repr((text or "")[:300]))
+
+def graph_from_edge_rows(rows):
+    """
+    Build the graph from [src, dst, distance, type, time, status] rows
+    (export_edges(json) or the SWISH findall answer).
+    """
+    if not isinstance(rows, list):
+        raise RuntimeError("Expected a list of road rows, got " + type(rows).__name__)
+    edges = []
+    for row in rows:
+        try:
+            if not isinstance(row, list):
+                raise TypeError
+            a, b, d, t, ttime, status = row
+            if not all(isinstance(x, str) for x in (a, b, t, status)):
+                raise TypeError
+            edges.append((a, b, {"distance": float(d), "rtype": t, "time": float(ttime), "status": status}))
+        except (TypeError, ValueError):
+            raise RuntimeError("Malformed road row from Prolog: " + repr(row)[:200])
+    G = nx.DiGraph()
+    G.add_edges_from(edges)
+    return G
+
 def load_graph_from_prolog(use_online=False):
-    out = call_prolog("export_edges.", use_online)
+    backend = "online" if use_online else "local"
+    if PROLOG_OUTPUT == "json":
+        if use_online:
+            with TRACER.span("export", backend=backend):
+                answers = query_prolog_online("findall([A,B,D,Ty,T,S], road(A,B,D,Ty,T,S), Rows)")
+            rows = answers[0]["Rows"] if answers else []
+        else:
+            with TRACER.span("export", backend=backend):
+                out = call_prolog_local("export_edges(json)")
+            with TRACER.span("parse"):
+                rows = decode_prolog_json(out)
+        with TRACER.span("build_graph"):
+            return graph_from_edge_rows(rows)
+    with TRACER.span("export", backend=backend):
+        out = call_prolog("export_edges.", use_online)
+    with TRACER.span("parse"):
+        return graph_from_edge_lines(out)
+
+def load_graph(use_online=False):
+    """
+    The road graph for the map. Locally it comes from the snapshot next to
+    the KB; Prolog is only asked (and the snapshot rewritten) when the KB
+    hash no longer matches.
+    """
+    if use_online or not GRAPH_SNAPSHOT_FILE:
+        return load_graph_from_prolog(use_online)
+    kb_hash = current_kb_version()[1]
+    with TRACER.span("snapshot"):
+        snap = GraphSnapshot.load(GRAPH_SNAPSHOT_FILE, kb_hash)
+        if snap is not None:
+            return snap.to_networkx()
+    G = load_graph_from_prolog()
+    try:
+        write_snapshot(G, GRAPH_SNAPSHOT_FILE, kb_hash)
+    except OSError as e:
+        print("Could not write graph snapshot:", e)
+    return G
+
+def graph_from_edge_lines(out):
+    """
+    Build the graph from export_edges/0 text (one E-line per road).
+    """
     G = nx.DiGraph()
     if not out:
         return G
@@ -142,6 +343,19 @@ def load_graph_from_prolog(use_online=False):
     return G
 
 # format user input
+CRITERIA_ATOMS = {
+    "Shortest Distance": "shortest_distance",
+    "Fastest Time": "fastest_time",
+    "Avoid Unpaved Roads": "avoid_unpaved",
+    "Avoid Broken Cistern Roads": "avoid_broken",
+    "Avoid Deep Potholes": "avoid_deep_potholes",
+    "Loose Constraints (BFS)": "loose_constraints",
+    "A* Distance": "astar_distance",
+    "A* Time": "astar_time",
+    "Bidirectional Distance": "bidir_distance",
+    "Bidirectional Time": "bidir_time"
+}
+
 def to_atom(s: str) -> str:
     s2 = re.sub(r'[^a-z0-9_ ]', '', s.lower())
     s2 = s2.replace(' ', '_')
@@ -150,15 +364,77 @@ def to_atom(s: str) -> str:
     return s2
 
 # Calling the run_query
+ROUTE_CACHE = RouteCache(maxsize=ROUTE_CACHE_SIZE)
+
 def find_route_prolog(criteria_atom, start_atom, goal_atom, use_online=False):
+    """
+    run_query/3 answer as (path, dist, time) or None, served from
+    ROUTE_CACHE when the same question was asked of the same backend and KB
+    version. Errors raise and are not cached.
+    """
+    key = (criteria_atom, start_atom, goal_atom, use_online, current_kb_version())
+    found, res = ROUTE_CACHE.get(key)
+    if found:
+        TRACER.annotate(route_cache="hit")
+        return res
+    res = _run_query_prolog(criteria_atom, start_atom, goal_atom, use_online)
+    ROUTE_CACHE.put(key, res)
+    return res
+
+def decode_route_json(text):
+    """
+    run_query/4 json output -> (route, expanded): route is (path, dist, time),
+    or None for {"path": null}; expanded is the states the search expanded
+    (None when not reported).
+    """
+    obj = decode_prolog_json(text)
+    if not isinstance(obj, dict) or "path" not in obj:
+        raise RuntimeError("Unexpected run_query JSON: " + repr(text[:300]))
+    expanded = obj.get("expanded")
+    path, dist, ttime = obj["path"], obj.get("distance"), obj.get("time")
+    if expanded is not None and (not isinstance(expanded, int) or isinstance(expanded, bool)):
+        raise RuntimeError("Unexpected run_query JSON: " + repr(text[:300]))
+    if path is None:
+        return None, expanded
+    numbers = all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in (dist, ttime))
+    if not isinstance(path, list) or not all(isinstance(p, str) for p in path) or not numbers:
+        raise RuntimeError("Unexpected run_query JSON: " + repr(text[:300]))
+    return (path, float(dist), float(ttime)), expanded
+
+def _run_query_prolog(criteria_atom, start_atom, goal_atom, use_online=False):
+    backend = "online" if use_online else "local"
+    if PROLOG_OUTPUT == "json":
+        if use_online:
+            with TRACER.span("search", backend=backend):
+                answers = query_prolog_online(f"route({criteria_atom},{start_atom},{goal_atom},Path,Dist,Time)")
+            if not answers:
+                return None
+            a = answers[0]
+            return [str(p) for p in a["Path"]], float(a["Dist"]), float(a["Time"])
+        with TRACER.span("search", backend=backend):
+            out = call_prolog_local(f"run_query({criteria_atom},{start_atom},{goal_atom},json)")
+        with TRACER.span("parse"):
+            res, expanded = decode_route_json(out)
+        if expanded is not None:
+            TRACER.count_expanded(MODE_FOR[criteria_atom][1], expanded)
+        return res
+
     goal = f"run_query({criteria_atom},{start_atom},{goal_atom})"
-    out = call_prolog(goal, use_online=use_online)
+    with TRACER.span("search", backend=backend):
+        out = call_prolog(goal, use_online=use_online)
+    with TRACER.span("parse"):
+        return decode_route_text(out)
+
+def decode_route_text(out):
+    """
+    run_query/3 text output (Path|Dist|Time) -> (path, dist, time), or None
+    when the goal failed (no output). Output that is not a route is an error.
+    """
     if not out:
         return None
     m = re.search(r"(\[[^\]]+\]\|\s*-?\d+(\.\d+)?\|\s*-?\d+(\.\d+)?)", out)
     if not m:
-        print("DEBUG: Could not parse prolog output. Raw:", out[:1000])
-        return None
+        raise RuntimeError("Could not parse Prolog route output: " + repr(out[:300]))
     s = m.group(1)
     try:
         path_str, dist_str, time_str = s.split("|")
@@ -174,16 +450,297 @@ def find_route_prolog(criteria_atom, start_atom, goal_atom, use_online=False):
         dist = float(dist_str)
         ttime = float(time_str)
         return path, dist, ttime
-    except Exception as e:
-        print("Failed to parse parsed match:", e)
-        print("Raw match:", s)
-        return None
+    except ValueError as e:
+        raise RuntimeError(f"Could not parse Prolog route {s!r}: {e}")
+
+# ---------------------------
+# Pareto routes: distance vs time vs rough-road km in one search
+# ---------------------------
+# one Pareto-optimal route; rough is km driven on unpaved / broken / pothole roads
+ParetoRoute = namedtuple("ParetoRoute", ["path", "distance", "time", "rough"])
+
+def _pareto_row(row):
+    path, d, t, x = row
+    return ParetoRoute([str(p) for p in path], float(d), float(t), float(x))
+
+def find_pareto_prolog(start_atom, goal_atom, use_online=False):
+    """
+    pareto/3 answer as a list of ParetoRoute (empty if the goal is
+    unreachable), cached like find_route_prolog.
+    """
+    key = ("pareto", start_atom, goal_atom, use_online, current_kb_version())
+    found, res = ROUTE_CACHE.get(key)
+    if found:
+        return res
+    if use_online:
+        answers = query_prolog_online(
+            f"findall([P,D,T,X], (pareto({start_atom},{goal_atom},Rs), member(route(P,D,T,X),Rs)), Routes)")
+        res = [_pareto_row(r) for r in answers[0]["Routes"]] if answers else []
+    elif PROLOG_OUTPUT == "json":
+        obj = decode_prolog_json(call_prolog_local(f"run_pareto({start_atom},{goal_atom},json)"))
+        res = [_pareto_row((r["path"], r["distance"], r["time"], r["rough"])) for r in obj["routes"]]
+    else:
+        res = []
+        for line in call_prolog_local(f"run_pareto({start_atom},{goal_atom},text)").splitlines():
+            parts = line.strip().split("|")
+            if len(parts) == 5 and parts[0] == "P":
+                inner = parts[1].strip()[1:-1].strip()
+                path = [p.strip() for p in inner.split(",")] if inner else []
+                res.append(_pareto_row((path, parts[2], parts[3], parts[4])))
+    ROUTE_CACHE.put(key, res)
+    return res
+
+def find_pareto_native(G, start_atom, goal_atom):
+    return [ParetoRoute(*r) for r in pareto_routes(G, start_atom, goal_atom)]
+
+# ---------------------------
+# Reachability: one shortest-path tree from a start, optionally cut off
+# ---------------------------
+# one reached place; prev is None at the start
+ReachNode = namedtuple("ReachNode", ["node", "prev", "distance", "time"])
+
+def _reach_row(row):
+    node, prev, d, t = row
+    prev = None if prev in (None, "none") else str(prev)
+    return ReachNode(str(node), prev, float(d), float(t))
+
+def find_reach_prolog(mode, criteria_atom, start_atom, limit=None, use_online=False):
+    """
+    reach/5 answer as a list of ReachNode in increasing cost (mode is
+    "distance" or "time", limit in km or minutes, None for the whole
+    reachable network), cached like find_route_prolog.
+    """
+    bound = "none" if limit is None else repr(float(limit))
+    key = ("reach", mode, criteria_atom, start_atom, bound, use_online, current_kb_version())
+    found, res = ROUTE_CACHE.get(key)
+    if found:
+        return res
+    if use_online:
+        answers = query_prolog_online(
+            f"findall([N,P,D,T], (reach({mode},{criteria_atom},{start_atom},{bound},Tree), member(n(N,P,D,T),Tree)), Rows)")
+        res = [_reach_row(r) for r in answers[0]["Rows"]] if answers else []
+    elif PROLOG_OUTPUT == "json":
+        obj = decode_prolog_json(call_prolog_local(f"run_reach({mode},{criteria_atom},{start_atom},{bound},json)"))
+        res = [_reach_row((r["node"], r["prev"], r["distance"], r["time"])) for r in obj["tree"]]
+    else:
+        res = []
+        for line in call_prolog_local(f"run_reach({mode},{criteria_atom},{start_atom},{bound},text)").splitlines():
+            parts = line.strip().split("|")
+            if len(parts) == 5 and parts[0] == "N":
+                res.append(_reach_row(parts[1:]))
+    ROUTE_CACHE.put(key, res)
+    return res
+
+def find_reach_native(C, mode, criteria_atom, start_atom, limit=None):
+    return [ReachNode(*r) for r in reach_csr(C, criteria_atom, start_atom, mode, limit)]
+
+# ---------------------------
+# Precomputed all-pairs index
+# ---------------------------
+_ROUTE_INDEX = None
+
+def current_route_index():
+    """
+    The route index matching the KB as it is on disk now, or None if the KB
+    changed since the last precompute (callers then fall back to a search).
+    """
+    global _ROUTE_INDEX
+    kb_hash = current_kb_version()[1]
+    if _ROUTE_INDEX is None or _ROUTE_INDEX.kb_hash != kb_hash:
+        _ROUTE_INDEX = RouteIndex.open(ROUTE_INDEX_DIR, kb_hash)
+    return _ROUTE_INDEX
+
+# contraction hierarchies for native mode, built per profile on first use
+HIERARCHIES = HierarchySet(CH_DIR)
+
+# ---------------------------
+# Departure-time routes: time profiles and closure windows (route_at/7)
+# ---------------------------
+def find_route_at_prolog(criteria_atom, start_atom, goal_atom, depart, use_online=False):
+    """
+    route_at/7 answer as (path, dist, time) or None for a departure at
+    clock minute depart, cached like find_route_prolog.
+    """
+    key = ("at", depart, criteria_atom, start_atom, goal_atom, use_online, current_kb_version())
+    found, res = ROUTE_CACHE.get(key)
+    if found:
+        TRACER.annotate(route_cache="hit")
+        return res
+    backend = "online" if use_online else "local"
+    if use_online:
+        with TRACER.span("search", backend=backend):
+            answers = query_prolog_online(f"route_at({criteria_atom},{depart},{start_atom},{goal_atom},Path,Dist,Time)")
+        res = None
+        if answers:
+            a = answers[0]
+            res = [str(p) for p in a["Path"]], float(a["Dist"]), float(a["Time"])
+    elif PROLOG_OUTPUT == "json":
+        with TRACER.span("search", backend=backend):
+            out = call_prolog_local(f"run_query_at({criteria_atom},{depart},{start_atom},{goal_atom},json)")
+        with TRACER.span("parse"):
+            res, expanded = decode_route_json(out)
+        if expanded is not None:
+            TRACER.count_expanded("route_at", expanded)
+    else:
+        with TRACER.span("search", backend=backend):
+            out = call_prolog_local(f"run_query_at({criteria_atom},{depart},{start_atom},{goal_atom},text)")
+        with TRACER.span("parse"):
+            res = decode_route_text(out)
+    ROUTE_CACHE.put(key, res)
+    return res
+
+_SCHEDULE = None
+
+def current_schedule():
+    """
+    The KB's time profiles and closure windows for native departure-time
+    routes, read from PROLOG_FILE (no Prolog needed) when it changes.
+    """
+    global _SCHEDULE
+    version = current_kb_version()
+    if _SCHEDULE is None or _SCHEDULE[0] != version:
+        with open(PROLOG_FILE, "r", encoding="utf8") as f:
+            _SCHEDULE = (version, Schedule.from_source(f.read()))
+    return _SCHEDULE[1]
+
+# ---------------------------
+# Batch queries: many (criteria, start, goal) triples per Prolog call
+# ---------------------------
+# one row per triple; path/distance/time are None when there is no route
+RouteRow = namedtuple("RouteRow", ["criteria", "start", "goal", "path", "distance", "time"])
+
+BATCH_CHUNK = 500
+
+def _parse_batch_line(line):
+    # R|Crit|Start|Goal|[a,b]|4.00|6.00   or   R|Crit|Start|Goal|none
+    parts = line.split("|")
+    if len(parts) == 5 and parts[4] == "none":
+        return tuple(parts[1:4]), None
+    if len(parts) != 7:
+        raise ValueError("expected 7 fields")
+    inner = parts[4].strip()[1:-1].strip()
+    path = [p.strip() for p in inner.split(",")] if inner else []
+    return tuple(parts[1:4]), (path, float(parts[5]), float(parts[6]))
+
+def find_routes_batch(triples, use_online=False):
+    """
+    Answer a list of (criteria_atom, start_atom, goal_atom) triples with
+    run_queries/1, BATCH_CHUNK triples per Prolog call. Cached answers are
+    reused and new ones are added to ROUTE_CACHE. Returns a list of RouteRow
+    in input order (e.g. pandas.DataFrame(rows) for a table); a row with no
+    path means no route. Output that is empty, unparseable or missing a
+    triple is a RuntimeError, and nothing from that chunk is cached.
+    """
+    version = current_kb_version()
+    answers = {}
+    todo = []
+    for t in dict.fromkeys(triples):
+        found, res = ROUTE_CACHE.get(t + (use_online, version))
+        if found:
+            answers[t] = res
+        else:
+            todo.append(t)
+
+    for i in range(0, len(todo), BATCH_CHUNK):
+        chunk = todo[i:i + BATCH_CHUNK]
+        goal = "run_queries([" + ",".join(f"q({c},{s},{g})" for c, s, g in chunk) + "])"
+        out = call_prolog(goal, use_online=use_online)
+        if not out:
+            raise RuntimeError(f"No batch output for {len(chunk)} route queries.")
+        got = {}
+        for line in out.splitlines():
+            line = line.strip()
+            if not line.startswith("R|"):
+                continue
+            try:
+                key, res = _parse_batch_line(line)
+            except ValueError as e:
+                raise RuntimeError(f"Could not parse batch line {line[:300]!r}: {e}")
+            got[key] = res
+        missing = [t for t in chunk if t not in got]
+        if missing:
+            raise RuntimeError(f"No batch answer for {missing[0]} ({len(missing)} of {len(chunk)} missing).")
+        for t in chunk:
+            answers[t] = got[t]
+            ROUTE_CACHE.put(t + (use_online, version), got[t])
+
+    rows = []
+    for c, s, g in triples:
+        res = answers.get((c, s, g))
+        if res:
+            rows.append(RouteRow(c, s, g, res[0], res[1], res[2]))
+        else:
+            rows.append(RouteRow(c, s, g, None, None, None))
+    return rows
+
+def od_triples(origins, destinations, criteria):
+    """
+    Every (criteria, origin, destination) combination for find_routes_batch.
+    """
+    return [(c, o, d) for c in criteria for o in origins for d in destinations if o != d]
+
+# ---------------------------
+# Live KB updates
+JOURNAL = RoadJournal(PROLOG_FILE, ROAD_JOURNAL_FILE, JOURNAL_COMPACT_EVERY)
+
+def current_kb_version():
+    """
+    kb_version of PROLOG_FILE with the uncompacted journal folded in; keys
+    the route cache, graph snapshot and route index.
+    """
+    return JOURNAL.version()
+
+def update_road(src_atom, dst_atom, distance_val, rtype_atom, time_val, status_atom):
+    """
+    Add or replace the src -> dst road in the running Prolog workers
+    (set_road/6) and journal the change; no restart, no re-consult.
+    """
+    with JOURNAL.lock:
+        goal = JOURNAL.set_road(src_atom, dst_atom, distance_val, rtype_atom, time_val, status_atom)
+        if _POOL is not None:
+            _POOL.update(goal)
+    if JOURNAL.due():
+        compact_journal()
+
+def remove_road(src_atom, dst_atom):
+    with JOURNAL.lock:
+        goal = JOURNAL.remove_road(src_atom, dst_atom)
+        if _POOL is not None:
+            _POOL.update(goal)
+    if JOURNAL.due():
+        compact_journal()
+
+def compact_journal():
+    """
+    Fold the journal into PROLOG_FILE. Workers re-consult the rewritten
+    file on their next query.
+    """
+    with JOURNAL.lock:
+        n = JOURNAL.compact()
+        if n and _POOL is not None:
+            _POOL.reload()
+    return n
+
+def import_roads_file(path):
+    """
+    Stream a CSV / GeoJSON road dataset into PROLOG_FILE. The journal is
+    compacted first so the workers can simply re-consult afterwards.
+    """
+    compact_journal()
+    with JOURNAL.lock:
+        stats = import_roads(path, kb_file=PROLOG_FILE, to_atom=to_atom)
+        if stats["roads"] and _POOL is not None:
+            _POOL.reload()
+    return stats
 
 # locally add news roads
 def append_road_to_file(src_atom, dst_atom, distance_val, rtype_atom, time_val, status_atom):
     fact = f"road({src_atom}, {dst_atom}, {distance_val}, {rtype_atom}, {time_val}, {status_atom}).\n"
     with open(PROLOG_FILE, "a", encoding="utf-8") as f:
         f.write(fact)
+    # pooled workers and cached routes still reflect the old KB
+    reload_prolog_pool()
+    ROUTE_CACHE.clear()
 
 # ---------------------------
 # GUI part
@@ -206,6 +763,7 @@ class PathFinderApp:
         mode_frame.grid(row=0, column=1, padx=4, pady=4, sticky="w")
         ttk.Radiobutton(mode_frame, text="Local", variable=self.mode_var, value="local").pack(side="left")
         ttk.Radiobutton(mode_frame, text="Online (SWISH)", variable=self.mode_var, value="online").pack(side="left")
+        ttk.Radiobutton(mode_frame, text="Native (Python)", variable=self.mode_var, value="native").pack(side="left")
 
         ttk.Label(controls, text="swipl path (optional):").grid(row=0, column=2, padx=5, pady=4, sticky="e")
         self.swipl_entry = ttk.Entry(controls, width=40)
@@ -223,14 +781,40 @@ class PathFinderApp:
 
         ttk.Label(controls, text="Criteria:").grid(row=2, column=0, padx=5, pady=6, sticky="e")
         self.criteria_cb = ttk.Combobox(controls, state="readonly", width=40,
-                                        values=["Shortest Distance", "Fastest Time",
-                                                "Avoid Unpaved Roads", "Avoid Broken Cistern Roads",
-                                                "Avoid Deep Potholes", "Loose Constraints (BFS)"])
+                                        values=list(CRITERIA_ATOMS))
         self.criteria_cb.current(0)
         self.criteria_cb.grid(row=2, column=1, padx=5, pady=6, sticky="w")
 
+        # departure time (HH:MM); empty for the all-day road times
+        ttk.Label(controls, text="Leave at:").grid(row=4, column=0, padx=5, pady=6, sticky="e")
+        self.depart_entry = ttk.Entry(controls, width=8)
+        self.depart_entry.grid(row=4, column=1, padx=5, pady=6, sticky="w")
+
         ttk.Button(controls, text="Find Path", command=self.find_path).grid(row=2, column=2, padx=8, pady=6)
         ttk.Button(controls, text="Refresh Map", command=self.refresh_map).grid(row=2, column=3, padx=8, pady=6)
+        ttk.Button(controls, text="Cancel", command=self.cancel_queries).grid(row=2, column=4, padx=8, pady=6)
+        ttk.Button(controls, text="Pareto Routes", command=self.find_pareto).grid(row=3, column=4, padx=8, pady=6)
+
+        ttk.Label(controls, text="Alternatives:").grid(row=4, column=2, padx=5, pady=6, sticky="e")
+        self.k_var = tk.IntVar(value=ALTERNATIVE_ROUTES)
+        ttk.Spinbox(controls, from_=2, to=len(ALTERNATIVE_COLORS) + 1, width=5,
+                    textvariable=self.k_var).grid(row=4, column=3, padx=5, pady=6, sticky="w")
+        ttk.Button(controls, text="Alternative Routes", command=self.find_alternatives).grid(row=4, column=4, padx=8, pady=6)
+
+        ttk.Label(controls, text="Reach within:").grid(row=5, column=0, padx=5, pady=6, sticky="e")
+        reach_frame = ttk.Frame(controls)
+        reach_frame.grid(row=5, column=1, padx=5, pady=6, sticky="w")
+        self.reach_limit_entry = ttk.Entry(reach_frame, width=8)
+        self.reach_limit_entry.insert(0, "20")
+        self.reach_limit_entry.pack(side="left")
+        self.reach_unit_cb = ttk.Combobox(reach_frame, state="readonly", width=8, values=["minutes", "km"])
+        self.reach_unit_cb.current(0)
+        self.reach_unit_cb.pack(side="left", padx=4)
+        ttk.Button(controls, text="Isochrone", command=self.find_reach).grid(row=5, column=2, padx=8, pady=6)
+
+        # background query status
+        self.status_var = tk.StringVar(value="Ready")
+        ttk.Label(controls, textvariable=self.status_var).grid(row=3, column=1, columnspan=3, padx=5, sticky="w")
 
         # map
         bottom = ttk.Frame(root)
@@ -250,7 +834,7 @@ class PathFinderApp:
         self.canvas.get_tk_widget().pack(fill="both", expand=True)
 
         # admin controls
-        admin = ttk.LabelFrame(root, text="Administrator (Add / Update Road) - appends to local roads.pl")
+        admin = ttk.LabelFrame(root, text="Administrator (Add / Update Road) - applied live, journalled to the local KB")
         admin.pack(fill="x", padx=12, pady=6)
 
         arow = 0
@@ -274,17 +858,29 @@ class PathFinderApp:
         self.admin_type = ttk.Combobox(admin, values=["paved","unpaved","broken_cisterns","deep_potholes"], width=18)
         self.admin_type.grid(row=arow, column=1, padx=4, pady=3)
         ttk.Label(admin, text="Status:").grid(row=arow, column=2, sticky="e", padx=4, pady=3)
-        self.admin_status = ttk.Combobox(admin, values=["open","closed"], width=18)
+        self.admin_status = ttk.Combobox(admin, values=["open","closed","scheduled"], width=18)
         self.admin_status.grid(row=arow, column=3, padx=4, pady=3)
 
         arow += 1
         ttk.Button(admin, text="Add / Persist Road", command=self.admin_add_road).grid(row=arow, column=1, pady=6)
         ttk.Button(admin, text="Rebuild Nodes List", command=self.refresh_nodes_list).grid(row=arow, column=3, pady=6)
+        ttk.Button(admin, text="Precompute All Routes", command=self.precompute_routes).grid(row=arow, column=2, pady=6)
+        ttk.Button(admin, text="Import Roads...", command=self.admin_import_roads).grid(row=arow, column=0, pady=6)
+
+        # Prolog/SWISH calls run here so the Tk loop never blocks
+        self.executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS)
+        self._futures = {}
+        self._tokens = {}
+
+        # map drawing state: layout per topology, base drawing per graph, route overlay
+        self.layout = LayoutCache(LAYOUT_CACHE_FILE)
+        self._base_graph = None
+        self._overlay = []
 
         self.G = nx.DiGraph()
+        self.csr = CSRGraph.from_networkx(self.G)
         try:
             self.refresh_map()
-            self.refresh_nodes_list()
         except Exception as e:
             messagebox.showerror("Startup error", str(e))
 
@@ -292,29 +888,136 @@ class PathFinderApp:
     def get_use_online_flag(self):
         return self.mode_var.get() == "online"
 
+    # -----------------------
+    # background queries
+    def run_async(self, kind, work, on_done, on_error):
+        """
+        Run work() on the executor and hand its result to on_done (or the
+        exception to on_error) on the Tk thread. A newer request of the same
+        kind replaces the older one: its result is dropped and its local
+        Prolog query, if one is running, is stopped.
+        """
+        token = self._tokens.get(kind, 0) + 1
+        self._tokens[kind] = token
+        old = self._futures.pop(kind, None)
+        if old is not None:
+            old.cancel()
+            cancel_prolog((kind, token - 1))
+        # one trace per request: spans from the worker thread and from the
+        # redraw in on_done
+        trace = Trace(kind)
+
+        def traced():
+            with TRACER.activate(trace), query_owner((kind, token)):
+                return work()
+
+        fut = self.executor.submit(traced)
+        self._futures[kind] = fut
+        self.update_status()
+        self.root.after(QUERY_POLL_MS, self._poll_query, kind, token, fut, on_done, on_error, trace)
+
+    def _poll_query(self, kind, token, fut, on_done, on_error, trace):
+        if self._tokens.get(kind) != token:
+            return  # cancelled or replaced by a newer request
+        if not fut.done():
+            self.root.after(QUERY_POLL_MS, self._poll_query, kind, token, fut, on_done, on_error, trace)
+            return
+        self._futures.pop(kind, None)
+        self.update_status()
+        with TRACER.activate(trace):
+            try:
+                res = fut.result()
+            except Exception as e:
+                traceback.print_exception(type(e), e, e.__traceback__)
+                on_error(e)
+            else:
+                on_done(res)
+        self.finish_trace(trace)
+
+    def finish_trace(self, trace):
+        """
+        Close the request's trace: export the metrics and, for actions that
+        report in the results pane, list the timings under their output.
+        """
+        trace.finish()
+        METRICS.inc("actions_total", 1, "Finished GUI actions.", kind=trace.name)
+        if METRICS_FILE:
+            try:
+                METRICS.write(METRICS_FILE)
+            except OSError as e:
+                print("Could not write metrics:", e)
+        if trace.name in ("route", "pareto", "alternatives", "reach"):
+            self.result_text.insert(tk.END, "\nTimings\n")
+            for line in trace.lines():
+                self.result_text.insert(tk.END, line + "\n")
+
+    def cancel_queries(self):
+        """
+        Drop every in-flight query. A local Prolog query is stopped (its
+        worker restarts); other work already running in a thread finishes in
+        the background, but its result is ignored.
+        """
+        for kind, fut in list(self._futures.items()):
+            cancel_prolog((kind, self._tokens.get(kind, 0)))
+            self._tokens[kind] = self._tokens.get(kind, 0) + 1
+            fut.cancel()
+        self._futures.clear()
+        self.status_var.set("Cancelled.")
+
+    def update_status(self):
+        if self._futures:
+            self.status_var.set("Working: " + ", ".join(sorted(self._futures)) + " ...")
+        else:
+            self.status_var.set("Ready")
+
+    # -----------------------
     def refresh_map(self):
         global SWIPL_CMD
         SWIPL_CMD = self.swipl_entry.get().strip() or SWIPL_CMD
+        use_online = self.get_use_online_flag()
 
-        try:
-            self.G = load_graph_from_prolog(use_online=self.get_use_online_flag())
+        def load():
+            G = load_graph(use_online=use_online)
+            return G, CSRGraph.from_networkx(G)
+
+        def done(res):
+            self.G, self.csr = res
             self.draw_graph(self.G)
-        except Exception as e:
-            traceback.print_exc()
+            self.refresh_nodes_list()
+
+        def failed(e):
             messagebox.showerror("Error loading graph", str(e))
 
+        self.run_async("map", load, done, failed)
+
     def refresh_nodes_list(self):
         nodes = sorted(self.G.nodes())
         self.start_cb['values'] = nodes
         self.goal_cb['values'] = nodes
 
-    def draw_graph(self, G, highlight_path=None):
+    def draw_graph(self, G, highlight_path=None, alternatives=None, isochrone=None):
+        """
+        Draw the network once per graph; later calls with the same graph only
+        swap the route overlay (highlight_path in green on top of any
+        alternative paths, each in its own colour) and the isochrone, given
+        as (reached ReachNodes, "distance" or "time", limit or None).
+        """
+        with TRACER.span("redraw"):
+            if G is not self._base_graph:
+                self._draw_base(G)
+            self._draw_overlay(G, highlight_path, alternatives or [])
+            if isochrone:
+                self._draw_isochrone(G, *isochrone)
+            self.canvas.draw()
+
+    def _draw_base(self, G):
         self.ax.clear()
+        self._overlay = []
+        self._base_graph = G
         if len(G) == 0:
             self.ax.text(0.5,0.5,"No graph data found.\nUse Admin to add roads (local) or switch mode to Local/Online.",ha="center",va="center")
-            self.canvas.draw()
             return
-        pos = nx.spring_layout(G, seed=42)
+        pos = self.layout.positions(G)
         nx.draw_networkx_nodes(G, pos, ax=self.ax, node_size=360)
         nx.draw_networkx_labels(G, pos, ax=self.ax, font_size=9)
         # edges coloring
@@ -322,25 +1025,58 @@ class PathFinderApp:
         for u,v,data in G.edges(data=True):
             if data.get('status') == 'closed':
                 edge_colors.append('red')
+            elif data.get('status') == 'scheduled':
+                edge_colors.append('purple')
             elif data.get('rtype') == 'unpaved':
                 edge_colors.append('orange')
             else:
                 edge_colors.append('black')
         nx.draw_networkx_edges(G, pos, ax=self.ax, edge_color=edge_colors, arrows=True)
         edge_labels = { (u,v): f"{int(data.get('distance',0))}km" for u,v,data in G.edges(data=True) }
-        nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=8)
+        nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=8, ax=self.ax)
+        self.ax.set_axis_off()
+
+    def _draw_overlay(self, G, highlight_path, alternatives):
+        for artist in self._overlay:
+            artist.remove()
+        self._overlay = []
+        if len(G) == 0:
+            return
 
-        # highlight the path
-        if highlight_path and len(highlight_path) >= 2:
+        # worst alternative first so better routes end up on top
+        layers = [(path, ALTERNATIVE_COLORS[i % len(ALTERNATIVE_COLORS)], 2.0)
+                  for i, path in enumerate(alternatives)]
+        layers.reverse()
+        layers.append((highlight_path, 'green', 3.0))
+        for path, color, width in layers:
+            if not path or len(path) < 2:
+                continue
             path_edges = []
-            for a,b in zip(highlight_path, highlight_path[1:]):
+            for a,b in zip(path, path[1:]):
                 if (a,b) in G.edges():
                     path_edges.append((a,b))
             if path_edges:
-                nx.draw_networkx_edges(G, pos, edgelist=path_edges, width=3.0, edge_color='green', ax=self.ax)
+                drawn = nx.draw_networkx_edges(G, self.layout.pos, edgelist=path_edges, width=width, edge_color=color, ax=self.ax)
+                self._overlay += drawn if isinstance(drawn, list) else [drawn]
 
-        self.ax.set_axis_off()
-        self.canvas.draw()
+    def _draw_isochrone(self, G, reached, mode, limit):
+        """
+        Reached places coloured by cost (yellow near the start, purple at the
+        limit) joined by their shortest-path tree edges.
+        """
+        nodes = [r for r in reached if r.node in G]
+        if len(G) == 0 or not nodes:
+            return
+        cost = [r.time if mode == "time" else r.distance for r in nodes]
+        tree_edges = [(r.prev, r.node) for r in nodes if r.prev is not None and G.has_edge(r.prev, r.node)]
+        if tree_edges:
+            drawn = nx.draw_networkx_edges(G, self.layout.pos, edgelist=tree_edges, width=2.5,
+                                           edge_color='dodgerblue', ax=self.ax)
+            self._overlay += drawn if isinstance(drawn, list) else [drawn]
+        drawn = nx.draw_networkx_nodes(G, self.layout.pos, nodelist=[r.node for r in nodes], node_size=420,
+                                       node_color=cost, cmap=plt.cm.viridis_r, vmin=0,
+                                       vmax=limit if limit else max(cost) or 1, ax=self.ax)
+        self._overlay.append(drawn)
 
     # -----------------------
     def find_path(self):
@@ -352,40 +1088,212 @@ class PathFinderApp:
             messagebox.showwarning("Input missing", "Select start and goal nodes.")
             return
 
-        mapping = {
-            "Shortest Distance": "shortest_distance",
-            "Fastest Time": "fastest_time",
-            "Avoid Unpaved Roads": "avoid_unpaved",
-            "Avoid Broken Cistern Roads": "avoid_broken",
-            "Avoid Deep Potholes": "avoid_deep_potholes",
-            "Loose Constraints (BFS)": "loose_constraints"
-        }
-        crit_atom = mapping.get(criteria_raw, "shortest_distance")
+        crit_atom = CRITERIA_ATOMS.get(criteria_raw, "shortest_distance")
+        start_atom = to_atom(start_raw)
+        goal_atom = to_atom(goal_raw)
+        use_online = self.get_use_online_flag()
+        native = self.mode_var.get() == "native"
+        csr = self.csr
+        G = self.G
+        depart_raw = self.depart_entry.get().strip()
+        try:
+            depart = parse_clock(depart_raw) if depart_raw else None
+        except ValueError:
+            messagebox.showerror("Error", "Leave at must be a clock time such as 07:30 (or empty).")
+            return
+
+        def work():
+            if depart is not None:
+                # the index and hierarchies hold all-day times only
+                if native:
+                    with TRACER.span("search", backend="native"):
+                        res = route_at(G, current_schedule(), crit_atom, start_atom, goal_atom, depart)
+                else:
+                    res = find_route_at_prolog(crit_atom, start_atom, goal_atom, depart, use_online=use_online)
+                return res and res + (depart,)
+            if not use_online:
+                # precomputed answer: a walk along the predecessor matrix
+                index = current_route_index()
+                if index is not None:
+                    with TRACER.span("search", backend="index"):
+                        return index.route(crit_atom, start_atom, goal_atom)
+            if native and USE_CONTRACTION_HIERARCHY:
+                with TRACER.span("search", backend="ch"):
+                    return HIERARCHIES.route(csr, crit_atom, start_atom, goal_atom, current_kb_version()[1])
+            if native:
+                # searches the CSR arrays built alongside the map graph
+                with TRACER.span("search", backend="csr"):
+                    return find_route_csr(csr, crit_atom, start_atom, goal_atom)
+            return find_route_prolog(crit_atom, start_atom, goal_atom, use_online=use_online)
+
+        def failed(e):
+            self.result_text.delete("1.0", tk.END)
+            backend = "the native engine" if native else "Prolog"
+            self.result_text.insert(tk.END, f"Error when calling {backend}: {e}\n")
+
+        self.result_text.delete("1.0", tk.END)
+        self.result_text.insert(tk.END, f"Searching {start_atom} -> {goal_atom} ...\n")
+        self.run_async("route", work, self.show_route, failed)
+
+    def find_pareto(self):
+        start_raw = self.start_cb.get().strip()
+        goal_raw = self.goal_cb.get().strip()
+        if not start_raw or not goal_raw:
+            messagebox.showwarning("Missing", "Please choose start and goal.")
+            return
         start_atom = to_atom(start_raw)
         goal_atom = to_atom(goal_raw)
         use_online = self.get_use_online_flag()
+        native = self.mode_var.get() == "native"
+        G = self.G
+
+        def work():
+            if native:
+                return find_pareto_native(G, start_atom, goal_atom)
+            return find_pareto_prolog(start_atom, goal_atom, use_online=use_online)
+
+        def failed(e):
+            self.result_text.delete("1.0", tk.END)
+            backend = "the native engine" if native else "Prolog"
+            self.result_text.insert(tk.END, f"Error when calling {backend}: {e}\n")
 
         self.result_text.delete("1.0", tk.END)
+        self.result_text.insert(tk.END, f"Searching trade-offs {start_atom} -> {goal_atom} ...\n")
+        self.run_async("pareto", work, self.show_pareto, failed)
+
+    def find_alternatives(self):
+        start_raw = self.start_cb.get().strip()
+        goal_raw = self.goal_cb.get().strip()
+        if not start_raw or not goal_raw:
+            messagebox.showwarning("Missing", "Please choose start and goal.")
+            return
         try:
-            res = find_route_prolog(crit_atom, start_atom, goal_atom, use_online=use_online)
-        except Exception as e:
-            traceback.print_exc()
-            self.result_text.insert(tk.END, f"Error when calling Prolog: {e}\n")
+            k = max(1, int(self.k_var.get()))
+        except (tk.TclError, ValueError):
+            k = ALTERNATIVE_ROUTES
+        crit_atom = CRITERIA_ATOMS.get(self.criteria_cb.get().strip(), "shortest_distance")
+        start_atom = to_atom(start_raw)
+        goal_atom = to_atom(goal_raw)
+        csr = self.csr
+
+        def failed(e):
+            self.result_text.delete("1.0", tk.END)
+            self.result_text.insert(tk.END, f"Error finding alternatives: {e}\n")
+
+        self.result_text.delete("1.0", tk.END)
+        self.result_text.insert(tk.END, f"Searching {k} routes {start_atom} -> {goal_atom} ...\n")
+        # Yen's algorithm over the CSR arrays of the loaded map, whatever the mode
+        self.run_async("alternatives", lambda: k_shortest_routes(csr, crit_atom, start_atom, goal_atom, k),
+                       self.show_alternatives, failed)
+
+    def show_alternatives(self, routes):
+        self.result_text.delete("1.0", tk.END)
+        if not routes:
+            self.result_text.insert(tk.END, "⚠️ No path found between these places.\n")
+            self.draw_graph(self.G, highlight_path=None)
+            return
+        self.result_text.insert(tk.END, f"{len(routes)} loopless routes, best first:\n")
+        self.result_text.insert(tk.END, f"{'#':>2} {'colour':<10} {'km':>8} {'min':>8}  route\n")
+        for i, (path, dist, ttime) in enumerate(routes):
+            color = "green" if i == 0 else ALTERNATIVE_COLORS[(i - 1) % len(ALTERNATIVE_COLORS)]
+            self.result_text.insert(tk.END, f"{i + 1:>2} {color:<10} {dist:>8.2f} {ttime:>8.2f}  {' -> '.join(path)}\n")
+        self.draw_graph(self.G, highlight_path=routes[0][0], alternatives=[r[0] for r in routes[1:]])
+
+    def show_pareto(self, routes):
+        self.result_text.delete("1.0", tk.END)
+        if not routes:
+            self.result_text.insert(tk.END, "⚠️ No path found or Prolog returned no output.\n")
+            self.draw_graph(self.G, highlight_path=None)
             return
+        self.result_text.insert(tk.END, f"{len(routes)} Pareto-optimal routes (none is beaten on all three):\n")
+        self.result_text.insert(tk.END, f"{'#':>2} {'km':>8} {'min':>8} {'rough km':>9}  route\n")
+        for i, r in enumerate(routes, 1):
+            self.result_text.insert(tk.END, f"{i:>2} {r.distance:>8.2f} {r.time:>8.2f} {r.rough:>9.2f}  {' -> '.join(r.path)}\n")
+        # shortest of the front on the map
+        self.draw_graph(self.G, highlight_path=routes[0].path)
 
+    def find_reach(self):
+        start_raw = self.start_cb.get().strip()
+        if not start_raw:
+            messagebox.showwarning("Missing", "Please choose a start.")
+            return
+        limit_raw = self.reach_limit_entry.get().strip()
+        try:
+            limit = float(limit_raw) if limit_raw else None
+        except ValueError:
+            messagebox.showerror("Error", "Reach limit must be a number (or empty for no limit).")
+            return
+        mode = "time" if self.reach_unit_cb.get() == "minutes" else "distance"
+        crit_atom = CRITERIA_ATOMS.get(self.criteria_cb.get().strip(), "shortest_distance")
+        start_atom = to_atom(start_raw)
+        use_online = self.get_use_online_flag()
+        native = self.mode_var.get() == "native"
+        csr = self.csr
+
+        def work():
+            if native:
+                reached = find_reach_native(csr, mode, crit_atom, start_atom, limit)
+            else:
+                reached = find_reach_prolog(mode, crit_atom, start_atom, limit, use_online=use_online)
+            return start_atom, mode, limit, reached
+
+        def failed(e):
+            self.result_text.delete("1.0", tk.END)
+            backend = "the native engine" if native else "Prolog"
+            self.result_text.insert(tk.END, f"Error when calling {backend}: {e}\n")
+
+        self.result_text.delete("1.0", tk.END)
+        self.result_text.insert(tk.END, f"Searching everything reachable from {start_atom} ...\n")
+        self.run_async("reach", work, self.show_reach, failed)
+
+    def show_reach(self, res):
+        start_atom, mode, limit, reached = res
+        self.result_text.delete("1.0", tk.END)
+        unit = "min" if mode == "time" else "km"
+        if not reached:
+            self.result_text.insert(tk.END, f"⚠️ {start_atom} is not on the map.\n")
+            self.draw_graph(self.G, highlight_path=None)
+            return
+        within = f"within {limit:g} {unit}" if limit is not None else "in total"
+        self.result_text.insert(tk.END, f"{len(reached) - 1} places reachable from {start_atom} {within}:\n")
+        self.result_text.insert(tk.END, f"{'place':<20} {'km':>8} {'min':>8}  via\n")
+        for r in reached[1:]:
+            self.result_text.insert(tk.END, f"{r.node:<20} {r.distance:>8.2f} {r.time:>8.2f}  {r.prev}\n")
+        self.draw_graph(self.G, highlight_path=None, isochrone=(reached, mode, limit))
+
+    def show_route(self, res):
+        self.result_text.delete("1.0", tk.END)
         if not res:
             self.result_text.insert(tk.END, "⚠️ No path found or Prolog returned no output.\n")
             self.draw_graph(self.G, highlight_path=None)
             return
 
-        path, dist, ttime = res
+        path, dist, ttime = res[:3]
         self.result_text.insert(tk.END, f"Route: {' -> '.join(path)}\n")
         self.result_text.insert(tk.END, f"Total distance: {dist:.2f} km\n")
         self.result_text.insert(tk.END, f"Estimated time: {ttime:.2f} minutes\n")
+        if len(res) > 3:
+            depart = res[3]
+            self.result_text.insert(tk.END, f"Leaving {format_clock(depart)}, arriving {format_clock(depart + ttime)}\n")
+        stats = ROUTE_CACHE.stats()
+        self.result_text.insert(tk.END, f"Route cache: {stats['hits']} hits / {stats['misses']} misses\n")
 
         # highlight it on the map
         self.draw_graph(self.G, highlight_path=path)
 
+    # -----------------------
+    def precompute_routes(self):
+        G = self.G
+        kb_hash = current_kb_version()[1]
+
+        def done(index):
+            messagebox.showinfo("Route index", f"Precomputed all routes for {len(index.nodes)} nodes.")
+
+        def failed(e):
+            messagebox.showerror("Route index failed", str(e))
+
+        self.run_async("precompute", lambda: build_index(G, ROUTE_INDEX_DIR, kb_hash), done, failed)
+
     # -----------------------
     def admin_add_road(self):
         src = self.admin_src.get().strip()
@@ -413,15 +1321,46 @@ class PathFinderApp:
         rtype_atom = to_atom(rtype) if rtype else "paved"
         status_atom = to_atom(status) if status else "open"
 
-        # Append to roads.pl
+        # assert/retract in the live workers, journal the change
         try:
-            append_road_to_file(src_atom, dst_atom, dval, rtype_atom, tval, status_atom)
-            messagebox.showinfo("Saved", f"Road appended to {PROLOG_FILE}.\nClick Refresh Map to load it.")
+            update_road(src_atom, dst_atom, dval, rtype_atom, tval, status_atom)
         except Exception as e:
-            messagebox.showerror("Failed to append fact", str(e))
-        # reload the graph in the UI
-        self.refresh_map()
-        self.refresh_nodes_list()
+            messagebox.showerror("Failed to update road", str(e))
+            return
+        self.patch_road(src_atom, dst_atom, dval, rtype_atom, tval, status_atom)
+        self.status_var.set(f"Road {src_atom} -> {dst_atom} saved ({len(JOURNAL)} journalled changes).")
+
+    def admin_import_roads(self):
+        path = filedialog.askopenfilename(
+            title="Import roads",
+            filetypes=[("Road datasets", "*.csv *.geojson *.json"), ("All files", "*.*")])
+        if not path:
+            return
+
+        def done(stats):
+            messagebox.showinfo("Import finished", format_stats(stats))
+            if stats["roads"]:
+                self.refresh_map()
+
+        def failed(e):
+            messagebox.showerror("Import failed", str(e))
+
+        self.run_async("import", lambda: import_roads_file(path), done, failed)
+
+    def patch_road(self, src, dst, distance, rtype, time_val, status):
+        """
+        Apply one road change to the loaded graph and CSR arrays in place
+        and redraw, instead of reloading the whole map.
+        """
+        new_node = src not in self.G or dst not in self.G
+        self.G.add_edge(src, dst, distance=float(distance), rtype=rtype, time=float(time_val), status=status)
+        if not self.csr.set_edge(src, dst, float(distance), rtype, float(time_val), status):
+            self.csr = CSRGraph.from_networkx(self.G)
+        if new_node:
+            self.refresh_nodes_list()
+        # same graph object, so force the base layer (road colours) to redraw
+        self._base_graph = None
+        self.draw_graph(self.G)
 
 # ---------------------------
 # MAIN fonction
@@ -435,6 +1374,15 @@ if __name__ == "__main__":
 
     if missing:
         messagebox.showerror("Missing libraries", "Install required packages: pip install networkx matplotlib requests")
+    # fold journalled changes from the last session into the KB first
+    compact_journal()
+    if METRICS_PORT:
+        METRICS.serve(METRICS_PORT)
     root = tk.Tk()
     app = PathFinderApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    app.executor.shutdown(wait=False, cancel_futures=True)
+    compact_journal()
+    close_pengine_client()
+    if _POOL is not None:
+        _POOL.close()
\ No newline at end of file
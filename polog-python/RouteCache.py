@@ -0,0 +1,74 @@
+"""
+Size-bounded LRU cache for route answers.
+
+Keys are (criteria, start, goal, kb_version). kb_version stamps the KB file
+with its mtime and a content hash, so an edited KB never serves stale routes.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+_hash_memo = {}
+
+def kb_version(path):
+    """
+    (mtime_ns, sha1 of the file). The hash is only recomputed when the
+    file's mtime or size changes.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (0, "")
+    stamp = (st.st_mtime_ns, st.st_size)
+    memo = _hash_memo.get(path)
+    if memo is None or memo[0] != stamp:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+        memo = (stamp, h.hexdigest())
+        _hash_memo[path] = memo
+    return (st.st_mtime_ns, memo[1])
+
+
+class RouteCache:
+    """
+    Thread-safe LRU mapping. None (no route) is cached like any other answer.
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns (found, value).
+        """
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self._data), "maxsize": self.maxsize}
@@ -0,0 +1,146 @@
+"""
+All-pairs route index.
+
+For every criterion in criteria_list/2 the index stores N x N distance, time
+and predecessor matrices as .npy files, memory-mapped on load, in a folder
+named after the KB hash. Answering a route is then a walk back along the
+predecessor row: O(path length), no search.
+
+    python RouteIndex.py        # (re)build the index for the configured KB
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+from RoutingEngine import CRITERIA_LIST, MODE_FOR, search_tree
+
+META_FILE = "meta.json"
+
+
+def profile_of(criteria_atom):
+    """
+    Criteria with the same edge filter and search mode share one set of
+    matrices (e.g. astar_distance and shortest_distance).
+    """
+    mode, algo = MODE_FOR[criteria_atom]
+    crit = CRITERIA_LIST[criteria_atom]
+    kind = "hops" if algo == "bfs" else mode
+    return "-".join([kind] + sorted(crit)) if crit else kind
+
+
+class RouteIndex:
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.kb_hash = meta["kb_hash"]
+        self.nodes = meta["nodes"]
+        self.criteria = meta["criteria"]
+        self.node_id = {n: i for i, n in enumerate(self.nodes)}
+        self._arrays = {}
+
+    @classmethod
+    def open(cls, index_dir, kb_hash):
+        """
+        The index built for kb_hash, or None if there is none yet.
+        """
+        directory = os.path.join(index_dir, kb_hash)
+        meta_path = os.path.join(directory, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("kb_hash") != kb_hash:
+            return None
+        return cls(directory, meta)
+
+    def _matrix(self, profile, name):
+        key = (profile, name)
+        if key not in self._arrays:
+            path = os.path.join(self.directory, f"{profile}.{name}.npy")
+            self._arrays[key] = np.load(path, mmap_mode="r")
+        return self._arrays[key]
+
+    def route(self, criteria_atom, start_atom, goal_atom):
+        """
+        Same contract as find_route_prolog: (path, dist, time) or None.
+        """
+        profile = self.criteria.get(criteria_atom)
+        i = self.node_id.get(start_atom)
+        j = self.node_id.get(goal_atom)
+        if profile is None or i is None or j is None:
+            return None
+        pred = self._matrix(profile, "pred")[i]
+        if i != j and pred[j] < 0:
+            return None
+        path = [j]
+        while path[-1] != i:
+            path.append(int(pred[path[-1]]))
+        path.reverse()
+        dist = float(self._matrix(profile, "dist")[i, j])
+        ttime = float(self._matrix(profile, "time")[i, j])
+        return [self.nodes[k] for k in path], dist, ttime
+
+
+def build_index(G, index_dir, kb_hash):
+    """
+    Precompute every criterion's all-pairs matrices for graph G. Rows are
+    written straight into memory-mapped .npy files, so only one source's
+    tree is held in memory at a time. Older KB hashes are removed.
+    """
+    nodes = sorted(G.nodes())
+    node_id = {n: i for i, n in enumerate(nodes)}
+    n = len(nodes)
+    directory = os.path.join(index_dir, kb_hash)
+    os.makedirs(directory, exist_ok=True)
+
+    criteria = {c: profile_of(c) for c in CRITERIA_LIST}
+    done = {}
+    for crit, profile in criteria.items():
+        if profile in done:
+            continue
+        done[profile] = crit
+        dist = np.lib.format.open_memmap(os.path.join(directory, f"{profile}.dist.npy"),
+                                         mode="w+", dtype=np.float32, shape=(n, n))
+        ttime = np.lib.format.open_memmap(os.path.join(directory, f"{profile}.time.npy"),
+                                          mode="w+", dtype=np.float32, shape=(n, n))
+        pred = np.lib.format.open_memmap(os.path.join(directory, f"{profile}.pred.npy"),
+                                         mode="w+", dtype=np.int32, shape=(n, n))
+        dist[:] = np.inf
+        ttime[:] = np.inf
+        pred[:] = -1
+        for i, src in enumerate(nodes):
+            p, totals = search_tree(G, crit, src)
+            for node, parent in p.items():
+                j = node_id[node]
+                dist[i, j], ttime[i, j] = totals[node]
+                if parent is not None:
+                    pred[i, j] = node_id[parent]
+        for arr in (dist, ttime, pred):
+            arr.flush()
+        del dist, ttime, pred
+
+    # meta last, so a half-written index is never opened
+    with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"kb_hash": kb_hash, "nodes": nodes, "criteria": criteria}, f)
+
+    for name in os.listdir(index_dir):
+        old = os.path.join(index_dir, name)
+        if name != kb_hash and os.path.isdir(old):
+            shutil.rmtree(old, ignore_errors=True)
+    return RouteIndex.open(index_dir, kb_hash)
+
+
+if __name__ == "__main__":
+    import RoadNetworkPathfinder as app
+    try:
+        kb_hash = app.current_kb_version()[1]
+        if RouteIndex.open(app.ROUTE_INDEX_DIR, kb_hash):
+            print("Route index is up to date for KB", kb_hash)
+        else:
+            G = app.load_graph()
+            build_index(G, app.ROUTE_INDEX_DIR, kb_hash)
+            print(f"Built route index for {G.number_of_nodes()} nodes in {app.ROUTE_INDEX_DIR}")
+    finally:
+        if app._POOL is not None:
+            app._POOL.close()
@@ -0,0 +1,378 @@
+"""
+Native Python routing engine.
+
+Mirrors run_query/3 from RoadNetworkKB.pl on the nx.DiGraph built by
+load_graph_from_prolog, so routes can be answered without a Prolog round-trip.
+Results use the same (path, dist, time) tuple as find_route_prolog.
+check_parity backs the parity tests in tests/test_parity.py.
+"""
+import bisect
+import heapq
+from collections import deque
+
+# ---------------------------
+# Same tables as criteria_list/2 and mode_for/3 in the KB
+# ---------------------------
+CRITERIA_LIST = {
+    "shortest_distance": [],
+    "fastest_time": [],
+    "avoid_unpaved": ["avoid_unpaved"],
+    "avoid_broken": ["avoid_broken"],
+    "avoid_deep_potholes": ["avoid_deep_potholes"],
+    "loose_constraints": [],
+    "astar_distance": [],
+    "astar_time": [],
+    "bidir_distance": [],
+    "bidir_time": [],
+}
+
+MODE_FOR = {
+    "shortest_distance": ("distance", "dijkstra"),
+    "fastest_time": ("time", "dijkstra"),
+    "avoid_unpaved": ("distance", "dijkstra"),
+    "avoid_broken": ("distance", "dijkstra"),
+    "avoid_deep_potholes": ("distance", "dijkstra"),
+    "loose_constraints": ("distance", "bfs"),
+    "astar_distance": ("distance", "astar"),
+    "astar_time": ("time", "astar"),
+    "bidir_distance": ("distance", "bidijkstra"),
+    "bidir_time": ("time", "bidijkstra"),
+}
+
+# criteria flag -> road type it excludes
+AVOIDS = {
+    "avoid_unpaved": "unpaved",
+    "avoid_broken": "broken_cisterns",
+    "avoid_deep_potholes": "deep_potholes",
+}
+
+# road types counted as rough-road exposure by pareto/3
+ROUGH_TYPES = ("unpaved", "broken_cisterns", "deep_potholes")
+
+# ---------------------------
+# allowed/3 and edge/6
+# ---------------------------
+def allowed(rtype, status, crit):
+    if status != "open":
+        return False
+    for flag in crit:
+        if AVOIDS.get(flag) == rtype:
+            return False
+    return True
+
+def edges_from(G, node, crit):
+    for nxt, data in G.adj[node].items():
+        if allowed(data.get("rtype"), data.get("status"), crit):
+            yield nxt, data
+
+def edges_to(G, node, crit):
+    """
+    The roads into node, for searches that walk edges backwards.
+    """
+    for prev, data in G.pred[node].items():
+        if allowed(data.get("rtype"), data.get("status"), crit):
+            yield prev, data
+
+def path_cost(G, path):
+    dist = 0.0
+    ttime = 0.0
+    for a, b in zip(path, path[1:]):
+        data = G.edges[a, b]
+        dist += data.get("distance", 0.0)
+        ttime += data.get("time", 0.0)
+    return dist, ttime
+
+def _walk_back(pred, goal):
+    path = [goal]
+    while pred[path[-1]] is not None:
+        path.append(pred[path[-1]])
+    path.reverse()
+    return path
+
+# ---------------------------
+# Searches
+# ---------------------------
+def _settle(G, mode, crit, source, pred, totals):
+    """
+    Heap-based Dijkstra from source ordered by distance or time (mode).
+    Yields (node, cost) as nodes are settled and fills pred / totals
+    (node -> (dist, time)) along the way.
+    """
+    key = "time" if mode == "time" else "distance"
+    best = {source: 0.0}
+    pred[source] = None
+    totals[source] = (0.0, 0.0)
+    done = set()
+    # (cost, insertion order, node) - the counter keeps equal costs FIFO
+    heap = [(0.0, 0, source)]
+    order = 1
+    while heap:
+        cost, _, node = heapq.heappop(heap)
+        if node in done:
+            continue
+        done.add(node)
+        yield node, cost
+        d0, t0 = totals[node]
+        for nxt, data in edges_from(G, node, crit):
+            if nxt in done:
+                continue
+            c = cost + data.get(key, 0.0)
+            if nxt in best and best[nxt] <= c:
+                continue
+            best[nxt] = c
+            pred[nxt] = node
+            totals[nxt] = (d0 + data.get("distance", 0.0), t0 + data.get("time", 0.0))
+            heapq.heappush(heap, (c, order, nxt))
+            order += 1
+
+def _bfs_order(G, crit, source, pred):
+    """
+    Breadth-first from source; yields nodes in dequeue order and fills pred.
+    """
+    pred[source] = None
+    q = deque([source])
+    while q:
+        node = q.popleft()
+        yield node
+        for nxt, _ in edges_from(G, node, crit):
+            if nxt not in pred:
+                pred[nxt] = node
+                q.append(nxt)
+
+def dijkstra(G, mode, crit, start, goal):
+    """
+    Like dijkstra/7: cheapest route by distance or time (mode).
+    Returns (path, dist, time) or None.
+    """
+    if start not in G or goal not in G:
+        return None
+    pred, totals = {}, {}
+    for node, _ in _settle(G, mode, crit, start, pred, totals):
+        if node == goal:
+            dist, ttime = totals[node]
+            return _walk_back(pred, goal), dist, ttime
+    return None
+
+def bidirectional_dijkstra(G, mode, crit, start, goal, stats=None):
+    """
+    Like bidijkstra/8: a forward search from start and a backward one from
+    goal over reversed roads, each expanding while its heap top is the
+    cheaper. Relaxing a road into a node the other side has labelled gives
+    a candidate route; the search stops once the two heap tops together
+    cost at least the best candidate. Returns (path, dist, time) or None;
+    stats, if given, gets the expanded states under "expanded".
+    """
+    if stats is not None:
+        stats["expanded"] = 0
+    if start not in G or goal not in G:
+        return None
+    if start == goal:
+        return [start], 0.0, 0.0
+    key = "time" if mode == "time" else "distance"
+    # per side: best cost, parent towards its root, (dist, time), settled, heap
+    best = ({start: 0.0}, {goal: 0.0})
+    pred = ({start: None}, {goal: None})
+    totals = ({start: (0.0, 0.0)}, {goal: (0.0, 0.0)})
+    done = (set(), set())
+    heaps = ([(0.0, 0, start)], [(0.0, 0, goal)])
+    steps = (lambda n: edges_from(G, n, crit), lambda n: edges_to(G, n, crit))
+    order = 1
+    expanded = 0
+    mu = None   # (cost, meeting road (u, v) with u on the forward side)
+    while heaps[0] and heaps[1]:
+        if mu is not None and heaps[0][0][0] + heaps[1][0][0] >= mu[0]:
+            break
+        side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        cost, _, node = heapq.heappop(heaps[side])
+        if node in done[side]:
+            continue
+        done[side].add(node)
+        expanded += 1
+        d0, t0 = totals[side][node]
+        other = 1 - side
+        for nxt, data in steps[side](node):
+            if nxt in done[side]:
+                continue
+            c = cost + data.get(key, 0.0)
+            if nxt in best[other] and (mu is None or c + best[other][nxt] < mu[0]):
+                mu = (c + best[other][nxt], (node, nxt) if side == 0 else (nxt, node))
+            if nxt in best[side] and best[side][nxt] <= c:
+                continue
+            best[side][nxt] = c
+            pred[side][nxt] = node
+            totals[side][nxt] = (d0 + data.get("distance", 0.0), t0 + data.get("time", 0.0))
+            heapq.heappush(heaps[side], (c, order, nxt))
+            order += 1
+    if stats is not None:
+        stats["expanded"] = expanded
+    if mu is None:
+        return None
+    u, v = mu[1]
+    path = _walk_back(pred[0], u)
+    tail = [v]
+    while pred[1][tail[-1]] is not None:
+        tail.append(pred[1][tail[-1]])
+    path += tail
+    data = G.edges[u, v]
+    df, tf = totals[0][u]
+    db, tb = totals[1][v]
+    return path, df + data.get("distance", 0.0) + db, tf + data.get("time", 0.0) + tb
+
+def bfs(G, crit, start, goal):
+    """
+    Fewest-hops search like bfs/6 (used for loose_constraints).
+    Returns (path, dist, time) or None.
+    """
+    if start not in G or goal not in G:
+        return None
+    pred = {}
+    for node in _bfs_order(G, crit, start, pred):
+        if node == goal:
+            path = _walk_back(pred, goal)
+            dist, ttime = path_cost(G, path)
+            return path, dist, ttime
+    return None
+
+def search_tree(G, criteria_atom, source):
+    """
+    Whole single-source tree for a criterion, as (pred, totals): pred maps
+    every reachable node to its parent (source -> None) and totals maps it
+    to (dist, time) along the tree path.
+    """
+    crit = CRITERIA_LIST[criteria_atom]
+    mode, algo = MODE_FOR[criteria_atom]
+    pred, totals = {}, {}
+    if source not in G:
+        return pred, totals
+    if algo == "bfs":
+        order = list(_bfs_order(G, crit, source, pred))
+        totals[source] = (0.0, 0.0)
+        for node in order[1:]:
+            d0, t0 = totals[pred[node]]
+            data = G.edges[pred[node], node]
+            totals[node] = (d0 + data.get("distance", 0.0), t0 + data.get("time", 0.0))
+    else:
+        for _ in _settle(G, mode, crit, source, pred, totals):
+            pass
+    return pred, totals
+
+class _Front:
+    """
+    (time, rough) staircase of the labels settled at one node. Labels are
+    settled in distance order, so a new label is dominated exactly when some
+    settled label is no worse on time and rough km: one bisect.
+    """
+    __slots__ = ("ts", "xs")
+
+    def __init__(self):
+        self.ts = []   # increasing time
+        self.xs = []   # strictly decreasing rough km
+
+    def dominates(self, t, x):
+        i = bisect.bisect_right(self.ts, t)
+        return i > 0 and self.xs[i - 1] <= x
+
+    def add(self, t, x):
+        i = bisect.bisect_left(self.ts, t)
+        j = i
+        while j < len(self.ts) and self.xs[j] >= x:
+            j += 1
+        self.ts[i:j] = [t]
+        self.xs[i:j] = [x]
+
+def pareto_routes(G, start, goal):
+    """
+    Like pareto/3: every route no other route beats on distance, time and
+    rough-road km at once, as (path, dist, time, rough) by distance.
+    Labels are popped in (dist, time, rough) order, so a popped label that
+    is not dominated stays on the front; dominated children are pruned.
+    """
+    if start not in G or goal not in G:
+        return []
+    # label id -> (node, parent label id); objectives live in the heap
+    labels = [(start, None)]
+    fronts = {}
+    goal_front = fronts[goal] = _Front()
+    found = []
+    heap = [(0.0, 0.0, 0.0, 0)]
+    while heap:
+        d, t, x, lid = heapq.heappop(heap)
+        node = labels[lid][0]
+        front = fronts.get(node)
+        if front is None:
+            front = fronts[node] = _Front()
+        elif front.dominates(t, x):
+            continue
+        front.add(t, x)
+        if node == goal:
+            found.append((lid, d, t, x))
+            continue
+        for nxt, data in edges_from(G, node, []):
+            step = data.get("distance", 0.0)
+            ct = t + data.get("time", 0.0)
+            cx = x + (step if data.get("rtype") in ROUGH_TYPES else 0.0)
+            nf = fronts.get(nxt)
+            if (nf is not None and nf.dominates(ct, cx)) or goal_front.dominates(ct, cx):
+                continue
+            labels.append((nxt, lid))
+            heapq.heappush(heap, (d + step, ct, cx, len(labels) - 1))
+    routes = []
+    for lid, d, t, x in found:
+        path = []
+        while lid is not None:
+            node, lid = labels[lid]
+            path.append(node)
+        path.reverse()
+        routes.append((path, d, t, x))
+    return routes
+
+# ---------------------------
+# run_query/3 equivalent
+# ---------------------------
+def find_route_native(G, criteria_atom, start_atom, goal_atom):
+    """
+    Same contract as find_route_prolog: (path, dist, time) or None.
+    """
+    if criteria_atom not in CRITERIA_LIST:
+        return None
+    crit = CRITERIA_LIST[criteria_atom]
+    mode, algo = MODE_FOR[criteria_atom]
+    if algo == "bfs":
+        return bfs(G, crit, start_atom, goal_atom)
+    if algo == "bidijkstra":
+        return bidirectional_dijkstra(G, mode, crit, start_atom, goal_atom)
+    # astar returns the same optimal route; the graph carries no coords
+    return dijkstra(G, mode, crit, start_atom, goal_atom)
+
+# ---------------------------
+# Parity check against Prolog
+# ---------------------------
+def check_parity(G, prolog_find, criteria=None, pairs=None):
+    """
+    Run every criterion over every (start, goal) pair through both the native
+    engine and prolog_find(criteria, start, goal). Equal-cost ties may pick
+    different paths, so answers are compared on the cost run_query orders by
+    (hop count for BFS). Returns a list of mismatch descriptions.
+    """
+    criteria = criteria or list(CRITERIA_LIST)
+    if pairs is None:
+        nodes = sorted(G.nodes())
+        pairs = [(a, b) for a in nodes for b in nodes if a != b]
+    mismatches = []
+    for crit in criteria:
+        mode, algo = MODE_FOR[crit]
+        for start, goal in pairs:
+            native = find_route_native(G, crit, start, goal)
+            prolog = prolog_find(crit, start, goal)
+            if native is None or prolog is None:
+                if (native is None) != (prolog is None):
+                    mismatches.append(f"{crit} {start}->{goal}: native={native} prolog={prolog}")
+                continue
+            if algo == "bfs":
+                same = len(native[0]) == len(prolog[0])
+            else:
+                idx = 2 if mode == "time" else 1
+                same = abs(native[idx] - prolog[idx]) < 0.01
+            if not same:
+                mismatches.append(f"{crit} {start}->{goal}: native={native} prolog={prolog}")
+    return mismatches
@@ -0,0 +1,195 @@
+"""
+Load test for RoutingServer: keep-alive clients firing random route queries.
+
+Without --url a local server is started for the run (on the shipped KB, or
+on a synthetic grid snapshot with --synthetic N) and stopped afterwards.
+Start / goal pairs are drawn from the server's own /graph.
+
+    python RoutingLoadTest.py
+    python RoutingLoadTest.py --synthetic 20000 --backend ch --concurrency 64 --requests 5000
+    python RoutingLoadTest.py --url http://127.0.0.1:8077
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode, urlsplit
+
+from GraphSnapshot import write_snapshot
+from RoadNetworkBench import graph_from_roads, synthetic_roads
+from RoutingEngine import CRITERIA_LIST
+
+URL_RE = re.compile(r"on (http://\S+)")
+
+
+class _Connection:
+    """
+    One keep-alive HTTP/1.1 connection.
+    """
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode("latin-1"))
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            h = await self.reader.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = h.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = await self.reader.readexactly(int(headers.get("content-length") or 0))
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, body
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return float("nan")
+    i = min(len(sorted_values) - 1, max(0, int(round(p / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[i]
+
+async def run_load(url, concurrency=None, requests=2000, criteria=None, seed=1):
+    """
+    Fire requests route queries over concurrency connections (default: the
+    server's max_pending, so it is loaded without being pushed into 503s).
+    Returns a dict with latency percentiles (ms) and requests per second over
+    the 200 answers only, plus the count of every status.
+    """
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    probe = _Connection(host, port)
+    status, body = await probe.request("/graph")
+    if status != 200:
+        probe.close()
+        raise RuntimeError(f"/graph answered {status}")
+    if concurrency is None:
+        status, health = await probe.request("/health")
+        if status != 200:
+            probe.close()
+            raise RuntimeError(f"/health answered {status}")
+        concurrency = json.loads(health)["max_pending"]
+    probe.close()
+    nodes = sorted({r[0] for r in json.loads(body)["roads"]})
+    rnd = random.Random(seed)
+    criteria = criteria or list(CRITERIA_LIST)
+    queries = [urlencode({"criteria": rnd.choice(criteria), "start": rnd.choice(nodes), "goal": rnd.choice(nodes)})
+               for _ in range(requests)]
+
+    latencies = []
+    statuses = Counter()
+    next_query = iter(queries)
+
+    async def client():
+        conn = _Connection(host, port)
+        try:
+            for q in next_query:
+                t0 = time.perf_counter()
+                try:
+                    status, _ = await conn.request("/route?" + q)
+                except (ConnectionError, asyncio.IncompleteReadError, IndexError, ValueError):
+                    conn.close()
+                    status = "connection error"
+                if status == 200:
+                    latencies.append(time.perf_counter() - t0)
+                statuses[status] += 1
+        finally:
+            conn.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    latencies.sort()
+    return {"requests": requests, "concurrency": concurrency, "seconds": wall, "ok": len(latencies),
+            "rps": len(latencies) / wall if wall else float("nan"),
+            "p50_ms": percentile(latencies, 50) * 1000, "p99_ms": percentile(latencies, 99) * 1000,
+            "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else float("nan"),
+            "max_ms": latencies[-1] * 1000 if latencies else float("nan"),
+            "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)}}
+
+def print_load(res):
+    print(f"{res['requests']} requests, {res['concurrency']} connections, {res['seconds']:.2f} s")
+    print(f"  {res['ok']} answered 200: {res['rps']:.0f} req/s")
+    print(f"  200 latency p50 {res['p50_ms']:.2f} ms  p99 {res['p99_ms']:.2f} ms"
+          f"  mean {res['mean_ms']:.2f} ms  max {res['max_ms']:.2f} ms")
+    print("  status", ", ".join(f"{k}: {v}" for k, v in res["statuses"].items()))
+
+
+def _echo_server(stream):
+    for line in stream:
+        print("server:", line.rstrip())
+
+def start_local_server(backend, workers, snapshot=None):
+    """
+    Start RoutingServer.py on a free port. Returns (process, url).
+    """
+    cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "RoutingServer.py"),
+           "--port", "0", "--backend", backend, "--workers", str(workers)]
+    if snapshot:
+        cmd += ["--snapshot", snapshot]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    for line in proc.stdout:
+        print("server:", line.rstrip())
+        m = URL_RE.search(line)
+        if m:
+            # keep reading, or the server blocks once the pipe buffer fills
+            threading.Thread(target=_echo_server, args=(proc.stdout,), daemon=True).start()
+            return proc, m.group(1)
+    proc.wait()
+    raise RuntimeError(f"Routing server exited with code {proc.returncode}.")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--url", help="load an already running server instead of starting one")
+    ap.add_argument("--backend", choices=("csr", "ch", "prolog"), default="csr")
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    ap.add_argument("--synthetic", type=int, metavar="N", help="serve a synthetic grid of about N nodes")
+    ap.add_argument("--concurrency", type=int, help="connections (default: the server's max_pending)")
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--criteria", nargs="*", choices=list(CRITERIA_LIST))
+    ap.add_argument("--json", metavar="PATH", help="also write the results here")
+    args = ap.parse_args()
+
+    proc = None
+    tmp = None
+    url = args.url
+    try:
+        if url is None:
+            snapshot = None
+            if args.synthetic:
+                tmp = tempfile.TemporaryDirectory()
+                snapshot = os.path.join(tmp.name, "synthetic.graph")
+                write_snapshot(graph_from_roads(synthetic_roads(args.synthetic)), snapshot, "synthetic")
+            proc, url = start_local_server(args.backend, args.workers, snapshot)
+        res = asyncio.run(run_load(url, args.concurrency, args.requests, args.criteria))
+        print_load(res)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(res, f, indent=2)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        if tmp is not None:
+            tmp.cleanup()
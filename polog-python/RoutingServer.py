@@ -0,0 +1,451 @@
+"""
+Headless HTTP routing service.
+
+An asyncio front end hands route queries to a process pool of routing
+workers. The KB is shared through the graph snapshot: every worker maps the
+same .graph file, and CSRGraph.from_snapshot uses the mapped columns in
+place, so the road arrays live in the page cache once, not once per worker.
+
+    GET  /route?criteria=fastest_time&start=may_pen&goal=chapelton
+    POST /route   {"criteria": ..., "start": ..., "goal": ...}
+         -> {"path": [...], "distance": 34.0, "time": 64.0}   ({"path": null} if unreachable)
+    GET  /graph   -> {"kb_hash": ..., "roads": [[A, B, Dist, Type, Time, Status], ...]}
+    GET  /health  -> backend, KB hash, queue depth and counters
+
+Backends: csr (Dijkstra / BFS on the CSR graph), ch (contraction
+hierarchies, built once by the front end and loaded by each worker) and
+prolog (run_query/3 on one swipl per worker, as find_route_prolog does).
+
+At most MAX_PENDING_PER_WORKER requests per worker are queued; past that the
+server answers 503 with Retry-After rather than queueing without bound. A
+request waits at most REQUEST_TIMEOUT s for its answer (504). When the KB or
+journal changes, a fresh pool is started on the new snapshot and swapped in;
+the old one finishes its queue and exits.
+
+    python RoutingServer.py                       # KB next to this script, csr backend
+    python RoutingServer.py --backend ch --workers 8
+    python RoutingServer.py --snapshot synthetic.graph
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs, urlsplit
+
+import RoadNetworkPathfinder as app
+from ContractionHierarchy import HierarchySet
+from CSRGraph import CSRGraph, find_route_csr
+from GraphSnapshot import GraphSnapshot
+from RoadJournal import RoadJournal
+from RouteCache import kb_version
+from RouteIndex import profile_of
+from RoutingEngine import CRITERIA_LIST
+
+# ---------------------------
+# CONFIG
+HOST = "127.0.0.1"
+PORT = 8077
+
+# Routing worker processes and the queue allowed per worker before 503s
+WORKERS = max(1, (os.cpu_count() or 2) - 1)
+MAX_PENDING_PER_WORKER = 8
+
+# Seconds a request may wait for its route before the server answers 504
+REQUEST_TIMEOUT = 10
+
+# How often (s) the KB, journal or snapshot file is checked for changes
+KB_POLL_S = 2
+
+BACKENDS = ("csr", "ch", "prolog")
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+# ---------------------------
+# Worker processes
+# ---------------------------
+_WORKER = {}
+
+def _init_worker(backend, snapshot_file, kb_hash, ch_dir, prolog_file, swipl_cmd):
+    """
+    Pool initializer: map the snapshot (csr / ch) or start a swipl worker
+    with the journal replayed (prolog).
+    """
+    _WORKER.update(backend=backend, kb_hash=kb_hash)
+    if backend == "prolog":
+        app.PROLOG_FILE = prolog_file
+        app.SWIPL_CMD = swipl_cmd
+        app.PROLOG_POOL_SIZE = 1
+        app.JOURNAL = RoadJournal(prolog_file, os.path.splitext(prolog_file)[0] + ".journal")
+        # seeded with the journal
+        app.get_prolog_pool()
+        return
+    snap = GraphSnapshot.load(snapshot_file, kb_hash)
+    if snap is None:
+        raise RuntimeError(f"Graph snapshot {snapshot_file} is missing or stale.")
+    _WORKER["graph"] = CSRGraph.from_snapshot(snap)
+    if backend == "ch":
+        _WORKER["hierarchies"] = HierarchySet(ch_dir)
+
+def _warm():
+    return os.getpid()
+
+def _route(criteria_atom, start_atom, goal_atom):
+    """
+    One route query, run in a worker. Returns (path, dist, time) or None.
+    """
+    backend = _WORKER["backend"]
+    if backend == "prolog":
+        return app.find_route_prolog(criteria_atom, start_atom, goal_atom)
+    C = _WORKER["graph"]
+    if backend == "ch":
+        return _WORKER["hierarchies"].route(C, criteria_atom, start_atom, goal_atom, _WORKER["kb_hash"])
+    return find_route_csr(C, criteria_atom, start_atom, goal_atom)
+
+
+# ---------------------------
+# KB generations
+# ---------------------------
+class _Generation:
+    """
+    One KB version as served: its snapshot, the /graph body and the
+    worker pool routing over it.
+    """
+    def __init__(self, version, snapshot_file, kb_hash, graph_body):
+        self.version = version
+        self.snapshot_file = snapshot_file
+        self.kb_hash = kb_hash
+        self.graph_body = graph_body
+        self.pool = None
+
+
+def _graph_body(snap):
+    nodes, types, statuses = snap.nodes, snap.types, snap.statuses
+    roads = [[nodes[s], nodes[d], _number(dist), types[t], _number(tm), statuses[st]]
+             for s, d, dist, tm, t, st in zip(snap.src.tolist(), snap.dst.tolist(), snap.distance.tolist(),
+                                              snap.time.tolist(), snap.rtype.tolist(), snap.status.tolist())]
+    return json.dumps({"kb_hash": snap.kb_hash, "roads": roads}, separators=(",", ":")).encode("utf-8")
+
+def _number(x):
+    return int(x) if float(x).is_integer() else x
+
+
+class RoutingServer:
+    def __init__(self, backend="csr", workers=WORKERS, snapshot_file=None, host=HOST, port=PORT,
+                 timeout=REQUEST_TIMEOUT, max_pending=None, ch_dir=None):
+        if backend not in BACKENDS:
+            raise RuntimeError(f"Unknown backend {backend}; expected one of {', '.join(BACKENDS)}.")
+        self.backend = backend
+        self.workers = max(1, int(workers))
+        self.snapshot_file = snapshot_file
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_pending = max_pending or self.workers * MAX_PENDING_PER_WORKER
+        if ch_dir is None:
+            ch_dir = os.path.splitext(snapshot_file)[0] + ".ch" if snapshot_file else app.CH_DIR
+        self.ch_dir = ch_dir
+        self.generation = None
+        self.in_flight = 0
+        self.stats = {"requests": 0, "routes": 0, "rejected": 0, "timeouts": 0, "errors": 0, "reloads": 0}
+        self._server = None
+        self._poller = None
+        self._swap_lock = None
+
+    # ---------------------------
+    # KB and pools
+    # ---------------------------
+    def current_version(self):
+        if self.snapshot_file:
+            return kb_version(self.snapshot_file)
+        app.JOURNAL.refresh()
+        return app.current_kb_version()
+
+    def _sync_prolog(self):
+        """
+        Bring the front end's own swipl pool in line with the KB file and
+        journal, in case the snapshot has to be rebuilt from Prolog.
+        """
+        app.get_prolog_pool()
+        app.reload_prolog_pool()
+
+    def _prepare(self):
+        """
+        Blocking: snapshot, /graph body and hierarchies for the current KB.
+        """
+        version = self.current_version()
+        if self.snapshot_file:
+            snap = GraphSnapshot.load(self.snapshot_file)
+            if snap is None:
+                raise RuntimeError(f"{self.snapshot_file} is not a graph snapshot.")
+            snapshot_file = self.snapshot_file
+        else:
+            kb_hash = version[1]
+            snap = GraphSnapshot.load(app.GRAPH_SNAPSHOT_FILE, kb_hash)
+            if snap is None:
+                self._sync_prolog()
+                app.load_graph()
+                snap = GraphSnapshot.load(app.GRAPH_SNAPSHOT_FILE, kb_hash)
+                if snap is None:
+                    raise RuntimeError(f"Could not write graph snapshot {app.GRAPH_SNAPSHOT_FILE}.")
+            snapshot_file = app.GRAPH_SNAPSHOT_FILE
+        gen = _Generation(version, snapshot_file, snap.kb_hash, _graph_body(snap))
+        if self.backend == "ch":
+            C = CSRGraph.from_snapshot(snap)
+            hierarchies = HierarchySet(self.ch_dir)
+            for profile in sorted({profile_of(c) for c in CRITERIA_LIST}):
+                crit = next(c for c in CRITERIA_LIST if profile_of(c) == profile)
+                hierarchies.get(C, crit, snap.kb_hash)
+        return gen
+
+    async def _start_pool(self, gen):
+        gen.pool = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.backend, gen.snapshot_file, gen.kb_hash, self.ch_dir, app.PROLOG_FILE, app.SWIPL_CMD))
+        # start every worker now, not on the first requests after a swap
+        await asyncio.gather(*(asyncio.wrap_future(gen.pool.submit(_warm)) for _ in range(self.workers)))
+        return gen
+
+    async def _swap(self, gen):
+        await self._start_pool(gen)
+        old, self.generation = self.generation, gen
+        if old is not None and old.pool is not None:
+            old.pool.shutdown(wait=False)
+
+    async def reload(self, force=False):
+        """
+        Swap in a new generation if the KB changed (or always, with force).
+        """
+        async with self._swap_lock:
+            version = await asyncio.to_thread(self.current_version)
+            if not force and self.generation is not None and version == self.generation.version:
+                return False
+            gen = await asyncio.to_thread(self._prepare)
+            await self._swap(gen)
+            self.stats["reloads"] += 1
+            return True
+
+    async def _restart_pool(self, broken):
+        async with self._swap_lock:
+            gen = self.generation
+            if gen.pool is not broken:
+                return
+            print("Routing workers died; restarting the pool.")
+            fresh = _Generation(gen.version, gen.snapshot_file, gen.kb_hash, gen.graph_body)
+            await self._swap(fresh)
+
+    async def _poll_kb(self):
+        while True:
+            await asyncio.sleep(KB_POLL_S)
+            try:
+                if await self.reload():
+                    print("KB changed; now serving", self.generation.kb_hash[:12])
+            except Exception as e:
+                print("KB reload failed:", e)
+
+    # ---------------------------
+    # lifecycle
+    # ---------------------------
+    async def start(self):
+        self._swap_lock = asyncio.Lock()
+        await self.reload(force=True)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._poller = asyncio.create_task(self._poll_kb())
+        return self
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.generation is not None and self.generation.pool is not None:
+            self.generation.pool.shutdown(wait=True, cancel_futures=True)
+        app.close_pengine_client()
+        if app._POOL is not None:
+            app._POOL.close()
+
+    # ---------------------------
+    # HTTP
+    # ---------------------------
+    async def _handle(self, reader, writer):
+        """
+        Minimal HTTP/1.1 with keep-alive: one request at a time per connection.
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    writer.write(_response(400, {"error": "malformed request line"}, keep_alive=False))
+                    break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = h.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length") or 0)
+                    if length < 0:
+                        raise ValueError
+                except ValueError:
+                    # without a length the body can't be skipped, so close
+                    writer.write(_response(400, {"error": "bad Content-Length"}, keep_alive=False))
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload, extra = await self._dispatch(method, target, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(_response(status, payload, extra, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, body):
+        self.stats["requests"] += 1
+        url = urlsplit(target)
+        if url.path == "/route":
+            if method not in ("GET", "POST"):
+                return 405, {"error": "use GET or POST"}, {}
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if method == "POST" and body:
+                try:
+                    data = json.loads(body)
+                except ValueError:
+                    return 400, {"error": "body is not JSON"}, {}
+                if not isinstance(data, dict):
+                    return 400, {"error": "body must be a JSON object"}, {}
+                params.update(data)
+            return await self.route(params)
+        if method != "GET":
+            return 405, {"error": "use GET"}, {}
+        if url.path == "/graph":
+            return 200, self.generation.graph_body, {}
+        if url.path == "/health":
+            return 200, {"backend": self.backend, "workers": self.workers, "kb_hash": self.generation.kb_hash,
+                         "in_flight": self.in_flight, "max_pending": self.max_pending, **self.stats}, {}
+        return 404, {"error": f"no such endpoint {url.path}"}, {}
+
+    def _release(self):
+        self.in_flight -= 1
+
+    def _release_threadsafe(self, loop):
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # loop already closed during shutdown
+            pass
+
+    async def route(self, params):
+        """
+        Validate a route request and run it on the pool, with backpressure
+        and a timeout. Returns (status, payload, extra headers).
+        """
+        crit = str(params.get("criteria") or "")
+        crit = app.CRITERIA_ATOMS.get(crit, crit)
+        if crit not in CRITERIA_LIST:
+            return 400, {"error": f"unknown criteria {crit!r}", "criteria": list(CRITERIA_LIST)}, {}
+        if not params.get("start") or not params.get("goal"):
+            return 400, {"error": "start and goal are required"}, {}
+        start, goal = app.to_atom(str(params["start"])), app.to_atom(str(params["goal"]))
+
+        if self.in_flight >= self.max_pending:
+            self.stats["rejected"] += 1
+            return 503, {"error": "busy"}, {"Retry-After": "1"}
+        pool = self.generation.pool
+        try:
+            cf = pool.submit(_route, crit, start, goal)
+        except (BrokenProcessPool, RuntimeError):
+            asyncio.create_task(self._restart_pool(pool))
+            self.stats["errors"] += 1
+            return 503, {"error": "routing workers restarting"}, {"Retry-After": "1"}
+        # a slot is held until the worker is really done, even after a 504
+        self.in_flight += 1
+        loop = asyncio.get_running_loop()
+        cf.add_done_callback(lambda _: self._release_threadsafe(loop))
+        try:
+            res = await asyncio.wait_for(asyncio.wrap_future(cf), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            return 504, {"error": f"no answer within {self.timeout} s"}, {}
+        except BrokenProcessPool:
+            asyncio.create_task(self._restart_pool(pool))
+            self.stats["errors"] += 1
+            return 503, {"error": "routing workers restarting"}, {"Retry-After": "1"}
+        except Exception as e:
+            self.stats["errors"] += 1
+            return 500, {"error": str(e)}, {}
+        self.stats["routes"] += 1
+        if res is None:
+            return 200, {"path": None}, {}
+        path, dist, ttime = res
+        return 200, {"path": path, "distance": dist, "time": ttime}, {}
+
+
+def _response(status, payload, extra=None, keep_alive=True):
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+    head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            "Connection: " + ("keep-alive" if keep_alive else "close")]
+    head += [f"{k}: {v}" for k, v in (extra or {}).items()]
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+
+
+async def main(args):
+    server = RoutingServer(args.backend, args.workers, args.snapshot, args.host, args.port,
+                           args.timeout, args.max_pending)
+    t0 = time.perf_counter()
+    await server.start()
+    print(f"Routing service ({server.backend}, {server.workers} workers) on {server.url}"
+          f" in {time.perf_counter() - t0:.1f} s")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--backend", choices=BACKENDS, default="csr")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="seconds per request")
+    ap.add_argument("--max-pending", type=int, default=None, help="queued requests before 503")
+    ap.add_argument("--snapshot", metavar="PATH", help="serve this graph snapshot instead of the KB")
+    args = ap.parse_args()
+    if not args.snapshot and not os.path.exists(app.PROLOG_FILE):
+        # fall back to the KB shipped next to this script
+        app.PROLOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "RoadNetworkKB.pl")
+        base = os.path.splitext(app.PROLOG_FILE)[0]
+        app.GRAPH_SNAPSHOT_FILE = base + ".graph"
+        app.CH_DIR = base + ".ch"
+        app.JOURNAL = RoadJournal(app.PROLOG_FILE, base + ".journal", app.JOURNAL_COMPACT_EVERY)
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,178 @@
+"""
+Departure-time routing: time-dependent road times and closure windows.
+
+Mirrors route_at/7 from RoadNetworkKB.pl on the nx.DiGraph the map is
+built from. The Schedule holds what export_schedules(json) prints, and is
+read straight from the KB source without Prolog: each time_profile/2 once
+(step starts and factors as two tuples), a profile id per road_profile/3
+road and the closure_window/3 windows. Clock times are
+minutes after midnight and wrap daily; a search keys Dijkstra on the
+arrival clock and costs each road as it is reached, so the same graph
+and schedule answer any departure time.
+"""
+import bisect
+import heapq
+import re
+
+from RoutingEngine import AVOIDS, CRITERIA_LIST, _walk_back
+
+DAY = 1440
+# road/6 statuses route_at uses; closure windows apply on top of either
+OPEN_AT = ("open", "scheduled")
+
+CLOCK_RE = re.compile(r"^(\d{1,2}):(\d{2})$")
+PROFILE_RE = re.compile(r"^time_profile\(\s*(\w+)\s*,\s*\[([^\]]*)\]\s*\)\s*\.", re.M)
+ROAD_PROFILE_RE = re.compile(r"^road_profile\(\s*(\w+)\s*,\s*(\w+)\s*,\s*(\w+)\s*\)\s*\.", re.M)
+CLOSURE_RE = re.compile(r"^closure_window\(\s*(\w+)\s*,\s*(\w+)\s*,\s*\[([^\]]*)\]\s*\)\s*\.", re.M)
+PAIR_RE = re.compile(r"([\d.]+)\s*-\s*([\d.]+)")
+
+
+def parse_clock(text):
+    """
+    "07:30" (or plain minutes, "450") -> minutes after midnight.
+    """
+    text = text.strip()
+    m = CLOCK_RE.match(text)
+    if m:
+        hours, minutes = int(m.group(1)), int(m.group(2))
+        if hours > 23 or minutes > 59:
+            raise ValueError(f"not a clock time: {text}")
+        return hours * 60 + minutes
+    value = float(text)
+    if value < 0:
+        raise ValueError(f"not a clock time: {text}")
+    return int(value) if value.is_integer() else value
+
+def format_clock(minutes):
+    """
+    Minutes after midnight -> "HH:MM", with "+1d" past midnight.
+    """
+    day, rest = divmod(int(round(minutes)), DAY)
+    clock = f"{rest // 60:02d}:{rest % 60:02d}"
+    return clock + (f" +{day}d" if day else "")
+
+
+class Schedule:
+    def __init__(self, profiles=None, roads=None, closures=None):
+        # profile id -> (step starts, factors), shared by every road using it
+        self.steps = []
+        ids = {}
+        for name, rows in (profiles or {}).items():
+            ids[name] = len(self.steps)
+            rows = sorted((float(s), float(f)) for s, f in rows)
+            if not rows or rows[0][0] != 0:
+                raise ValueError(f"time_profile {name} must start at 0")
+            if any(f <= 0 for _, f in rows):
+                raise ValueError(f"time_profile {name} has a factor that is not positive")
+            self.steps.append((tuple(s for s, _ in rows), tuple(f for _, f in rows)))
+        self.road_profile = {(a, b): ids[name] for a, b, name in (roads or []) if name in ids}
+        self.closures = {(a, b): tuple((float(f), float(t)) for f, t in windows)
+                         for a, b, windows in (closures or [])}
+
+    @classmethod
+    def from_json(cls, obj):
+        """
+        Schedule from export_schedules(json) output (already decoded).
+        """
+        return cls(obj.get("profiles"), obj.get("roads"), obj.get("closures"))
+
+    @classmethod
+    def from_source(cls, src_text):
+        """
+        Schedule of the time_profile/2, road_profile/3 and closure_window/3
+        facts in src_text (a KB file or an uploaded program).
+        """
+        profiles = {m.group(1): PAIR_RE.findall(m.group(2)) for m in PROFILE_RE.finditer(src_text)}
+        roads = [m.groups() for m in ROAD_PROFILE_RE.finditer(src_text)]
+        closures = [(a, b, PAIR_RE.findall(w)) for a, b, w in (m.groups() for m in CLOSURE_RE.finditer(src_text))]
+        return cls(profiles, roads, closures)
+
+    def enter(self, a, b, clock):
+        """
+        Like enter_at/4: clock, or the end of the closure window it falls
+        in (repeatedly). None if the road stays shut for a whole day.
+        """
+        windows = self.closures.get((a, b))
+        if not windows:
+            return clock
+        deadline = clock + DAY
+        while clock <= deadline:
+            day = (clock // DAY) * DAY
+            minute = clock - day
+            for start, end in windows:
+                if start <= end:
+                    if start <= minute < end:
+                        clock = day + end
+                        break
+                elif minute >= start:
+                    clock = day + DAY + end
+                    break
+                elif minute < end:
+                    clock = day + end
+                    break
+            else:
+                return clock
+        return None
+
+    def drive(self, a, b, minutes, clock):
+        """
+        Like drive_time/5: arrival clock for a road of minutes free-flow
+        time entered at clock, spread over the road's profile steps.
+        """
+        pid = self.road_profile.get((a, b))
+        if pid is None:
+            return clock + minutes
+        starts, factors = self.steps[pid]
+        work = minutes
+        while True:
+            day = (clock // DAY) * DAY
+            i = bisect.bisect_right(starts, clock - day) - 1
+            nxt = starts[i + 1] if i + 1 < len(starts) else DAY
+            span = (day + nxt - clock) / factors[i]
+            if work <= span:
+                return clock + work * factors[i]
+            work -= span
+            clock = day + nxt
+
+
+def route_at(G, schedule, criteria_atom, start, goal, depart, stats=None):
+    """
+    Same contract as find_route_native: (path, dist, time) or None, where
+    time is arrival - depart (waits at closed roads included). Always the
+    earliest arrival; criteria_atom only picks the roads allowed.
+    """
+    if stats is not None:
+        stats["expanded"] = 0
+    if criteria_atom not in CRITERIA_LIST or start not in G or goal not in G:
+        return None
+    banned = {AVOIDS[flag] for flag in CRITERIA_LIST[criteria_atom]}
+    best = {start: depart}
+    pred = {start: None}
+    dist = {start: 0.0}
+    done = set()
+    heap = [(depart, 0, start)]
+    order = 1
+    while heap:
+        clock, _, node = heapq.heappop(heap)
+        if node in done:
+            continue
+        if node == goal:
+            return _walk_back(pred, goal), dist[goal], clock - depart
+        done.add(node)
+        if stats is not None:
+            stats["expanded"] += 1
+        for nxt, data in G.adj[node].items():
+            if nxt in done or data.get("rtype") in banned or data.get("status") not in OPEN_AT:
+                continue
+            enter = schedule.enter(node, nxt, clock)
+            if enter is None:
+                continue
+            arrive = schedule.drive(node, nxt, data.get("time", 0.0), enter)
+            if nxt in best and best[nxt] <= arrive:
+                continue
+            best[nxt] = arrive
+            pred[nxt] = node
+            dist[nxt] = dist[node] + data.get("distance", 0.0)
+            heapq.heappush(heap, (arrive, order, nxt))
+            order += 1
+    return None
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the app's modules import each other by bare name from polog-python/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
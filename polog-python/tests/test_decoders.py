@@ -0,0 +1,106 @@
+"""
+Decoding of the JSON the KB prints: decode_prolog_json, decode_route_json
+and graph_from_edge_rows.
+"""
+import pytest
+
+from RoadNetworkPathfinder import decode_prolog_json, decode_route_json, graph_from_edge_rows
+
+ROUTE = '{"path":["may_pen","denbigh"],"distance":4,"time":6.5,"expanded":3}'
+
+
+# ---------------------------
+# decode_prolog_json
+# ---------------------------
+def test_prolog_json_decodes_one_line():
+    assert decode_prolog_json('[["a","b",1,"paved",2,"open"]]') == [["a", "b", 1, "paved", 2, "open"]]
+
+@pytest.mark.parametrize("text", ["", "   \n", None])
+def test_prolog_json_empty_output_is_an_error(text):
+    with pytest.raises(RuntimeError):
+        decode_prolog_json(text)
+
+def test_prolog_json_skips_warnings_printed_before_it():
+    text = ("Warning: /kb/RoadNetworkKB.pl:12:\n"
+            "Warning:    Singleton variables: [X]\n" + ROUTE + "\n")
+    assert decode_prolog_json(text)["distance"] == 4
+
+def test_prolog_json_warning_after_it_is_an_error():
+    with pytest.raises(RuntimeError):
+        decode_prolog_json(ROUTE + "\nWarning: goal (directive) failed")
+
+@pytest.mark.parametrize("text", ['{"path":["a","b"],"dist', '[["a","b",1,', '{"path":'])
+def test_prolog_json_truncated_output_is_an_error(text):
+    with pytest.raises(RuntimeError):
+        decode_prolog_json(text)
+
+
+# ---------------------------
+# decode_route_json
+# ---------------------------
+def test_route_json():
+    assert decode_route_json(ROUTE) == ((["may_pen", "denbigh"], 4.0, 6.5), 3)
+
+def test_route_json_without_expanded():
+    assert decode_route_json('{"path":["a"],"distance":0,"time":0}') == ((["a"], 0.0, 0.0), None)
+
+def test_route_json_null_path_is_no_route():
+    assert decode_route_json('{"path":null}') == (None, None)
+
+def test_route_json_null_path_after_warnings():
+    assert decode_route_json('Warning: clauses not together\n{"path":null}') == (None, None)
+
+@pytest.mark.parametrize("text", ["", '{"path":["a","b"],"distance":4,', "no route"])
+def test_route_json_empty_or_truncated_is_an_error(text):
+    with pytest.raises(RuntimeError):
+        decode_route_json(text)
+
+@pytest.mark.parametrize("text", [
+    '[]',
+    '{"distance":4,"time":6}',
+    '{"path":"may_pen","distance":4,"time":6}',
+    '{"path":["a",1],"distance":4,"time":6}',
+    '{"path":["a","b"],"distance":"four","time":6}',
+    '{"path":["a","b"],"distance":4,"time":null}',
+    '{"path":["a","b"],"distance":4}',
+    '{"path":["a","b"],"distance":true,"time":6}',
+    '{"path":["a","b"],"distance":4,"time":6,"expanded":"3"}',
+    '{"path":null,"expanded":2.5}',
+])
+def test_route_json_wrong_field_types_are_an_error(text):
+    with pytest.raises(RuntimeError):
+        decode_route_json(text)
+
+
+# ---------------------------
+# graph_from_edge_rows
+# ---------------------------
+def test_edge_rows():
+    G = graph_from_edge_rows([["a", "b", 4, "paved", 6.5, "open"], ["b", "a", 4, "paved", 6.5, "closed"]])
+    assert sorted(G.edges) == [("a", "b"), ("b", "a")]
+    assert G["a"]["b"] == {"distance": 4.0, "rtype": "paved", "time": 6.5, "status": "open"}
+    assert G["b"]["a"]["status"] == "closed"
+
+def test_edge_rows_empty_list_is_an_empty_graph():
+    G = graph_from_edge_rows([])
+    assert len(G) == 0
+
+@pytest.mark.parametrize("rows", [None, {"rows": []}, "a,b,4,paved,6,open"])
+def test_edge_rows_not_a_list_is_an_error(rows):
+    with pytest.raises(RuntimeError):
+        graph_from_edge_rows(rows)
+
+@pytest.mark.parametrize("row", [
+    ["a", "b", 4, "paved", 6],
+    ["a", "b", 4, "paved", 6, "open", "extra"],
+    "abcdef",
+    {"src": "a"},
+    ["a", "b", "four", "paved", 6, "open"],
+    ["a", "b", 4, "paved", None, "open"],
+    [["a"], "b", 4, "paved", 6, "open"],
+    ["a", 7, 4, "paved", 6, "open"],
+    ["a", "b", 4, "paved", 6, None],
+])
+def test_edge_rows_malformed_row_is_an_error(row):
+    with pytest.raises(RuntimeError, match="Malformed road row"):
+        graph_from_edge_rows([["x", "y", 1, "paved", 1, "open"], row])
@@ -0,0 +1,126 @@
+"""
+Route parity over the shipped KBs: the native engines (networkx, CSR and
+contraction hierarchies) against each other and against networkx's own
+shortest paths, and against run_query/3 when swipl is installed.
+"""
+import os
+import re
+import shutil
+
+import networkx as nx
+import pytest
+
+import RoadNetworkPathfinder as app
+from ContractionHierarchy import HierarchySet
+from CSRGraph import CSRGraph, find_route_csr
+from PengineStandIn import program_graph
+from RoadJournal import RoadJournal
+from RoutingEngine import AVOIDS, CRITERIA_LIST, MODE_FOR, check_parity, find_route_native
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+KBS = {
+    "RoadNetworkKB": os.path.join(HERE, "..", "RoadNetworkKB.pl"),
+    "RoadNetwork": os.path.join(HERE, "..", "..", "RoadNetwork.pl"),
+    "AI_Group": os.path.join(HERE, "..", "..", "AI_Group", "roads.pl"),
+}
+
+CRITERIA_RE = re.compile(r"^criteria_list\(\s*(\w+)\s*,\s*\[([^\]]*)\]\s*\)\s*\.", re.M)
+MODE_RE = re.compile(r"^mode_for\(\s*(\w+)\s*,\s*(\w+)\s*,\s*(\w+)\s*\)\s*\.", re.M)
+
+
+def _source(name):
+    with open(KBS[name], "r", encoding="utf-8") as f:
+        return f.read()
+
+@pytest.fixture(scope="module", params=sorted(KBS))
+def kb(request):
+    """
+    (name, graph of the KB's road/6 facts, CSRGraph of the same).
+    """
+    G = program_graph(_source(request.param))
+    return request.param, G, CSRGraph.from_networkx(G)
+
+def _reference(G, criteria_atom, start, goal):
+    """
+    networkx's own answer: the cost the criterion minimises, on the open
+    roads it allows. Returned in the (path, dist, time) shape with the
+    other cost left at 0.
+    """
+    banned = {AVOIDS[flag] for flag in CRITERIA_LIST[criteria_atom]}
+    H = G.edge_subgraph([(u, v) for u, v, d in G.edges(data=True)
+                         if d["status"] == "open" and d["rtype"] not in banned])
+    if start not in H or goal not in H:
+        return None
+    mode, algo = MODE_FOR[criteria_atom]
+    weight = None if algo == "bfs" else mode
+    try:
+        path = nx.shortest_path(H, start, goal, weight=weight)
+    except nx.NetworkXNoPath:
+        return None
+    cost = nx.path_weight(H, path, weight) if weight else 0
+    return path, cost if mode == "distance" else 0, cost if mode == "time" else 0
+
+def _assert_walk(G, criteria_atom, res):
+    path, dist, ttime = res
+    banned = {AVOIDS[flag] for flag in CRITERIA_LIST[criteria_atom]}
+    roads = [G[a][b] for a, b in zip(path, path[1:])]
+    assert all(r["status"] == "open" and r["rtype"] not in banned for r in roads), path
+    assert sum(r["distance"] for r in roads) == pytest.approx(dist)
+    assert sum(r["time"] for r in roads) == pytest.approx(ttime)
+
+
+def test_criteria_tables_match_kb(kb):
+    name = kb[0]
+    src = _source(name)
+    criteria = {c: [f.strip() for f in flags.split(",") if f.strip()] for c, flags in CRITERIA_RE.findall(src)}
+    modes = {c: (mode, algo) for c, mode, algo in MODE_RE.findall(src)}
+    assert criteria == CRITERIA_LIST
+    assert modes == MODE_FOR
+
+def test_native_matches_networkx(kb):
+    _, G, _ = kb
+    assert check_parity(G, lambda c, a, b: _reference(G, c, a, b)) == []
+
+def test_csr_matches_native(kb):
+    _, G, C = kb
+    assert check_parity(G, lambda c, a, b: find_route_csr(C, c, a, b)) == []
+
+def test_contraction_hierarchy_matches_native(kb):
+    _, G, C = kb
+    hierarchies = HierarchySet()
+    assert check_parity(G, lambda c, a, b: hierarchies.route(C, c, a, b, "test")) == []
+
+@pytest.mark.parametrize("backend", ["nx", "csr", "ch"])
+def test_routes_are_walks_on_allowed_roads(kb, backend):
+    _, G, C = kb
+    hierarchies = HierarchySet()
+    find = {
+        "nx": lambda c, a, b: find_route_native(G, c, a, b),
+        "csr": lambda c, a, b: find_route_csr(C, c, a, b),
+        "ch": lambda c, a, b: hierarchies.route(C, c, a, b, "test"),
+    }[backend]
+    nodes = sorted(G)
+    for crit in CRITERIA_LIST:
+        for a in nodes:
+            for b in nodes:
+                res = find(crit, a, b) if a != b else None
+                if res is not None:
+                    assert res[0][0] == a and res[0][-1] == b
+                    _assert_walk(G, crit, res)
+
+@pytest.mark.skipif(shutil.which("swipl") is None, reason="SWI-Prolog (swipl) is not installed")
+def test_prolog_matches_native(kb, tmp_path, monkeypatch):
+    name, G, _ = kb
+    monkeypatch.setattr(app, "SWIPL_CMD", shutil.which("swipl"))
+    monkeypatch.setattr(app, "PROLOG_FILE", os.path.abspath(KBS[name]))
+    monkeypatch.setattr(app, "JOURNAL", RoadJournal(app.PROLOG_FILE, str(tmp_path / "roads.journal")))
+    app.ROUTE_CACHE.clear()
+    try:
+        for output in ("json", "text"):
+            monkeypatch.setattr(app, "PROLOG_OUTPUT", output)
+            assert check_parity(G, app.find_route_prolog) == []
+    finally:
+        app.ROUTE_CACHE.clear()
+        if app._POOL is not None:
+            app._POOL.close()
+            app._POOL = None